@@ -0,0 +1,23 @@
+from .client import (
+    CHAT_LATENCY,
+    OPERATION_TIMEOUTS,
+    RETRY_BUDGET,
+    create_http_client,
+    get_client,
+    hedged_chat,
+)
+from .resilience import LatencyWindow, RetryBudget, RetryTransport, hedged
+
+
+__all__ = [
+    "CHAT_LATENCY",
+    "OPERATION_TIMEOUTS",
+    "RETRY_BUDGET",
+    "create_http_client",
+    "get_client",
+    "hedged_chat",
+    "LatencyWindow",
+    "RetryBudget",
+    "RetryTransport",
+    "hedged",
+]
@@ -0,0 +1,123 @@
+from os import getenv
+from typing import Awaitable, Callable, TypeVar
+import asyncio
+
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+import httpx
+
+from backend.metrics import REGISTRY
+from .resilience import LatencyWindow, RetryBudget, RetryTransport, hedged
+
+
+T = TypeVar("T")
+
+OPENAI_MAX_CONNECTIONS: int = int(getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE: int = int(getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_KEEPALIVE_EXPIRY: float = float(getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_CONNECT_TIMEOUT: float = float(getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_ATTEMPTS: int = int(getenv("OPENAI_MAX_ATTEMPTS", "3"))
+# Retries allowed per request made, on top of one per second
+OPENAI_RETRY_RATIO: float = float(getenv("OPENAI_RETRY_RATIO", "0.2"))
+# Percentile of recent chat latencies after which a second request is sent, 0 disables
+OPENAI_HEDGE_PERCENTILE: float = float(getenv("OPENAI_HEDGE_PERCENTILE", "0"))
+
+# The deadline of each kind of operation, in seconds
+OPERATION_TIMEOUTS: dict[str, float] = {
+    "chat": float(getenv("OPENAI_CHAT_TIMEOUT", "30")),
+    "tts": float(getenv("OPENAI_TTS_TIMEOUT", "20")),
+    "upload": float(getenv("OPENAI_UPLOAD_TIMEOUT", "300")),
+    "embedding": float(getenv("OPENAI_EMBEDDING_TIMEOUT", "30")),
+}
+
+RETRY_BUDGET = RetryBudget(ratio=OPENAI_RETRY_RATIO)
+CHAT_LATENCY = LatencyWindow()
+
+REGISTRY.add_collector("openai_retry_budget", RETRY_BUDGET.stats)
+
+_clients: dict[
+    tuple[str | None, str | None, str, asyncio.AbstractEventLoop | None], AsyncOpenAI
+] = {}
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Return an HTTP client with a tuned connection pool that retries
+    transient failures under the shared retry budget.
+
+    Returns:
+        httpx.AsyncClient: The HTTP client.
+    """
+    transport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        )
+    )
+    return httpx.AsyncClient(
+        transport=RetryTransport(transport, RETRY_BUDGET, max_attempts=OPENAI_MAX_ATTEMPTS),
+        timeout=httpx.Timeout(OPERATION_TIMEOUTS["chat"], connect=OPENAI_CONNECT_TIMEOUT),
+        follow_redirects=True,
+    )
+
+
+def get_client(operation: str = "chat") -> AsyncOpenAI:
+    """
+    Return the OpenAI client for a kind of operation.
+
+    Clients are shared by the whole process, one per API endpoint, so that
+    every call reuses the same pool of kept-alive connections. Connections
+    belong to the event loop that opened them, so each running loop gets
+    its own clients, and clients made outside of a loop must only be used
+    by one. The client of each operation applies its deadline from
+    `OPERATION_TIMEOUTS`. Retries
+    are made by the HTTP transport, under a budget shared by every client,
+    rather than by the OpenAI library. This function loads the `.env` file
+    to get the API key from the `OPENAI_API_KEY` environment variable.
+
+    Args:
+        operation (str): 'chat', 'tts', 'upload' or 'embedding'.
+
+    Returns:
+        AsyncOpenAI: The OpenAI client.
+    """
+    load_dotenv()
+    api_key, base_url = getenv("OPENAI_API_KEY"), getenv("OPENAI_BASE_URL")
+    try:
+        loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    key = (api_key, base_url, operation, loop)
+    if key not in _clients:
+        base = _clients.get((api_key, base_url, "", loop))
+        if base is None:
+            base = _clients[(api_key, base_url, "", loop)] = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,
+                http_client=create_http_client(),
+            )
+        # Copies of a client share its HTTP client, and so its connections
+        _clients[key] = base.with_options(
+            timeout=httpx.Timeout(
+                OPERATION_TIMEOUTS[operation], connect=OPENAI_CONNECT_TIMEOUT
+            )
+        )
+    return _clients[key]
+
+
+async def hedged_chat(call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run a chat call, hedged after `OPENAI_HEDGE_PERCENTILE` of recent chat
+    latencies if hedging is enabled.
+
+    Args:
+        call (Callable[[], Awaitable[T]]): Starts the call.
+
+    Returns:
+        T: The result of the call.
+    """
+    if not OPENAI_HEDGE_PERCENTILE:
+        return await call()
+    return await hedged(call, CHAT_LATENCY, OPENAI_HEDGE_PERCENTILE, RETRY_BUDGET)
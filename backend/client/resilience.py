@@ -0,0 +1,342 @@
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from time import monotonic, perf_counter
+from typing import Awaitable, Callable, TypeVar
+import asyncio
+import random
+
+import httpx
+
+from backend.metrics import REGISTRY
+
+
+T = TypeVar("T")
+
+# Statuses worth trying again: the request was not processed, or failed upstream
+RETRY_STATUSES: frozenset[int] = frozenset({408, 409, 429, 500, 502, 503, 504})
+# Failures where the request never reached the server, or the connection broke
+RETRY_ERRORS: tuple[type[Exception], ...] = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    httpx.ReadError,
+    httpx.RemoteProtocolError,
+)
+
+RETRIES = REGISTRY.counter(
+    "openai_retries_total", "OpenAI requests retried.", ("reason",)
+)
+RETRIES_DENIED = REGISTRY.counter(
+    "openai_retries_denied_total",
+    "OpenAI retries and hedges skipped because the retry budget was spent.",
+)
+HEDGES = REGISTRY.counter(
+    "openai_hedged_requests_total", "Slow OpenAI requests sent a second time."
+)
+HEDGE_WINS = REGISTRY.counter(
+    "openai_hedge_wins_total", "Hedged OpenAI requests answered by the second request."
+)
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of the requests made.
+
+    Every request deposits `ratio` tokens, and every retry or hedge withdraws
+    one. The balance also refills by `min_per_second` tokens per second, so
+    a quiet process can still retry, and is capped at `capacity`. When the
+    upstream fails for everyone, retries stop once the budget is spent
+    instead of multiplying the load on it.
+    """
+
+    ratio: float
+    min_per_second: float
+    capacity: float
+    balance: float
+    retries: int
+    denied: int
+
+    def __init__(
+        self, ratio: float = 0.1, min_per_second: float = 1.0, capacity: float = 10.0
+    ):
+        """
+        Args:
+            ratio (float): The retries earned by each request.
+            min_per_second (float): The retries earned every second.
+            capacity (float): The most retries that can be saved up.
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self.balance = capacity
+        self.retries = 0
+        self.denied = 0
+        self._updated_at = monotonic()
+
+    def deposit(self) -> None:
+        """
+        Record a request.
+        """
+        self._refill()
+        self.balance = min(self.capacity, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """
+        Take one retry from the budget, if there is one.
+
+        Returns:
+            bool: Whether the retry may be made.
+        """
+        self._refill()
+        if self.balance < 1:
+            self.denied += 1
+            RETRIES_DENIED.inc()
+            return False
+        self.balance -= 1
+        self.retries += 1
+        return True
+
+    def stats(self) -> dict[str, float]:
+        """
+        Return the state of the budget.
+
+        Returns:
+            dict[str, float]: The balance, and the retries made and denied.
+        """
+        self._refill()
+        return {"balance": self.balance, "retries": self.retries, "denied": self.denied}
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.balance = min(
+            self.capacity, self.balance + (now - self._updated_at) * self.min_per_second
+        )
+        self._updated_at = now
+
+
+def retry_after(response: httpx.Response) -> float | None:
+    """
+    Return the delay a response asks for before trying again.
+
+    Args:
+        response (httpx.Response): The response.
+
+    Returns:
+        float | None: The delay in seconds, or None if the response gives none.
+    """
+    value = response.headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1e3
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """
+    Sends requests through a pooled transport, retrying transient failures.
+
+    Retries wait a random delay up to an exponentially growing cap ("full
+    jitter"), or what the server asks for, and each takes a token from the
+    retry budget shared by every client. A request is not retried once the
+    next attempt would end after its deadline, taken as its read timeout.
+    Only the response headers are retried: a stream that breaks midway is
+    reported to the caller.
+    """
+
+    transport: httpx.AsyncBaseTransport
+    budget: RetryBudget
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        budget: RetryBudget,
+        max_attempts: int = 3,
+        base_delay: float = 0.25,
+        max_delay: float = 8.0,
+    ):
+        """
+        Args:
+            transport (httpx.AsyncBaseTransport): The transport sending the requests.
+            budget (RetryBudget): The budget every retry is taken from.
+            max_attempts (int): The maximum number of attempts per request.
+            base_delay (float): The cap on the first delay, in seconds.
+            max_delay (float): The cap on any delay, in seconds.
+        """
+        self.transport = transport
+        self.budget = budget
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        timeout = request.extensions.get("timeout", {}).get("read")
+        deadline = monotonic() + timeout if timeout is not None else None
+        self.budget.deposit()
+
+        attempt = 0
+        while True:
+            try:
+                response = await self.transport.handle_async_request(request)
+            except RETRY_ERRORS as e:
+                delay = self.delay(attempt)
+                if not self.may_retry(attempt, delay, deadline):
+                    raise
+                reason = type(e).__name__
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self.delay(attempt, retry_after(response))
+                if not self.may_retry(attempt, delay, deadline):
+                    return response
+                await response.aclose()
+                reason = str(response.status_code)
+
+            RETRIES.inc(reason=reason)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def delay(self, attempt: int, requested: float | None = None) -> float:
+        """
+        Return the delay before a retry.
+
+        Args:
+            attempt (int): The number of the failed attempt, from 0.
+            requested (float | None): The delay asked for by the server, if any.
+
+        Returns:
+            float: The delay, in seconds.
+        """
+        if requested is None:
+            requested = random.uniform(0, self.base_delay * 2**attempt)
+        return min(max(requested, 0.0), self.max_delay)
+
+    def may_retry(self, attempt: int, delay: float, deadline: float | None) -> bool:
+        """
+        Return whether a failed attempt may be retried.
+
+        Args:
+            attempt (int): The number of the failed attempt, from 0.
+            delay (float): The delay before the retry, in seconds.
+            deadline (float | None): The `monotonic` time the request must end by.
+
+        Returns:
+            bool: Whether to retry, which takes a token from the budget.
+        """
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if deadline is not None and monotonic() + delay >= deadline:
+            return False
+        return self.budget.withdraw()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class LatencyWindow:
+    """
+    The most recent latencies of an operation, to derive percentiles from.
+    """
+
+    min_samples: int
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        """
+        Args:
+            size (int): The number of latencies kept.
+            min_samples (int): The number of latencies needed for a percentile.
+        """
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        """
+        Record a latency.
+
+        Args:
+            seconds (float): The latency, in seconds.
+        """
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """
+        Return a percentile of the recent latencies.
+
+        Args:
+            q (float): The percentile, between 0 and 100.
+
+        Returns:
+            float | None: The latency in seconds, or None until `min_samples`
+                latencies are recorded.
+        """
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    latencies: LatencyWindow,
+    percentile: float,
+    budget: RetryBudget,
+) -> T:
+    """
+    Run a call, starting a second copy if the first is slower than usual.
+
+    If the call hasn't finished once it has taken longer than `percentile`
+    of the recent latencies, the same call is started again, at the cost of
+    a retry from the budget. The first copy to succeed wins and the other is
+    cancelled. Only calls without side effects beyond their result, such as
+    model responses, should be hedged.
+
+    Args:
+        call (Callable[[], Awaitable[T]]): Starts the call.
+        latencies (LatencyWindow): The recent latencies of the call.
+        percentile (float): The percentile after which to hedge.
+        budget (RetryBudget): The budget the hedge is taken from.
+
+    Returns:
+        T: The result of the first copy to succeed.
+    """
+    start = perf_counter()
+    delay = latencies.percentile(percentile)
+    first = asyncio.ensure_future(call())
+    tasks = [first]
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and budget.withdraw():
+                HEDGES.inc()
+                tasks.append(asyncio.ensure_future(call()))
+
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        HEDGE_WINS.inc()
+                    latencies.record(perf_counter() - start)
+                    return task.result()
+            if not pending:
+                # Every copy failed, report the error of the first
+                return first.result()
+    finally:
+        for task in tasks:
+            task.cancel()
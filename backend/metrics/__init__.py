@@ -0,0 +1,29 @@
+from .metrics import REGISTRY, Counter, Histogram, MetricsRegistry
+from .tracing import (
+    Span,
+    Trace,
+    current_trace,
+    observe,
+    record_usage,
+    span,
+    start_trace,
+)
+from .turn_log import TurnLogWriter, get_turn_log, read_turn_log
+
+
+__all__ = [
+    "REGISTRY",
+    "Counter",
+    "Histogram",
+    "MetricsRegistry",
+    "Span",
+    "Trace",
+    "current_trace",
+    "observe",
+    "record_usage",
+    "span",
+    "start_trace",
+    "TurnLogWriter",
+    "get_turn_log",
+    "read_turn_log",
+]
@@ -0,0 +1,282 @@
+from bisect import bisect_left
+from typing import Callable, Mapping
+import threading
+
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    """
+    Format the labels of a sample in the Prometheus text format.
+
+    Args:
+        names (tuple[str, ...]): The label names.
+        values (tuple[str, ...]): The label values.
+        extra (str): An already formatted label to append, if any.
+
+    Returns:
+        str: The labels in braces, or an empty string if there are none.
+    """
+    pairs = [
+        f'{name}="{value}"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    A monotonically increasing count, per combination of label values.
+    """
+
+    name: str
+    help: str
+    labels: tuple[str, ...]
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        """
+        Args:
+            name (str): The name of the metric.
+            help (str): The description of the metric.
+            labels (tuple[str, ...]): The names of its labels.
+        """
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """
+        Increase the count.
+
+        Args:
+            amount (float): The amount to add.
+            **labels (str): The value of every label.
+        """
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        """
+        Return the count for some label values.
+
+        Args:
+            **labels (str): The value of every label.
+
+        Returns:
+            float: The count.
+        """
+        return self._values.get(tuple(str(labels[name]) for name in self.labels), 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{format_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """
+    A distribution of observed values in fixed buckets, per combination of
+    label values. Observing a value is a bisection and three additions.
+    """
+
+    name: str
+    help: str
+    labels: tuple[str, ...]
+    buckets: tuple[float, ...]
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        """
+        Args:
+            name (str): The name of the metric.
+            help (str): The description of the metric.
+            labels (tuple[str, ...]): The names of its labels.
+            buckets (tuple[float, ...]): The upper bounds of the buckets, sorted.
+        """
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # Per label values: the count of each bucket and of +Inf, and the sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Record an observed value.
+
+        Args:
+            value (float): The value.
+            **labels (str): The value of every label.
+        """
+        key = tuple(str(labels[name]) for name in self.labels)
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][bucket] += 1
+            entry[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        """
+        Return the number of observed values for some label values.
+
+        Args:
+            **labels (str): The value of every label.
+
+        Returns:
+            int: The number of values.
+        """
+        entry = self._values.get(tuple(str(labels[name]) for name in self.labels))
+        return sum(entry[0]) if entry is not None else 0
+
+    def total(self, **labels: str) -> float:
+        """
+        Return the sum of the observed values for some label values.
+
+        Args:
+            **labels (str): The value of every label.
+
+        Returns:
+            float: The sum of the values.
+        """
+        entry = self._values.get(tuple(str(labels[name]) for name in self.labels))
+        return entry[1][0] if entry is not None else 0.0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = [(key, (list(counts), total[0])) for key, (counts, total) in self._values.items()]
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = f'le="{bound if isinstance(bound, str) else f"{bound:g}"}"'
+                lines.append(
+                    f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}"
+                )
+            labels = format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {total:g}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process, rendered in the Prometheus text format.
+
+    Besides counters and histograms updated on the hot path, collectors are
+    called at scrape time to report gauges, such as cache statistics.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._collectors: dict[str, Callable[[], Mapping[str, float]]] = {}
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        """
+        Return the counter with a name, creating it on first use.
+
+        Args:
+            name (str): The name of the metric.
+            help (str): The description of the metric.
+            labels (tuple[str, ...]): The names of its labels.
+
+        Returns:
+            Counter: The counter.
+
+        Raises:
+            ValueError: If a histogram already has that name.
+        """
+        metric = self._metrics.setdefault(name, Counter(name, help, labels))
+        if not isinstance(metric, Counter):
+            raise ValueError(f"Metric {name!r} is not a counter")
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """
+        Return the histogram with a name, creating it on first use.
+
+        Args:
+            name (str): The name of the metric.
+            help (str): The description of the metric.
+            labels (tuple[str, ...]): The names of its labels.
+            buckets (tuple[float, ...]): The upper bounds of the buckets.
+
+        Returns:
+            Histogram: The histogram.
+
+        Raises:
+            ValueError: If a counter already has that name.
+        """
+        metric = self._metrics.setdefault(name, Histogram(name, help, labels, buckets))
+        if not isinstance(metric, Histogram):
+            raise ValueError(f"Metric {name!r} is not a histogram")
+        return metric
+
+    def add_collector(
+        self, prefix: str, collect: Callable[[], Mapping[str, float]]
+    ) -> None:
+        """
+        Report the values returned by a function as gauges at every scrape.
+
+        Args:
+            prefix (str): The prefix of the gauge names.
+            collect (Callable[[], Mapping[str, float]]): Returns the gauge values
+                by name, such as the `stats` method of a cache.
+        """
+        self._collectors[prefix] = collect
+
+    def render(self) -> str:
+        """
+        Return every metric in the Prometheus text format.
+
+        Returns:
+            str: The exposition text.
+        """
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines += metric.render()
+        for prefix, collect in self._collectors.items():
+            for name, value in collect().items():
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
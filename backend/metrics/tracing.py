@@ -0,0 +1,151 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Iterator
+
+from openai.types.responses.response import Response
+
+from .metrics import REGISTRY
+
+
+# Bounds the memory of a trace left current in a long-lived context
+MAX_SPANS: int = 1024
+
+SPAN_SECONDS = REGISTRY.histogram(
+    "chat_span_seconds", "Time spent in each stage of a chat turn.", ("span",)
+)
+TOKENS = REGISTRY.counter(
+    "chat_tokens_total", "Tokens used by model responses.", ("kind",)
+)
+RESPONSES = REGISTRY.counter("chat_responses_total", "Model responses received.")
+TURNS = REGISTRY.counter("chat_turns_total", "Chat turns started.")
+
+
+@dataclass
+class Span:
+    """
+    Represents a timed stage of a chat turn.
+
+    Attributes:
+        name: The name of the stage.
+        start: The time the stage started, relative to the start of the turn.
+        duration: The time the stage took, in seconds.
+    """
+
+    name: str
+    start: float
+    duration: float
+
+
+@dataclass
+class Trace:
+    """
+    Represents the stages and token usage of one chat turn.
+
+    Attributes:
+        started_at: The `perf_counter` time the turn started.
+        spans: The finished stages of the turn, in order of completion.
+        input_tokens: The input tokens of every response of the turn.
+        output_tokens: The output tokens of every response of the turn.
+    """
+
+    started_at: float = field(default_factory=perf_counter)
+    spans: list[Span] = field(default_factory=list)
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+    def total(self, name: str) -> float:
+        """
+        Return the time spent in every stage with a name.
+
+        Args:
+            name (str): The name of the stages.
+
+        Returns:
+            float: The total duration, in seconds.
+        """
+        return sum(span.duration for span in self.spans if span.name == name)
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+
+
+def start_trace() -> Trace:
+    """
+    Start the trace of a chat turn in the current context.
+
+    Spans finished in this context, and in tasks created from it, are
+    recorded into the trace.
+
+    Returns:
+        Trace: The new trace.
+    """
+    trace = Trace()
+    _current_trace.set(trace)
+    TURNS.inc()
+    return trace
+
+
+def current_trace() -> Trace | None:
+    """
+    Return the trace of the current chat turn, if one was started.
+
+    Returns:
+        Trace | None: The trace.
+    """
+    return _current_trace.get()
+
+
+def observe(name: str, start: float, end: float | None = None) -> float:
+    """
+    Record a stage that started at a given time.
+
+    Args:
+        name (str): The name of the stage.
+        start (float): The `perf_counter` time the stage started.
+        end (float | None): The `perf_counter` time it ended, or None for now.
+
+    Returns:
+        float: The duration of the stage, in seconds.
+    """
+    end = perf_counter() if end is None else end
+    duration = end - start
+    SPAN_SECONDS.observe(duration, span=name)
+    trace = _current_trace.get()
+    if trace is not None and len(trace.spans) < MAX_SPANS:
+        trace.spans.append(Span(name, start - trace.started_at, duration))
+    return duration
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Time the enclosed block as a stage of the current chat turn.
+
+    Args:
+        name (str): The name of the stage.
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, start)
+
+
+def record_usage(response: Response) -> None:
+    """
+    Record the token usage of a model response.
+
+    Args:
+        response (Response): The response.
+    """
+    RESPONSES.inc()
+    if response.usage is None:
+        return
+    TOKENS.inc(response.usage.input_tokens, kind="input")
+    TOKENS.inc(response.usage.output_tokens, kind="output")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.input_tokens += response.usage.input_tokens
+        trace.output_tokens += response.usage.output_tokens
@@ -0,0 +1,276 @@
+from datetime import datetime
+from os import getenv
+from time import monotonic, time
+from typing import Iterator, TextIO
+import atexit
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+
+from .metrics import REGISTRY
+
+
+logger = logging.getLogger(__name__)
+
+TURN_LOG: str = getenv("TURN_LOG", "logs/requests.jsonl")
+TURN_LOG_MAX_BYTES: int = int(getenv("TURN_LOG_MAX_BYTES", str(64 * 1024 * 1024)))
+TURN_LOG_MAX_AGE: float = float(getenv("TURN_LOG_MAX_AGE", str(24 * 3600)))
+TURN_LOG_COMPRESS: bool = getenv("TURN_LOG_COMPRESS", "1") != "0"
+
+WRITTEN = REGISTRY.counter("chat_turn_log_written_total", "Turn records written.")
+DROPPED = REGISTRY.counter(
+    "chat_turn_log_dropped_total", "Turn records dropped because the queue was full."
+)
+
+
+class TurnLogWriter:
+    """
+    Appends turn records to a JSON lines file without blocking the caller.
+
+    Records are queued in memory and a background thread encodes and writes
+    them in batches. When the queue is full, new records are dropped and
+    counted rather than making the caller wait. The file is rotated once it
+    reaches `max_bytes` or `max_age`, even while no records arrive, and a
+    file left untouched for `max_age` by an earlier process is rotated when
+    the writer starts. Rotated files are optionally gzipped, and only the
+    `backups` most recent are kept. A batch that fails to be written is
+    logged and lost, and the writer carries on with the next.
+    """
+
+    path: str
+    max_bytes: int
+    max_age: float
+    compress: bool
+    backups: int
+    written: int
+    dropped: int
+
+    def __init__(
+        self,
+        path: str = TURN_LOG,
+        max_bytes: int = TURN_LOG_MAX_BYTES,
+        max_age: float = TURN_LOG_MAX_AGE,
+        compress: bool = TURN_LOG_COMPRESS,
+        backups: int = 10,
+        max_queued: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+    ):
+        """
+        Args:
+            path (str): The path of the log file.
+            max_bytes (int): The size at which the file is rotated.
+            max_age (float): The age at which the file is rotated, in seconds.
+            compress (bool): Whether rotated files are gzipped.
+            backups (int): The number of rotated files to keep.
+            max_queued (int): The number of records that may wait to be written.
+            batch_size (int): The maximum number of records written at once.
+            flush_interval (float): The longest a record waits before being
+                written, in seconds.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.backups = backups
+        self.written = 0
+        self.dropped = 0
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue: queue.Queue[dict | None] = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def write(self, record: dict) -> bool:
+        """
+        Queue a record to be written.
+
+        Args:
+            record (dict): The JSON serializable record.
+
+        Returns:
+            bool: False if the record was dropped because the queue is full.
+        """
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            DROPPED.inc()
+            return False
+        return True
+
+    def flush(self) -> None:
+        """
+        Wait until every queued record is written.
+        """
+        self._queue.join()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Write every queued record and stop the writer thread.
+
+        Args:
+            timeout (float): The longest to wait for room in the queue, and
+                then for the queued records to be written, in seconds.
+        """
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning("Turn log %s is not draining, closing without it", self.path)
+            return
+        self._thread.join(timeout)
+
+    def _write_loop(self) -> None:
+        file: TextIO | None = None
+        opened_at = monotonic()
+        try:
+            # A file an earlier process left untouched belongs to a past period
+            if (
+                os.path.exists(self.path)
+                and time() - os.path.getmtime(self.path) >= self.max_age
+            ):
+                self._rotate()
+            file = self._open()
+        except OSError:
+            logger.exception("Failed to open the turn log %s", self.path)
+
+        running = True
+        while running:
+            # Block for the first record, or until the file is due for rotation,
+            # then take whatever arrives in time
+            timeout = None
+            if file is not None:
+                timeout = opened_at + self.max_age - monotonic()
+                timeout = min(threading.TIMEOUT_MAX, max(0.0, timeout))
+            try:
+                batch = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+            deadline = monotonic() + self._flush_interval
+            while batch and len(batch) < self._batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - monotonic())))
+                except queue.Empty:
+                    break
+
+            running = None not in batch
+            try:
+                if file is None:
+                    file = self._open()
+                    opened_at = monotonic()
+                self._write_batch(file, [record for record in batch if record is not None])
+                if file.tell() >= self.max_bytes or monotonic() - opened_at >= self.max_age:
+                    file.close()
+                    file = None
+                    self._rotate()
+                    file = self._open()
+                    opened_at = monotonic()
+            except Exception:
+                logger.exception("Failed to write the turn log %s", self.path)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        if file is not None:
+            file.close()
+
+    def _open(self) -> TextIO:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return open(self.path, "a", encoding="utf-8")
+
+    def _write_batch(self, file: TextIO, records: list[dict]) -> None:
+        if not records:
+            return
+        lines = []
+        for record in records:
+            try:
+                lines.append(json.dumps(record, default=str))
+            except (TypeError, ValueError):
+                self.dropped += 1
+                DROPPED.inc()
+        file.write("".join(f"{line}\n" for line in lines))
+        file.flush()
+        self.written += len(lines)
+        WRITTEN.inc(len(lines))
+
+    def _rotate(self) -> None:
+        if os.path.getsize(self.path) == 0:
+            return
+        stem, extension = os.path.splitext(self.path)
+        rotated = f"{stem}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{extension}"
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, "rb") as source, gzip.open(f"{rotated}.gz", "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.remove(rotated)
+
+        for old in rotated_files(self.path)[: -self.backups or None]:
+            os.remove(old)
+
+
+def rotated_files(path: str) -> list[str]:
+    """
+    List the rotated files of a log, oldest first.
+
+    Args:
+        path (str): The path of the log file.
+
+    Returns:
+        list[str]: The paths of the rotated files.
+    """
+    stem, extension = os.path.splitext(path)
+    return sorted(
+        glob.glob(f"{glob.escape(stem)}.*{extension}")
+        + glob.glob(f"{glob.escape(stem)}.*{extension}.gz")
+    )
+
+
+def read_turn_log(path: str = TURN_LOG, rotated: bool = True) -> Iterator[dict]:
+    """
+    Read the records of a turn log lazily, oldest first.
+
+    Lines that are not valid JSON, such as a line still being written, are
+    skipped.
+
+    Args:
+        path (str): The path of the log file.
+        rotated (bool): Whether to read the rotated files before the log.
+
+    Yields:
+        dict: The records.
+    """
+    paths = (rotated_files(path) if rotated else []) + [path]
+    for file_path in paths:
+        if not os.path.exists(file_path):
+            continue
+        opener = gzip.open if file_path.endswith(".gz") else open
+        with opener(file_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+_turn_log: TurnLogWriter | None = None
+
+
+def get_turn_log() -> TurnLogWriter | None:
+    """
+    Return the writer of `TURN_LOG`, creating it on first use.
+
+    The writer is closed when the process exits, so queued records are kept.
+
+    Returns:
+        TurnLogWriter | None: The writer, or None if `TURN_LOG` is empty,
+            which disables the log.
+    """
+    global _turn_log
+    if _turn_log is None and TURN_LOG:
+        _turn_log = TurnLogWriter()
+        atexit.register(_turn_log.close)
+    return _turn_log
@@ -1,3 +1,20 @@
 from .orchestrator import Agent
+from .context import ConversationState, TurnStats
+from .tool_cache import ToolCache
+from .prefetch import ToolPrefetcher
+from .scheduler import Overloaded, TurnScheduler
+from .speech import AudioSink, LocalSink
+from .audio_stream import AudioStream
 
-__all__ = ["Agent"]
+__all__ = [
+    "Agent",
+    "ConversationState",
+    "TurnStats",
+    "ToolCache",
+    "ToolPrefetcher",
+    "Overloaded",
+    "TurnScheduler",
+    "AudioSink",
+    "LocalSink",
+    "AudioStream",
+]
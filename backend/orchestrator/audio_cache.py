@@ -0,0 +1,187 @@
+from collections import OrderedDict
+from hashlib import sha256
+import json
+import os
+import re
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a text before it is used as part of a cache key.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The text with surrounding whitespace removed and inner
+            whitespace collapsed to single spaces.
+    """
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(
+    text: str, model: str, voice: str, instructions: str, response_format: str
+) -> str:
+    """
+    Return the content address of a synthesized piece of audio.
+
+    Args:
+        text (str): The synthesized text.
+        model (str): The speech model.
+        voice (str): The voice of the speech.
+        instructions (str): The instructions given to the speech model.
+        response_format (str): The audio format.
+
+    Returns:
+        str: A hex digest identifying the audio.
+    """
+    payload = json.dumps(
+        [model, voice, instructions, response_format, normalize_text(text)]
+    )
+    return sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Two-tier cache of synthesized PCM audio.
+
+    Recently used audio is held in a bounded in-memory LRU. Every entry is
+    also written to a size-capped directory on disk, from which it is
+    memory-mapped on a memory miss, so playback never copies the whole file.
+    """
+
+    directory: str
+    max_memory_bytes: int
+    max_disk_bytes: int
+    memory_hits: int
+    disk_hits: int
+    misses: int
+
+    def __init__(
+        self,
+        directory: str = ".cache/tts",
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        """
+        Args:
+            directory (str): The directory of the disk tier.
+            max_memory_bytes (int): The capacity of the memory tier.
+            max_disk_bytes (int): The capacity of the disk tier.
+        """
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._memory_bytes: int = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes: int = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        entries = [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith(".pcm")
+        ]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            self._disk[entry.name.removesuffix(".pcm")] = entry.stat().st_size
+            self._disk_bytes += entry.stat().st_size
+
+    def get(self, key: str) -> np.ndarray | None:
+        """
+        Look up audio in the cache.
+
+        Args:
+            key (str): The content address of the audio.
+
+        Returns:
+            np.ndarray | None: The 16-bit PCM samples, or None on a miss.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return self._memory[key]
+
+        if key in self._disk:
+            path = self._path(key)
+            try:
+                audio = np.memmap(path, dtype=np.int16, mode="r")
+                os.utime(path)
+            except (OSError, ValueError):
+                self._forget(key)
+            else:
+                self._disk.move_to_end(key)
+                self.disk_hits += 1
+                self._remember(key, audio)
+                return audio
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, audio: np.ndarray) -> None:
+        """
+        Store audio in both tiers of the cache.
+
+        Args:
+            key (str): The content address of the audio.
+            audio (np.ndarray): The 16-bit PCM samples.
+        """
+        self._remember(key, audio)
+        if key in self._disk:
+            return
+
+        path = self._path(key)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(audio.tobytes())
+        os.replace(f"{path}.tmp", path)
+        self._disk[key] = audio.nbytes
+        self._disk_bytes += audio.nbytes
+
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+            oldest = next(iter(self._disk))
+            self._forget(oldest)
+
+    def stats(self) -> dict[str, float]:
+        """
+        Return the usage statistics of the cache.
+
+        Returns:
+            dict[str, float]: Hit and miss counts, the overall hit rate, and
+                the number of bytes held by each tier.
+        """
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups
+            if lookups
+            else 0.0,
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def _remember(self, key: str, audio: np.ndarray) -> None:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = audio
+        self._memory_bytes += audio.nbytes
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def _forget(self, key: str) -> None:
+        self._disk_bytes -= self._disk.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass  # Still mapped for playback, or already gone
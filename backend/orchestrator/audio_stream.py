@@ -0,0 +1,78 @@
+from os import getenv
+from typing import AsyncIterator
+import asyncio
+import zlib
+
+from backend.metrics import REGISTRY
+from .speech import AudioSink
+
+
+# The audio chunks held for a listener that is not reading, about 10 s of speech
+AUDIO_STREAM_MAX_CHUNKS: int = int(getenv("AUDIO_STREAM_MAX_CHUNKS", "100"))
+
+FORWARDED_BYTES = REGISTRY.counter(
+    "chat_audio_forwarded_bytes_total", "Speech audio bytes sent to browsers."
+)
+
+
+class AudioStream(AudioSink):
+    """
+    Forwards speech to a listener, such as a browser reading a chunked HTTP
+    response, instead of playing it on the server.
+
+    Chunks are handed over as soon as they are synthesized and the pipeline
+    moves on without waiting for them to be played, so the server's work on
+    a turn ends once its audio is forwarded. Up to `max_chunks` chunks are
+    held while no one reads; beyond that, the pipeline waits for the
+    listener to catch up rather than cutting words out of a sentence.
+    """
+
+    max_chunks: int
+
+    def __init__(self, max_chunks: int = AUDIO_STREAM_MAX_CHUNKS):
+        """
+        Args:
+            max_chunks (int): The most chunks held for the listener.
+        """
+        self.max_chunks = max_chunks
+        self._chunks: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=max_chunks)
+
+    async def play(self, chunks: AsyncIterator[bytes]) -> None:
+        async for chunk in chunks:
+            await self._chunks.put(chunk)
+
+    def clear(self) -> None:
+        while not self._chunks.empty():
+            self._chunks.get_nowait()
+
+    def close(self) -> None:
+        """
+        End the stream, once the chunks already held are read.
+        """
+        if self.speech is not None:
+            self.speech.cancel()
+        try:
+            self._chunks.put_nowait(None)
+        except asyncio.QueueFull:
+            self.clear()
+            self._chunks.put_nowait(None)
+
+    async def read(self, compress: bool = False) -> AsyncIterator[bytes]:
+        """
+        Read the audio as it is written, until the stream is closed.
+
+        Args:
+            compress (bool): Whether to gzip the audio, flushing after each
+                chunk so the listener can decode it as it arrives.
+
+        Yields:
+            bytes: The audio, or its gzip encoding.
+        """
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        while (chunk := await self._chunks.get()) is not None:
+            FORWARDED_BYTES.inc(len(chunk))
+            if compressor is not None:
+                chunk = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield chunk
+        if compressor is not None:
+            yield compressor.flush()
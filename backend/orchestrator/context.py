@@ -0,0 +1,127 @@
+from dataclasses import dataclass, field
+from typing import Sequence
+import json
+
+from openai.types.responses.response import Response
+
+from backend.types import ChatMessage
+
+
+SUMMARY_PROMPT: str = (
+    "Summarize the conversation below for the assistant that will continue it. "
+    "Keep names, book titles, requests that are still open and any decisions made. "
+    "Write at most one short paragraph."
+)
+
+
+@dataclass
+class TurnStats:
+    """
+    Represents the payload sent to the model during one chat turn.
+
+    Attributes:
+        bytes_sent: The size of the serialized input of every request.
+        input_tokens: The input tokens billed for every request.
+        requests: The number of requests made to the model.
+    """
+
+    bytes_sent: int = 0
+    input_tokens: int = 0
+    requests: int = 0
+
+
+@dataclass
+class ConversationState:
+    """
+    Represents the server-side state of a conversation with the agent.
+
+    Turns are chained through `previous_response_id`, so only the messages
+    added since the last turn are sent. Once the chained context grows past
+    the compaction threshold, the older messages are folded into `summary`
+    and a new chain is started from a window of the recent messages.
+
+    Attributes:
+        previous_response_id: The response the next turn continues from.
+        sent_count: The number of messages already part of the chain.
+        summary: A summary of the messages that were compacted.
+        summarized_count: The number of messages covered by the summary.
+        last_input_tokens: The input tokens of the most recent request.
+        turn: The payload statistics of the current turn.
+        totals: The payload statistics of every turn, added up, so the
+            state stays the same size however long the conversation runs.
+        turn_count: The number of turns started.
+    """
+
+    previous_response_id: str | None = None
+    sent_count: int = 0
+    summary: str = ""
+    summarized_count: int = 0
+    last_input_tokens: int = 0
+    turn: TurnStats = field(default_factory=TurnStats)
+    totals: TurnStats = field(default_factory=TurnStats)
+    turn_count: int = 0
+
+    def begin_turn(self) -> None:
+        """
+        Start collecting the payload statistics of a new turn.
+        """
+        self.turn = TurnStats()
+        self.turn_count += 1
+
+    def record(self, items: list[dict], response: Response) -> None:
+        """
+        Record the payload of a request made during the current turn.
+
+        Args:
+            items (list[dict]): The input items sent to the model.
+            response (Response): The response to the request.
+        """
+        bytes_sent = len(json.dumps(items))
+        input_tokens = response.usage.input_tokens if response.usage is not None else 0
+        for stats in (self.turn, self.totals):
+            stats.bytes_sent += bytes_sent
+            stats.requests += 1
+            stats.input_tokens += input_tokens
+        if response.usage is not None:
+            self.last_input_tokens = input_tokens
+
+    def complete(self, response: Response, message_count: int) -> None:
+        """
+        Advance the chain past a finished turn.
+
+        Args:
+            response (Response): The final response of the turn.
+            message_count (int): The number of messages in the conversation,
+                including the reply to this turn.
+        """
+        self.previous_response_id = response.id
+        self.sent_count = message_count
+
+
+def serialize_window(
+    messages: Sequence[ChatMessage], state: ConversationState
+) -> list[dict]:
+    """
+    Serialize the messages not covered by the summary of a conversation.
+
+    Args:
+        messages (Sequence[ChatMessage]): The messages of the conversation.
+        state (ConversationState): The state of the conversation.
+
+    Returns:
+        list[dict]: The summary, if any, as a developer message, followed by
+            the 'role' and 'content' of each message after it.
+    """
+    items: list[dict] = []
+    if state.summary:
+        items.append(
+            {
+                "role": "developer",
+                "content": f"Summary of the earlier conversation: {state.summary}",
+            }
+        )
+    items.extend(
+        {"role": message.role, "content": message.content}
+        for message in messages[state.summarized_count :]
+    )
+    return items
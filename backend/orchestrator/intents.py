@@ -0,0 +1,227 @@
+from dataclasses import dataclass
+from os import getenv
+import re
+
+from backend.metrics import REGISTRY
+from backend.tools.catalog import get_catalog
+
+
+# Requests are answered locally from this confidence up, above 1 disables
+INTENT_THRESHOLD: float = float(getenv("INTENT_THRESHOLD", "0.9"))
+
+INTENT_HITS = REGISTRY.counter(
+    "chat_intent_hits_total", "Turns answered by the local intent fast path.", ("intent",)
+)
+INTENT_MISSES = REGISTRY.counter(
+    "chat_intent_misses_total", "Turns passed on to the model."
+)
+
+# Greetings and politeness around a command, which don't change its meaning
+LEADING_FILLER = re.compile(
+    r"^(?:(?:hi|hello|hey|ok|okay|please|kindly|can you|could you|would you|"
+    r"i'd like to|i would like to|i want to|i need to)\b[\s,]*)+",
+    re.IGNORECASE,
+)
+TRAILING_FILLER = re.compile(
+    r"(?:[\s,]*\b(?:please|thanks|thank you|for me)\b)*[\s.!?]*$", re.IGNORECASE
+)
+QUOTES = "\"'“”‘’*_"
+
+
+@dataclass(frozen=True)
+class IntentRule:
+    """
+    Represents the phrasings of a request that a tool answers on its own.
+
+    Attributes:
+        name: The name of the intent.
+        tool: The tool that answers it.
+        patterns: The phrasings, matched against the whole request, with the
+            book title captured as `title`.
+        weight: The confidence of a phrasing match, before the title is checked.
+    """
+
+    name: str
+    tool: str
+    patterns: tuple[re.Pattern, ...]
+    weight: float = 1.0
+
+
+@dataclass
+class IntentMatch:
+    """
+    Represents a request recognized by the fast path.
+
+    Attributes:
+        intent: The name of the intent.
+        tool: The tool that answers it.
+        arguments: The arguments of the tool call.
+        confidence: How sure the match is, from 0 to 1.
+    """
+
+    intent: str
+    tool: str
+    arguments: dict
+    confidence: float
+
+
+def compile_patterns(*patterns: str) -> tuple[re.Pattern, ...]:
+    return tuple(re.compile(pattern, re.IGNORECASE) for pattern in patterns)
+
+
+INTENT_RULES: list[IntentRule] = [
+    IntentRule(
+        "renew",
+        "renew_book",
+        compile_patterns(
+            r"renew (?:my copy of |my loan of |the book )?(?P<title>.+)",
+            r"extend (?:my|the) loan (?:of|on|for) (?P<title>.+)",
+        ),
+    ),
+    IntentRule(
+        "hold",
+        "place_on_hold",
+        compile_patterns(
+            r"(?:put|place) (?:the book )?(?P<title>.+) on hold",
+            r"(?:put|place) a hold on (?:the book )?(?P<title>.+)",
+            r"hold (?:the book )?(?P<title>.+)",
+        ),
+    ),
+    IntentRule(
+        "hold",
+        "place_on_hold",
+        # Reserving can be about a room or a computer too
+        compile_patterns(r"reserve (?:the book )?(?P<title>.+)"),
+        weight=0.9,
+    ),
+]
+
+
+class IntentRouter:
+    """
+    Recognizes requests that a single tool call answers, such as renewing
+    or holding a named book, so they skip the model entirely.
+
+    A request matches when the whole of it, once greetings and politeness
+    are stripped, is one of the known phrasings of an intent. Its confidence
+    is the weight of the phrasing times the similarity of the captured title
+    to the closest title in the catalog, so a title the catalog doesn't
+    hold, or a pronoun such as "it", is left to the model. Classifying a
+    request takes microseconds.
+    """
+
+    rules: list[IntentRule]
+    threshold: float
+    hits: int
+    misses: int
+
+    def __init__(
+        self, rules: list[IntentRule] = INTENT_RULES, threshold: float = INTENT_THRESHOLD
+    ):
+        """
+        Args:
+            rules (list[IntentRule]): The intents to recognize, in order of priority.
+            threshold (float): The confidence from which a match is answered locally.
+        """
+        self.rules = rules
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._local_seconds = 0.0
+        self._model_seconds = 0.0
+        self._model_turns = 0
+
+    def classify(self, text: str) -> IntentMatch | None:
+        """
+        Find the intent of a request.
+
+        Args:
+            text (str): The request.
+
+        Returns:
+            IntentMatch | None: The most confident match, with the title
+                replaced by the catalog's, or None if no phrasing matches.
+        """
+        request = TRAILING_FILLER.sub("", LEADING_FILLER.sub("", text.strip()))
+        best: IntentMatch | None = None
+        for rule in self.rules:
+            for pattern in rule.patterns:
+                found = pattern.fullmatch(request)
+                if found is None:
+                    continue
+                title = found.group("title").strip(QUOTES + " ")
+                matches = get_catalog().index.search(title, limit=1, min_score=0.0)
+                if not matches:
+                    continue
+                title_id, score = matches[0]
+                confidence = rule.weight * score
+                if best is None or confidence > best.confidence:
+                    best = IntentMatch(
+                        intent=rule.name,
+                        tool=rule.tool,
+                        arguments={"book_title": get_catalog().index.titles[title_id]},
+                        confidence=confidence,
+                    )
+        return best
+
+    def route(self, text: str) -> IntentMatch | None:
+        """
+        Return the match of a request if it is confident enough to answer locally.
+
+        Args:
+            text (str): The request.
+
+        Returns:
+            IntentMatch | None: The match, or None to ask the model.
+        """
+        match = self.classify(text) if self.threshold <= 1 else None
+        if match is None or match.confidence < self.threshold:
+            return None
+        return match
+
+    def record_hit(self, intent: str, seconds: float) -> None:
+        """
+        Record a turn answered locally.
+
+        Args:
+            intent (str): The name of the intent.
+            seconds (float): The duration of the turn.
+        """
+        self.hits += 1
+        self._local_seconds += seconds
+        INTENT_HITS.inc(intent=intent)
+
+    def record_miss(self, seconds: float) -> None:
+        """
+        Record a turn answered by the model.
+
+        Args:
+            seconds (float): The duration of the turn.
+        """
+        self.misses += 1
+        self._model_seconds += seconds
+        self._model_turns += 1
+        INTENT_MISSES.inc()
+
+    def stats(self) -> dict[str, float]:
+        """
+        Return the hit rate of the fast path and the time it saved.
+
+        The saving is estimated from the mean duration of the turns answered
+        by the model, as if the turns answered locally had taken as long.
+
+        Returns:
+            dict[str, float]: The hits, misses, hit rate, mean local and model
+                turn durations and the estimated seconds saved.
+        """
+        turns = self.hits + self.misses
+        local_mean = self._local_seconds / self.hits if self.hits else 0.0
+        model_mean = self._model_seconds / self._model_turns if self._model_turns else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / turns if turns else 0.0,
+            "local_turn_seconds": local_mean,
+            "model_turn_seconds": model_mean,
+            "saved_seconds": max(0.0, model_mean - local_mean) * self.hits,
+        }
@@ -1,29 +1,61 @@
+from contextlib import nullcontext
 from os import getenv
 from datetime import datetime
+from time import perf_counter
+from typing import (
+    AsyncContextManager,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Literal,
+    Sequence,
+    overload,
+)
+import asyncio
 import json
 
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, AsyncStream, BadRequestError, NotFoundError
+from openai.types.responses import (
+    ResponseCompletedEvent,
+    ResponseOutputItemDoneEvent,
+    ResponseTextDeltaEvent,
+)
 from openai.types.responses.response import Response
-from openai.helpers import LocalAudioPlayer
-from dotenv import load_dotenv
-
-from backend.types import Message
-from backend.tools import locate_book, place_on_hold, renew_book
-
-
-def get_client() -> AsyncOpenAI:
-    """
-    Return an instance of the OpenAI client.
-    This function loads the `.env` file to get the
-    API key from the `OPENAI_API_KEY` environment variable.
-
-    Returns:
-        AsyncOpenAI: An instance of the OpenAI client.
-    """
-    load_dotenv()
-    return AsyncOpenAI(
-        api_key=getenv("OPENAI_API_KEY"),
-    )
+from openai.types.responses.response_function_tool_call import (
+    ResponseFunctionToolCall,
+)
+from openai.types.responses.response_stream_event import ResponseStreamEvent
+
+from backend.client import get_client, hedged_chat
+from backend.types import (
+    ChatMessage,
+    Message,
+    StreamEvent,
+    TextDelta,
+    ToolCallEvent,
+    ToolCallResult,
+)
+from backend.metrics import (
+    Trace,
+    TurnLogWriter,
+    get_turn_log,
+    observe,
+    record_usage,
+    span,
+    start_trace,
+)
+from backend.tools import TOOL_CONTEXT, ToolError, get_registry, tool_result_phrases
+from .audio_cache import AudioCache
+from .intents import IntentMatch, IntentRouter
+from .prefetch import Speculation, ToolPrefetcher
+from .scheduler import Overloaded, TurnScheduler
+from .context import (
+    SUMMARY_PROMPT,
+    ConversationState,
+    serialize_window,
+)
+from .speech import AudioSink, LocalSink, SpeechPipeline, prewarm
+from .tool_cache import ToolCache
 
 
 def load_prompt() -> str:
@@ -39,26 +71,28 @@ def load_prompt() -> str:
         return f.read()
 
 
-def load_tools() -> list[dict]:
+def load_tools(exclude: tuple[str, ...] = ()) -> list[dict]:
     """
-    Load and return the tool configurations from a JSON file.
-    The JSON file should be located at 'backend/orchestrator/tools.json' and
-    contains a list of tool configurations, each represented as a dictionary.
+    Return the definitions of the tools in the tool registry.
+    The same definitions are written to 'backend/orchestrator/tools.json'
+    by `python -m backend.tools`.
+
+    Args:
+        exclude (tuple[str, ...]): The names of tools to leave out.
 
     Returns:
         list[dict]: A list of dictionaries, where each dictionary represents
         a tool configuration.
     """
-    with open(file="backend/orchestrator/tools.json", mode="r", encoding="utf-8") as f:
-        return json.loads(f.read())
+    return get_registry().schemas(exclude)
 
 
-def serialize_messages(messages: list[Message]) -> list[dict]:
+def serialize_messages(messages: Sequence[ChatMessage]) -> list[dict]:
     """
     Serialize a list of Message objects into a list of dictionaries.
 
     Args:
-        messages (list[Message]): A list of Message objects to be serialized.
+        messages (Sequence[ChatMessage]): A list of Message objects to be serialized.
 
     Returns:
         list[dict]: A list of dictionaries, each containing the 'role' and
@@ -68,48 +102,237 @@ def serialize_messages(messages: list[Message]) -> list[dict]:
     return [{"role": message.role, "content": message.content} for message in messages]
 
 
+def has_function_calls(response: Response) -> bool:
+    """
+    Check whether a response from the agent requests any function calls.
+
+    Args:
+        response (Response): The response from the agent.
+
+    Returns:
+        bool: True if at least one output item is a function call.
+    """
+    return any(item.type == "function_call" for item in response.output)
+
+
+def follow_up(
+    messages: list[dict],
+    function_response: list[dict],
+    response: Response,
+    state: ConversationState | None,
+) -> tuple[list[dict], str | None]:
+    """
+    Return the input of the request that sends function outputs to the agent.
+
+    Args:
+        messages (list[dict]): The input of the previous request.
+        function_response (list[dict]): The function calls and their outputs.
+        response (Response): The response that requested the function calls.
+        state (ConversationState | None): The state of the conversation.
+
+    Returns:
+        tuple[list[dict], str | None]: The input items to send, and the
+            response they continue from, if any.
+    """
+    if state is None:
+        return [*messages, *function_response], None
+
+    # The calls are part of the chained response, only their outputs are new
+    outputs = [
+        item for item in function_response if item["type"] == "function_call_output"
+    ]
+    return outputs, response.id
+
+
+def is_chain_start(
+    previous_response_id: str | None, state: ConversationState | None
+) -> bool:
+    """
+    Check whether a request continued the chain of a previous turn.
+
+    Args:
+        previous_response_id (str | None): The response the request continued.
+        state (ConversationState | None): The state of the conversation.
+
+    Returns:
+        bool: True if the request was the first of a chained turn.
+    """
+    return (
+        state is not None
+        and previous_response_id is not None
+        and previous_response_id == state.previous_response_id
+    )
+
+
+# Tool outputs longer than this are truncated in the turn log
+MAX_LOGGED_OUTPUT: int = 2000
+
+
 class Agent:
     """
     Orchestrates the interaction between the agent and the OpenAI API.
     """
 
     client: AsyncOpenAI
+    speech_client: AsyncOpenAI
     prompt: str
     tools: list[dict]
+    local_sink: LocalSink
+    audio_cache: AudioCache
+    tool_cache: ToolCache
+    intents: IntentRouter
+    prefetcher: ToolPrefetcher
+    scheduler: TurnScheduler
+    turn_log: TurnLogWriter | None
     model_name: str = "gpt-4o-mini"
+    max_concurrent_tools: int = 4
+    compaction_threshold: int = int(getenv("COMPACTION_THRESHOLD", "8000"))
+    keep_recent_messages: int = 6
+    retrieval_backend: str = getenv("RETRIEVAL_BACKEND", "file_search")
 
     def __init__(self):
-        self.client = get_client()
+        self.client = get_client("chat")
+        self.speech_client = get_client("tts")
         self.prompt = load_prompt()
-        self.tools = load_tools()
-
-    async def chat(self, messages: list[Message]) -> Message:
+        # Without the local index, documents are searched by file_search
+        self.tools = load_tools(
+            () if self.retrieval_backend == "local" else ("search_documents",)
+        )
+        self.local_sink = LocalSink()
+        self.audio_cache = AudioCache()
+        self.tool_cache = ToolCache()
+        self.intents = IntentRouter()
+        self.prefetcher = ToolPrefetcher(self.call_tool)
+        self.scheduler = TurnScheduler()
+        self.turn_log = get_turn_log()
+
+    async def chat(
+        self,
+        messages: Sequence[ChatMessage],
+        state: ConversationState | None = None,
+        session_id: str | None = None,
+        on_position: Callable[[int], None] | None = None,
+        sink: AudioSink | None = None,
+    ) -> Message:
         """
         Engage in a chat session with the agent.
 
         Args:
-            messages (list[Message]): A list of Message objects to send to the agent.
+            messages (Sequence[ChatMessage]): A list of Message objects to send to the agent.
+            state (ConversationState | None): The state of the conversation. If
+                given, only the messages added since the previous turn are sent,
+                and the caller is expected to append the returned message to
+                `messages`. Otherwise the whole conversation is sent.
+            session_id (str | None): The session the turn belongs to. If
+                given, the turn waits for `scheduler` to admit it before
+                calling the model, and holds and renewals are made for the
+                session's patron.
+            on_position (Callable[[int], None] | None): Called with the
+                position of the turn in the scheduler's queue while it waits.
+            sink (AudioSink | None): Where to speak the answer, by default
+                the speakers of the server.
 
         Returns:
             Message: The final response from the agent.
+
+        Raises:
+            Overloaded: If the scheduler sheds the turn.
+        """
+        # A new message interrupts any answer still being spoken
+        self.cancel_speech(sink)
+        trace = start_trace()
+        self.bind_patron(session_id)
+
+        # Requests a single tool call answers skip the model
+        if (local := await self.answer_locally(messages)) is not None:
+            match, result, reply = local
+            self.handle_speach(reply, sink)
+            self.intents.record_hit(match.intent, observe("turn", trace.started_at))
+            self.log_turn(messages, reply, [result], trace, False, match.intent)
+            return Message(content=reply, role="assistant", timestamp=datetime.now())
+
+        async with self.admit(session_id, on_position):
+            with self.speculate(messages) as speculation:
+                return await self.chat_with_model(
+                    messages, state, trace, sink, speculation
+                )
+
+    async def chat_with_model(
+        self,
+        messages: Sequence[ChatMessage],
+        state: ConversationState | None,
+        trace: Trace,
+        sink: AudioSink | None = None,
+        speculation: Speculation | None = None,
+    ) -> Message:
         """
+        Answer a chat turn with the model, running the tools it calls.
+
+        Args:
+            messages (Sequence[ChatMessage]): The messages of the conversation.
+            state (ConversationState | None): The state of the conversation.
+            trace (Trace): The trace of the turn.
+            sink (AudioSink | None): Where to speak the answer.
+            speculation (Speculation | None): The tool calls started ahead
+                of the model, which may answer those of its first response.
+
+        Returns:
+            Message: The final response from the agent.
+        """
+        if state is not None:
+            state.begin_turn()
+
         # Serialize messages
-        serialized_messages = serialize_messages(messages)
+        serialized_messages, previous_response_id = await self.prepare_input(
+            messages, state
+        )
 
         # Set state
         is_finished: bool = False
+        tool_results: list[ToolCallResult] = []
 
         # Loop until finished
         while not is_finished:
-            response = await self.handle_chat(serialized_messages)
-
-            if response.output[0].type == "function_call":
-                function_response = await self.handle_function_call(response)
-                serialized_messages.extend(function_response)
+            try:
+                response = await self.handle_chat(
+                    serialized_messages, previous_response_id=previous_response_id
+                )
+            except (BadRequestError, NotFoundError):
+                if state is None or not is_chain_start(previous_response_id, state):
+                    raise
+                # The chained response is gone, resend a window instead
+                state.previous_response_id = None
+                serialized_messages, previous_response_id = await self.prepare_input(
+                    messages, state
+                )
+                continue
+
+            record_usage(response)
+            if state is not None:
+                state.record(serialized_messages, response)
+
+            if has_function_calls(response):
+                function_response, results = await self.handle_function_call(
+                    response, speculation
+                )
+                tool_results += results
+                serialized_messages, previous_response_id = follow_up(
+                    serialized_messages, function_response, response, state
+                )
             else:
                 is_finished = True
 
-        await self.handle_speach(response.output_text)
+            if speculation is not None:
+                # Later calls may follow a change the prefetches didn't see
+                speculation.close()
+                speculation = None
+
+        if state is not None:
+            state.complete(response, len(messages) + 1)
+
+        self.handle_speach(response.output_text, sink)
+        self.intents.record_miss(observe("turn", trace.started_at))
+        self.log_turn(messages, response.output_text, tool_results, trace, False)
 
         return Message(
             content=response.output_text,
@@ -117,83 +340,616 @@ class Agent:
             timestamp=datetime.now(),
         )
 
-    async def handle_speach(self, text: str) -> None:
-        async with self.client.audio.speech.with_streaming_response.create(
-            model="gpt-4o-mini-tts",
-            voice="onyx",
-            input=text,
-            instructions="Speak in a calming professional tone.",
-            response_format="pcm",
-        ) as response:
-            await LocalAudioPlayer().play(response)
+    async def chat_stream(
+        self,
+        messages: Sequence[ChatMessage],
+        state: ConversationState | None = None,
+        session_id: str | None = None,
+        on_position: Callable[[int], None] | None = None,
+        sink: AudioSink | None = None,
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        Engage in a chat session with the agent, streaming the response.
+
+        Text is yielded as soon as the model produces it, so the caller can
+        render the answer while it is still being generated.
+
+        Args:
+            messages (Sequence[ChatMessage]): A list of Message objects to send to the agent.
+            state (ConversationState | None): The state of the conversation, as
+                for `chat`.
+            session_id (str | None): The session the turn belongs to, as for `chat`.
+            on_position (Callable[[int], None] | None): Called with the
+                position of the turn in the scheduler's queue while it waits.
+            sink (AudioSink | None): Where to speak the answer, as for `chat`.
+
+        Yields:
+            StreamEvent: A TextDelta for each text fragment, a ToolCallEvent for
+                each tool call requested by the model and, last, the final Message.
+
+        Raises:
+            Overloaded: If the scheduler sheds the turn.
+        """
+        # The speech tasks copy the context, so the trace must exist first
+        trace = start_trace()
+        self.bind_patron(session_id)
+        # A new message interrupts any answer still being spoken
+        speech = self.start_speech(sink)
+
+        # Requests a single tool call answers skip the model
+        if (local := await self.answer_locally(messages)) is not None:
+            match, result, reply = local
+            yield result
+            speech.feed(reply)
+            speech.finish()
+            yield TextDelta(delta=reply)
+            self.intents.record_hit(match.intent, observe("turn", trace.started_at))
+            self.log_turn(messages, reply, [result], trace, True, match.intent)
+            yield Message(content=reply, role="assistant", timestamp=datetime.now())
+            return
+
+        try:
+            async with self.admit(session_id, on_position):
+                with self.speculate(messages) as speculation:
+                    async for event in self.stream_with_model(
+                        messages, state, trace, speech, speculation
+                    ):
+                        yield event
+        except Overloaded:
+            speech.cancel()
+            raise
+
+    async def stream_with_model(
+        self,
+        messages: Sequence[ChatMessage],
+        state: ConversationState | None,
+        trace: Trace,
+        speech: SpeechPipeline,
+        speculation: Speculation | None = None,
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        Answer a chat turn with the model, streaming the response.
+
+        Args:
+            messages (Sequence[ChatMessage]): The messages of the conversation.
+            state (ConversationState | None): The state of the conversation.
+            trace (Trace): The trace of the turn.
+            speech (SpeechPipeline): The pipeline speaking the answer.
+            speculation (Speculation | None): The tool calls started ahead
+                of the model, as for `chat_with_model`.
+
+        Yields:
+            StreamEvent: The events of the turn, as for `chat_stream`.
+        """
+        if state is not None:
+            state.begin_turn()
+
+        # Serialize messages
+        serialized_messages, previous_response_id = await self.prepare_input(
+            messages, state
+        )
+
+        # Set state
+        is_finished: bool = False
+        tool_results: list[ToolCallResult] = []
+
+        # Loop until finished
+        while not is_finished:
+            completed: Response | None = None
+            try:
+                stream = await self.handle_chat(
+                    serialized_messages,
+                    previous_response_id=previous_response_id,
+                    stream=True,
+                )
+            except (BadRequestError, NotFoundError):
+                if state is None or not is_chain_start(previous_response_id, state):
+                    speech.cancel()
+                    raise
+                # The chained response is gone, resend a window instead
+                state.previous_response_id = None
+                serialized_messages, previous_response_id = await self.prepare_input(
+                    messages, state
+                )
+                continue
+
+            stream_start = perf_counter()
+            async for event in stream:
+                match event:
+                    case ResponseTextDeltaEvent():
+                        speech.feed(event.delta)
+                        yield TextDelta(delta=event.delta)
+                    case ResponseOutputItemDoneEvent(item=ResponseFunctionToolCall() as item):
+                        yield ToolCallEvent(
+                            name=item.name, arguments=item.arguments, call_id=item.call_id
+                        )
+                    case ResponseCompletedEvent():
+                        completed = event.response
+
+            observe("responses.stream", stream_start)
+
+            if completed is None:
+                speech.cancel()
+                raise RuntimeError("Response stream ended before completion.")
+            response = completed
+
+            record_usage(response)
+            if state is not None:
+                state.record(serialized_messages, response)
+
+            if has_function_calls(response):
+                function_response, results = await self.handle_function_call(
+                    response, speculation
+                )
+                serialized_messages, previous_response_id = follow_up(
+                    serialized_messages, function_response, response, state
+                )
+                tool_results += results
+                for result in results:
+                    yield result
+            else:
+                is_finished = True
+
+            if speculation is not None:
+                # Later calls may follow a change the prefetches didn't see
+                speculation.close()
+                speculation = None
+
+        if state is not None:
+            state.complete(response, len(messages) + 1)
+
+        speech.finish()
+        self.intents.record_miss(observe("turn", trace.started_at))
+        self.log_turn(messages, response.output_text, tool_results, trace, True)
+
+        yield Message(
+            content=response.output_text,
+            role="assistant",
+            timestamp=datetime.now(),
+        )
+
+    def speculate(self, messages: Sequence[ChatMessage]) -> Speculation:
+        """
+        Start the tool calls the last message is expected to need, so they
+        run while the model reads it.
+
+        Args:
+            messages (Sequence[ChatMessage]): The messages of the conversation.
+
+        Returns:
+            Speculation: The calls started, closed on exit when used as a
+                context manager.
+        """
+        last = messages[-1] if messages else None
+        return self.prefetcher.speculate(
+            last.content if last is not None and last.role == "user" else None
+        )
+
+    def bind_patron(self, session_id: str | None) -> None:
+        """
+        Make the tools called in the current context act for a session's patron.
+
+        Args:
+            session_id (str | None): The session the turn belongs to, or None
+                to act for the default patron.
+        """
+        if session_id is not None:
+            TOOL_CONTEXT.set({**TOOL_CONTEXT.get(), "patron_id": session_id})
+
+    def admit(
+        self, session_id: str | None, on_position: Callable[[int], None] | None
+    ) -> AsyncContextManager[None]:
+        """
+        Return the admission of a turn to the model by `scheduler`.
+
+        Args:
+            session_id (str | None): The session the turn belongs to, or None
+                to call the model without waiting.
+            on_position (Callable[[int], None] | None): Called with the
+                position of the turn in the queue while it waits.
+
+        Returns:
+            AsyncContextManager[None]: Waits for the turn to be admitted on
+                entry, and frees its slot on exit.
+        """
+        if session_id is None:
+            return nullcontext()
+        return self.scheduler.admit(session_id, on_position)
+
+    def log_turn(
+        self,
+        messages: Sequence[ChatMessage],
+        output: str,
+        tool_results: list[ToolCallResult],
+        trace: Trace,
+        streamed: bool,
+        intent: str | None = None,
+    ) -> None:
+        """
+        Queue the record of a finished turn to the turn log, if enabled.
+
+        Args:
+            messages (Sequence[ChatMessage]): The messages the turn answered.
+            output (str): The final answer of the turn.
+            tool_results (list[ToolCallResult]): The tool calls of the turn.
+            trace (Trace): The trace of the turn.
+            streamed (bool): Whether the answer was streamed.
+            intent (str | None): The intent the turn was answered for
+                locally, or None if the model answered it.
+        """
+        if self.turn_log is None:
+            return
+
+        timings: dict[str, float] = {}
+        for stage in trace.spans:
+            timings[stage.name] = timings.get(stage.name, 0.0) + stage.duration * 1e3
+
+        self.turn_log.write(
+            {
+                "timestamp": datetime.now().isoformat(),
+                "model": self.model_name,
+                "streamed": streamed,
+                "intent": intent,
+                "input": messages[-1].content if messages else "",
+                "history_length": len(messages),
+                "tool_calls": [
+                    {
+                        "name": result.name,
+                        "arguments": result.arguments,
+                        "output": result.output[:MAX_LOGGED_OUTPUT],
+                        "duration_ms": result.duration * 1e3,
+                    }
+                    for result in tool_results
+                ],
+                "output": output,
+                "latency_ms": timings.get("turn", 0.0),
+                "timings_ms": timings,
+                "input_tokens": trace.input_tokens,
+                "output_tokens": trace.output_tokens,
+            }
+        )
+
+    async def answer_locally(
+        self, messages: Sequence[ChatMessage]
+    ) -> tuple[IntentMatch, ToolCallResult, str] | None:
+        """
+        Answer the last message without the model, if a single tool call does.
+
+        The message is answered locally when `intents` recognizes it with
+        enough confidence, and the reply is the message of the tool. The
+        exchange reaches the model with the next message it answers.
 
-    async def handle_chat(self, messages: list[dict[str, str]]) -> Response:
+        Args:
+            messages (Sequence[ChatMessage]): The messages of the conversation.
+
+        Returns:
+            tuple[IntentMatch, ToolCallResult, str] | None: The recognized
+                intent, the tool call and the reply, or None to ask the model.
+        """
+        if not messages or messages[-1].role != "user":
+            return None
+        match = self.intents.route(messages[-1].content)
+        if match is None:
+            return None
+
+        start = perf_counter()
+        try:
+            output = await self.call_tool(match.tool, match.arguments)
+        except ToolError:
+            return None
+        result = ToolCallResult(
+            name=match.tool,
+            arguments=json.dumps(match.arguments),
+            call_id=f"intent_{match.intent}",
+            output=output,
+            duration=observe(f"tool.{match.tool}", start),
+        )
+        reply = json.loads(output)
+        return match, result, reply if isinstance(reply, str) else output
+
+    async def prepare_input(
+        self, messages: Sequence[ChatMessage], state: ConversationState | None
+    ) -> tuple[list[dict], str | None]:
+        """
+        Prepare the input of the first request of a chat turn.
+
+        Args:
+            messages (Sequence[ChatMessage]): The messages of the conversation.
+            state (ConversationState | None): The state of the conversation.
+
+        Returns:
+            tuple[list[dict], str | None]: The input items to send, and the
+                response they continue from, if any.
+        """
+        if state is None:
+            with span("serialize"):
+                return serialize_messages(messages), None
+
+        if (
+            state.previous_response_id is not None
+            and state.last_input_tokens > self.compaction_threshold
+        ):
+            with span("compact"):
+                await self.compact(messages, state)
+
+        with span("serialize"):
+            if state.previous_response_id is None:
+                return serialize_window(messages, state), None
+
+            return (
+                serialize_messages(messages[state.sent_count :]),
+                state.previous_response_id,
+            )
+
+    async def compact(
+        self, messages: Sequence[ChatMessage], state: ConversationState
+    ) -> None:
+        """
+        Fold the older messages of a conversation into its summary.
+
+        All but the `keep_recent_messages` most recent messages are summarized,
+        and the chain is reset so the next request starts from the summary.
+
+        Args:
+            messages (Sequence[ChatMessage]): The messages of the conversation.
+            state (ConversationState): The state of the conversation.
+        """
+        end = max(state.summarized_count, len(messages) - self.keep_recent_messages)
+        older = messages[state.summarized_count : end]
+
+        if older:
+            summary_input = serialize_window(messages[:end], state)
+            response = await self.client.responses.create(
+                model=self.model_name,
+                instructions=SUMMARY_PROMPT,
+                input=summary_input,
+                store=False,
+            )
+            state.summary = response.output_text
+            state.summarized_count = end
+
+        state.previous_response_id = None
+        state.last_input_tokens = 0
+
+    def start_speech(self, sink: AudioSink | None = None) -> SpeechPipeline:
+        """
+        Start a speech pipeline, interrupting the one speaking into the same sink.
+
+        Args:
+            sink (AudioSink | None): Where to speak, by default the speakers
+                of the server.
+
+        Returns:
+            SpeechPipeline: The pipeline, to be fed the text to speak.
+        """
+        sink = sink if sink is not None else self.local_sink
+        self.cancel_speech(sink)
+        sink.speech = SpeechPipeline(self.speech_client, self.audio_cache, sink=sink)
+        return sink.speech
+
+    def handle_speach(self, text: str, sink: AudioSink | None = None) -> SpeechPipeline:
+        """
+        Speak a text in the background, without waiting for playback.
+
+        Args:
+            text (str): The text to speak.
+            sink (AudioSink | None): Where to speak it, by default the
+                speakers of the server.
+
+        Returns:
+            SpeechPipeline: The pipeline speaking the text.
+        """
+        speech = self.start_speech(sink)
+        speech.feed(text)
+        speech.finish()
+        return speech
+
+    async def prewarm_speech(self, phrases: list[str]) -> None:
+        """
+        Fill the audio cache with phrases that are spoken often.
+
+        Besides the given phrases, the tool messages for every title listed
+        in the comma separated `PREWARM_TITLES` environment variable are added.
+
+        Args:
+            phrases (list[str]): The phrases to synthesize.
+        """
+        titles = [
+            title.strip()
+            for title in getenv("PREWARM_TITLES", "").split(",")
+            if title.strip()
+        ]
+        for title in titles:
+            phrases = [*phrases, *tool_result_phrases(title)]
+        await prewarm(self.speech_client, self.audio_cache, phrases)
+
+    def cancel_speech(self, sink: AudioSink | None = None) -> None:
+        """
+        Stop speaking the previous answer, if it is still being spoken.
+
+        Args:
+            sink (AudioSink | None): The sink it is spoken into, by default
+                the speakers of the server.
+        """
+        sink = sink if sink is not None else self.local_sink
+        if sink.speech is not None:
+            sink.speech.cancel()
+            sink.speech = None
+
+    @overload
+    async def handle_chat(
+        self,
+        messages: list[dict[str, str]],
+        previous_response_id: str | None = None,
+        stream: Literal[False] = False,
+    ) -> Response: ...
+
+    @overload
+    async def handle_chat(
+        self,
+        messages: list[dict[str, str]],
+        previous_response_id: str | None = None,
+        *,
+        stream: Literal[True],
+    ) -> AsyncStream[ResponseStreamEvent]: ...
+
+    async def handle_chat(
+        self,
+        messages: list[dict[str, str]],
+        previous_response_id: str | None = None,
+        stream: bool = False,
+    ) -> Response | AsyncStream[ResponseStreamEvent]:
         """
         Handle a chat session with the agent.
 
         Args:
             messages (list[dict[str, str]]): A list of dictionaries, each containing
                 the 'role' and 'content' of a message to send to the agent.
+            previous_response_id (str | None): The response the messages
+                continue from, if the conversation is chained.
+            stream (bool): Whether to stream the response as server-sent events.
 
         Returns:
-            Response: The response from the agent.
-        """
-        # tools: list[dict] = self.tools
-        tools = [{
-            "type": "file_search",
-            "vector_store_ids": [getenv("VECTOR_STORE_ID")],
-        }]
-
-        return await self.client.responses.create(
-            model=self.model_name,
-            instructions=self.prompt,
-            tools=tools,
-            input=messages,
-        )
-
-    async def handle_function_call(self, response: Response) -> list[dict[str, str]]:
+            Response | AsyncStream[ResponseStreamEvent]: The response from the
+                agent, or a stream of response events if `stream` is set.
         """
-        Handle a function call response from the agent.
+        tools: list[dict] = list(self.tools)
+        if self.retrieval_backend == "file_search":
+            tools.append(
+                {
+                    "type": "file_search",
+                    "vector_store_ids": [getenv("VECTOR_STORE_ID")],
+                }
+            )
+
+        def create() -> Awaitable[Response | AsyncStream[ResponseStreamEvent]]:
+            return self.client.responses.create(
+                model=self.model_name,
+                instructions=self.prompt,
+                tools=tools,
+                input=messages,
+                previous_response_id=previous_response_id,
+                stream=stream,
+            )
+
+        with span("responses.create"):
+            # A stream is already answering once it returns, only hedge whole responses
+            return await (create() if stream else hedged_chat(create))
+
+    async def handle_function_call(
+        self, response: Response, speculation: Speculation | None = None
+    ) -> tuple[list[dict[str, str]], list[ToolCallResult]]:
+        """
+        Handle the function calls in a response from the agent.
+
+        Every function call in the response is executed concurrently, bounded
+        by `max_concurrent_tools`, so that all outputs can be sent back to the
+        model in a single follow-up request.
 
         Args:
             response (Response): The response from the agent, which contains
-                the function call to be executed.
+                the function calls to be executed.
+            speculation (Speculation | None): The calls already started, whose
+                results are used for the same calls instead of running them.
 
         Returns:
-            list[dict[str, str]]: A list of dictionaries, each representing a
-                function call or function call output. The first dictionary
-                represents the function call, and the second dictionary
-                represents the output of the function call.
-        """
-        function_call: dict[str, str] = response.output[0]
-
-        # Parse arguments into a keyword dict
-        args: dict[str, str] = json.loads(function_call.arguments)
-        function_name: str = function_call.name
-
-        # Execute function
-        result: str = ""
-        match function_name:
-            case "locate_book":
-                result = json.dumps(locate_book(args["book_title"]))
-            case "place_on_hold":
-                result = json.dumps(place_on_hold(args["book_title"]))
-            case "renew_book":
-                result = json.dumps(renew_book(args["book_title"]))
-            case _:
-                result = "Function not found"
-
-        return [
-            {
-                "type": "function_call",
-                "id": function_call.id,
-                "call_id": function_call.call_id,
-                "name": function_call.name,
-                "arguments": function_call.arguments,
-            },
-            {
-                "type": "function_call_output",
-                "call_id": function_call.call_id,
-                "output": result,
-            },
+            tuple[list[dict[str, str]], list[ToolCallResult]]: A list of
+                dictionaries, each representing a function call or function
+                call output, with every call followed by its output; and the
+                result of each call, including its execution time.
+        """
+        function_calls: list[ResponseFunctionToolCall] = [
+            item for item in response.output if item.type == "function_call"
         ]
+        semaphore = asyncio.Semaphore(self.max_concurrent_tools)
+
+        async def run(function_call: ResponseFunctionToolCall) -> ToolCallResult:
+            async with semaphore:
+                start = perf_counter()
+                output = None
+                if speculation is not None:
+                    output = await speculation.take(
+                        function_call.name, function_call.arguments
+                    )
+                if output is None:
+                    output = await self.execute_function(
+                        function_call.name, function_call.arguments
+                    )
+                # The name comes from the model, only known tools get their own span
+                known = function_call.name in get_registry().tools
+                span = f"tool.{function_call.name}" if known else "tool.unknown"
+                return ToolCallResult(
+                    name=function_call.name,
+                    arguments=function_call.arguments,
+                    call_id=function_call.call_id,
+                    output=output,
+                    duration=observe(span, start),
+                )
+
+        results: list[ToolCallResult] = await asyncio.gather(
+            *(run(function_call) for function_call in function_calls)
+        )
+
+        items: list[dict[str, str]] = []
+        for function_call, result in zip(function_calls, results):
+            items.append(
+                {
+                    "type": "function_call",
+                    "id": function_call.id,
+                    "call_id": function_call.call_id,
+                    "name": function_call.name,
+                    "arguments": function_call.arguments,
+                }
+            )
+            items.append(
+                {
+                    "type": "function_call_output",
+                    "call_id": result.call_id,
+                    "output": result.output,
+                }
+            )
+
+        return items, results
+
+    async def execute_function(self, function_name: str, arguments: str) -> str:
+        """
+        Execute a single function requested by the agent.
+
+        The function is run by the tool registry, which keeps blocking tools
+        off the event loop. Results of read-only tools are served from
+        `tool_cache` when possible.
+
+        Args:
+            function_name (str): The name of the function to execute.
+            arguments (str): The JSON encoded arguments of the function.
+
+        Returns:
+            str: The serialized result of the function, or the error the
+                model should correct.
+        """
+        try:
+            # Parse arguments into a keyword dict
+            args: dict = json.loads(arguments)
+            return await self.call_tool(function_name, args)
+        except json.JSONDecodeError:
+            return json.dumps({"error": "Arguments are not valid JSON"})
+        except ToolError as e:
+            return json.dumps({"error": str(e)})
+
+    async def call_tool(self, name: str, arguments: dict) -> str:
+        """
+        Run a tool call through `tool_cache`.
+
+        Args:
+            name (str): The name of the tool.
+            arguments (dict): The arguments of the call.
+
+        Returns:
+            str: The JSON encoded result of the tool.
+
+        Raises:
+            ToolError: If the call fails.
+        """
+        return await self.tool_cache.call(
+            name, arguments, lambda: get_registry().run(name, arguments)
+        )
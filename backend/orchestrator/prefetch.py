@@ -0,0 +1,283 @@
+from os import getenv
+from typing import Awaitable, Callable
+import asyncio
+import json
+import re
+
+from backend.metrics import REGISTRY
+from backend.tools.catalog import get_catalog
+
+
+# Whether to look up the titles a message names while the model reads it
+SPECULATIVE_PREFETCH: bool = getenv("SPECULATIVE_PREFETCH", "0") == "1"
+# The most titles looked up per turn, and across every turn at once
+PREFETCH_MAX_TITLES: int = int(getenv("PREFETCH_MAX_TITLES", "2"))
+PREFETCH_MAX_IN_FLIGHT: int = int(getenv("PREFETCH_MAX_IN_FLIGHT", "16"))
+# The similarity from which a phrase of the message is taken for a title
+PREFETCH_MIN_SCORE: float = float(getenv("PREFETCH_MIN_SCORE", "0.8"))
+# The longest phrase tried as a title, in words, and the most phrases tried
+MAX_TITLE_WORDS: int = 8
+MAX_PHRASES: int = 8
+
+PREFETCH_TOOL: str = "locate_book"
+
+PREFETCH_STARTED = REGISTRY.counter(
+    "chat_prefetch_started_total", "Tool calls started before the model asked for them."
+)
+PREFETCH_USED = REGISTRY.counter(
+    "chat_prefetch_used_total", "Prefetched tool calls the model asked for."
+)
+PREFETCH_WASTED = REGISTRY.counter(
+    "chat_prefetch_wasted_total",
+    "Prefetched tool calls the model didn't ask for, by how they ended.",
+    ("outcome",),
+)
+PREFETCH_SKIPPED = REGISTRY.counter(
+    "chat_prefetch_skipped_total", "Titles not prefetched for lack of budget."
+)
+
+# Quoted or emphasized phrases, and the phrases following words that
+# usually introduce a title; both end at punctuation. Cues only consume
+# themselves, so a cue inside the phrase of another is found too.
+QUOTED = re.compile(r"[\"“‘*_]([^\"”’*_]{2,100})[\"”’*_]")
+TITLE_CUE = re.compile(
+    r"\b(?:find|locate|where(?:'s| is| are)|have|copy of|copies of|looking for|"
+    r"borrow|check out|read|about|is|are)\s+(?=(?P<phrase>[^,.;:!?()]+))",
+    re.IGNORECASE,
+)
+
+
+def candidate_phrases(text: str) -> list[str]:
+    """
+    Return the phrases of a message that may be a book title.
+
+    Args:
+        text (str): The message.
+
+    Returns:
+        list[str]: The quoted phrases, then the phrases following title cues,
+            at most `MAX_PHRASES`, each cut to its first `MAX_TITLE_WORDS` words.
+    """
+    phrases = [found.group(1) for found in QUOTED.finditer(text)]
+    phrases += [found.group("phrase") for found in TITLE_CUE.finditer(text)]
+    return [" ".join(phrase.split()[:MAX_TITLE_WORDS]) for phrase in phrases[:MAX_PHRASES]]
+
+
+def find_titles(text: str, limit: int, min_score: float = PREFETCH_MIN_SCORE) -> list[int]:
+    """
+    Find the catalog titles a message names.
+
+    A phrase names the title its longest leading run of words matches with
+    at least `min_score` similarity, so words after the title, such as
+    "available" or "near me", are ignored.
+
+    Args:
+        text (str): The message.
+        limit (int): The most titles to return.
+        min_score (float): The minimum similarity of a match.
+
+    Returns:
+        list[int]: The identifiers of the titles, in order of mention.
+    """
+    index = get_catalog().index
+    title_ids: list[int] = []
+    for phrase in candidate_phrases(text):
+        words = phrase.split()
+        for length in range(len(words), 0, -1):
+            matches = index.search(" ".join(words[:length]), limit=1, min_score=min_score)
+            if matches:
+                if matches[0][0] not in title_ids:
+                    title_ids.append(matches[0][0])
+                break
+        if len(title_ids) >= limit:
+            break
+    return title_ids
+
+
+class Speculation:
+    """
+    The tool calls started for a chat turn before the model asked for them.
+
+    The model's request of a call is answered by the prefetch when the call
+    is about the same catalog title and has no other arguments, so that its
+    result would be the same. Closing the speculation cancels the prefetches
+    not asked for and counts them as wasted.
+    """
+
+    def __init__(self, prefetcher: "ToolPrefetcher", calls: dict[int, asyncio.Task[str]]):
+        """
+        Args:
+            prefetcher (ToolPrefetcher): The prefetcher that started the calls.
+            calls (dict[int, asyncio.Task[str]]): The call of each title, by
+                title identifier.
+        """
+        self._prefetcher = prefetcher
+        self._calls = calls
+        self._used: set[asyncio.Task[str]] = set()
+        self._closed = False
+
+    def __enter__(self) -> "Speculation":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    async def take(self, name: str, arguments: str) -> str | None:
+        """
+        Return the result of a call requested by the model, if it was prefetched.
+
+        Args:
+            name (str): The name of the tool.
+            arguments (str): The JSON encoded arguments of the call.
+
+        Returns:
+            str | None: The result of the prefetched call, or None if the
+                call wasn't prefetched or the prefetch failed.
+        """
+        if self._closed or name != PREFETCH_TOOL or not self._calls:
+            return None
+        try:
+            args = json.loads(arguments)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(args, dict) or not isinstance(args.get("book_title"), str):
+            return None
+        if any(value is not None for key, value in args.items() if key != "book_title"):
+            return None  # A location ranks the branches differently
+
+        title_id = get_catalog().index.lookup(args["book_title"])
+        task = self._calls.get(title_id) if title_id is not None else None
+        if task is None:
+            return None
+        try:
+            result = await asyncio.shield(task)
+        except Exception:
+            return None  # Counted as failed when closed
+        if task not in self._used:
+            self._used.add(task)
+            self._prefetcher.used += 1
+            PREFETCH_USED.inc()
+        return result
+
+    def close(self) -> None:
+        """
+        Cancel the prefetches the model didn't ask for, once it can no longer.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for task in self._calls.values():
+            if task in self._used:
+                continue
+            if not task.done():
+                outcome = "cancelled"
+                task.cancel()
+            elif task.cancelled() or task.exception() is not None:
+                outcome = "failed"
+            else:
+                outcome = "unused"
+            self._prefetcher.wasted += 1
+            PREFETCH_WASTED.inc(outcome=outcome)
+
+
+class ToolPrefetcher:
+    """
+    Looks up the books a message names while the model reads it.
+
+    Answering a question about a book takes two model calls: one asking for
+    `locate_book`, and one answering with its result. When the message names
+    a catalog title, the lookup is started along with the first model call,
+    so its result is ready, or nearly so, when the model asks for it.
+
+    The cost of speculating is bounded: at most `max_titles` titles are
+    looked up per turn and `max_in_flight` at once, beyond which titles are
+    skipped. Lookups go through the tool cache, so a lookup the model didn't
+    ask for still serves the next identical one.
+    """
+
+    enabled: bool
+    max_titles: int
+    max_in_flight: int
+    in_flight: int
+    started: int
+    used: int
+    wasted: int
+    skipped: int
+
+    def __init__(
+        self,
+        run: Callable[[str, dict], Awaitable[str]],
+        enabled: bool = SPECULATIVE_PREFETCH,
+        max_titles: int = PREFETCH_MAX_TITLES,
+        max_in_flight: int = PREFETCH_MAX_IN_FLIGHT,
+    ):
+        """
+        Args:
+            run (Callable[[str, dict], Awaitable[str]]): Runs a tool call,
+                given the name of the tool and its arguments.
+            enabled (bool): Whether to prefetch at all.
+            max_titles (int): The most titles looked up per turn.
+            max_in_flight (int): The most lookups running at once.
+        """
+        self.run = run
+        self.enabled = enabled
+        self.max_titles = max_titles
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.started = 0
+        self.used = 0
+        self.wasted = 0
+        self.skipped = 0
+
+    def speculate(self, text: str | None) -> Speculation:
+        """
+        Start looking up the titles a message names.
+
+        Args:
+            text (str | None): The message, or None if the turn doesn't
+                answer a user message.
+
+        Returns:
+            Speculation: The lookups started, to be closed once the model's
+                first response is handled.
+        """
+        calls: dict[int, asyncio.Task[str]] = {}
+        if self.enabled and text:
+            index = get_catalog().index
+            for title_id in find_titles(text, self.max_titles):
+                if self.in_flight >= self.max_in_flight:
+                    self.skipped += 1
+                    PREFETCH_SKIPPED.inc()
+                    continue
+                calls[title_id] = self._start({"book_title": index.titles[title_id]})
+        return Speculation(self, calls)
+
+    def stats(self) -> dict[str, float]:
+        """
+        Return the usage statistics of the prefetcher.
+
+        Returns:
+            dict[str, float]: The lookups started, used, wasted, skipped and
+                running, and the share of those started that were used.
+        """
+        return {
+            "started": self.started,
+            "used": self.used,
+            "wasted": self.wasted,
+            "skipped": self.skipped,
+            "in_flight": self.in_flight,
+            "precision": self.used / self.started if self.started else 0.0,
+        }
+
+    def _start(self, arguments: dict) -> asyncio.Task[str]:
+        self.in_flight += 1
+        self.started += 1
+        PREFETCH_STARTED.inc()
+        task = asyncio.ensure_future(self.run(PREFETCH_TOOL, arguments))
+        task.add_done_callback(self._finished)
+        return task
+
+    def _finished(self, task: asyncio.Task[str]) -> None:
+        self.in_flight -= 1
+        if not task.cancelled():
+            task.exception()  # Retrieved, failures are counted on close
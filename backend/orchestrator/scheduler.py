@@ -0,0 +1,315 @@
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from os import getenv
+from time import monotonic, perf_counter
+from typing import AsyncIterator, Callable
+import asyncio
+import logging
+
+from backend.metrics import REGISTRY, current_trace
+
+
+logger = logging.getLogger(__name__)
+
+# The most chat turns calling the model at once
+CHAT_MAX_CONCURRENT: int = int(getenv("CHAT_MAX_CONCURRENT", "32"))
+# The model tokens that may be used per minute, 0 for no limit
+CHAT_TOKENS_PER_MINUTE: int = int(getenv("CHAT_TOKENS_PER_MINUTE", "0"))
+# The turns of a session that may wait at once
+CHAT_MAX_QUEUED_PER_SESSION: int = int(getenv("CHAT_MAX_QUEUED_PER_SESSION", "2"))
+# The longest a turn may wait before it is shed, in seconds
+CHAT_MAX_WAIT: float = float(getenv("CHAT_MAX_WAIT", "10"))
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "chat_queue_wait_seconds", "Time chat turns waited to be admitted."
+)
+SHED = REGISTRY.counter(
+    "chat_turns_shed_total", "Chat turns refused by admission control.", ("reason",)
+)
+
+
+class Overloaded(Exception):
+    """
+    Raised when a chat turn is shed because it can't be admitted in time.
+
+    Attributes:
+        reason: 'session_queue_full', 'predicted_wait' or 'wait_timeout'.
+    """
+
+    reason: str
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("session_id", "future", "enqueued_at", "estimate", "on_position", "position")
+
+    def __init__(
+        self,
+        session_id: str,
+        future: asyncio.Future,
+        estimate: float,
+        on_position: Callable[[int], None] | None,
+    ):
+        self.session_id = session_id
+        self.future = future
+        self.enqueued_at = monotonic()
+        self.estimate = estimate
+        self.on_position = on_position
+        self.position = -1
+
+
+class TurnScheduler:
+    """
+    Admits chat turns to the model fairly across sessions.
+
+    At most `max_concurrent` turns run at once, and with a token budget, a
+    turn is only admitted while the tokens it is expected to use are left
+    in the current minute. Waiting turns are queued per session and
+    admitted round robin, one turn per session per round, so a session
+    sending many messages can't hold back the others. A session's turns run
+    one at a time, in order, as each continues the conversation of the one
+    before. Each session may have `max_queued_per_session` turns waiting.
+
+    Turns are shed rather than left to wait past `max_wait`: on arrival,
+    when the queue ahead of them is predicted to take longer, and while
+    waiting, once they have waited that long. The caller is told so with
+    `Overloaded` and can ask the user to try again.
+    """
+
+    max_concurrent: int
+    tokens_per_minute: int
+    max_queued_per_session: int
+    max_wait: float
+    in_flight: int
+    shed: int
+
+    def __init__(
+        self,
+        max_concurrent: int = CHAT_MAX_CONCURRENT,
+        tokens_per_minute: int = CHAT_TOKENS_PER_MINUTE,
+        max_queued_per_session: int = CHAT_MAX_QUEUED_PER_SESSION,
+        max_wait: float = CHAT_MAX_WAIT,
+    ):
+        """
+        Args:
+            max_concurrent (int): The most turns running at once.
+            tokens_per_minute (int): The model tokens that may be used per
+                minute, or 0 for no limit.
+            max_queued_per_session (int): The turns of a session that may wait.
+            max_wait (float): The longest a turn may wait, in seconds.
+        """
+        self.max_concurrent = max_concurrent
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queued_per_session = max_queued_per_session
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.shed = 0
+        self._queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+        self._running: set[str] = set()
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = monotonic()
+        self._wakeup: asyncio.TimerHandle | None = None
+        # Running means, to estimate the cost of turns not run yet
+        self._turn_tokens = 1000.0
+        self._turn_seconds = 1.0
+
+    @property
+    def queued(self) -> int:
+        """
+        The number of turns waiting to be admitted.
+        """
+        return sum(len(queue) for queue in self._queues.values())
+
+    @asynccontextmanager
+    async def admit(
+        self, session_id: str, on_position: Callable[[int], None] | None = None
+    ) -> AsyncIterator[None]:
+        """
+        Wait for a turn of a session to be admitted, and run it.
+
+        The tokens the turn used are read from the trace of the current
+        context, to correct the budget and the estimate of later turns.
+
+        Args:
+            session_id (str): The session the turn belongs to.
+            on_position (Callable[[int], None] | None): Called with the
+                position of the turn in the queue, from 1, whenever it
+                changes while waiting, and with 0 once admitted.
+
+        Raises:
+            Overloaded: If the turn is shed.
+        """
+        await self._acquire(session_id, on_position)
+        start = perf_counter()
+        trace = current_trace()
+        before = trace.input_tokens + trace.output_tokens if trace is not None else 0
+        try:
+            yield
+        finally:
+            used = (
+                trace.input_tokens + trace.output_tokens - before
+                if trace is not None
+                else None
+            )
+            self._release(session_id, perf_counter() - start, used)
+
+    def stats(self) -> dict[str, float]:
+        """
+        Return the state of the scheduler.
+
+        Returns:
+            dict[str, float]: The turns running and waiting, the sessions
+                waiting, the tokens left, the turns shed and the longest
+                current wait, in seconds.
+        """
+        self._refill()
+        now = monotonic()
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "sessions_waiting": len(self._queues),
+            "tokens_available": self._tokens if self.tokens_per_minute else 0,
+            "shed": self.shed,
+            "oldest_wait_seconds": max(
+                (now - queue[0].enqueued_at for queue in self._queues.values()),
+                default=0.0,
+            ),
+        }
+
+    async def _acquire(
+        self, session_id: str, on_position: Callable[[int], None] | None
+    ) -> None:
+        queue = self._queues.get(session_id)
+        if queue is not None and len(queue) >= self.max_queued_per_session:
+            self._shed("session_queue_full", "Too many messages are waiting.")
+
+        # Everyone ahead gets a slot in turn, max_concurrent at a time
+        ahead = self.queued + max(0, self.in_flight - self.max_concurrent + 1)
+        if self.queued and ahead / self.max_concurrent * self._turn_seconds > self.max_wait:
+            self._shed("predicted_wait", "The assistant is too busy right now.")
+
+        waiter = _Waiter(
+            session_id,
+            asyncio.get_running_loop().create_future(),
+            self._turn_tokens,
+            on_position,
+        )
+        self._queues.setdefault(session_id, deque()).append(waiter)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted as the wait ended, give the slot back
+                self._release(session_id, 0.0, 0)
+            else:
+                waiter.future.cancel()
+                self._remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self._shed("wait_timeout", "The assistant is too busy right now.")
+            raise
+        QUEUE_WAIT_SECONDS.observe(monotonic() - waiter.enqueued_at)
+
+    def _release(self, session_id: str, seconds: float, tokens: int | None) -> None:
+        self.in_flight -= 1
+        self._running.discard(session_id)
+        if seconds:
+            self._turn_seconds += 0.1 * (seconds - self._turn_seconds)
+        if tokens is not None:
+            charged = self._turn_tokens
+            if tokens:
+                self._turn_tokens += 0.1 * (tokens - self._turn_tokens)
+            if self.tokens_per_minute:
+                # Give back what the turn was charged for but didn't use
+                self._tokens = min(self.tokens_per_minute, self._tokens + charged - tokens)
+        self._dispatch()
+
+    def _shed(self, reason: str, message: str) -> None:
+        self.shed += 1
+        SHED.inc(reason=reason)
+        raise Overloaded(reason, message)
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.session_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[waiter.session_id]
+        self._dispatch()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(
+            self.tokens_per_minute,
+            self._tokens + (now - self._refilled_at) * self.tokens_per_minute / 60,
+        )
+        self._refilled_at = now
+
+    def _dispatch(self) -> None:
+        self._refill()
+        while self._queues and self.in_flight < self.max_concurrent:
+            # The first session in the rotation without a turn running goes next
+            session_id = next(
+                (waiting for waiting in self._queues if waiting not in self._running),
+                None,
+            )
+            if session_id is None:
+                break
+            queue = self._queues[session_id]
+            waiter = queue[0]
+            # The bucket never holds more than a minute of tokens, so a turn
+            # estimated above that waits for a full bucket rather than forever
+            estimate = min(waiter.estimate, self.tokens_per_minute)
+            if self.tokens_per_minute and self._tokens < estimate:
+                self._wake_in((estimate - self._tokens) * 60 / self.tokens_per_minute)
+                break
+            queue.popleft()
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            if self.tokens_per_minute:
+                self._tokens -= estimate
+            self.in_flight += 1
+            self._running.add(session_id)
+            waiter.future.set_result(None)
+            self._notify(waiter, 0)
+        self._report_positions()
+
+    def _wake_in(self, delay: float) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _report_positions(self) -> None:
+        # A turn is preceded by the turns ahead of it in its own queue and,
+        # in every other queue, by as many turns as rounds it waits for,
+        # one more for the sessions before its own in the rotation
+        lengths = [len(queue) for queue in self._queues.values()]
+        for rank, queue in enumerate(self._queues.values()):
+            for index, waiter in enumerate(queue):
+                if waiter.on_position is None:
+                    continue
+                position = 1 + index + sum(
+                    min(length, index + (other < rank))
+                    for other, length in enumerate(lengths)
+                    if other != rank
+                )
+                if position != waiter.position:
+                    waiter.position = position
+                    self._notify(waiter, position)
+
+    @staticmethod
+    def _notify(waiter: _Waiter, position: int) -> None:
+        # A failing callback must not stop the turns after it from being admitted
+        if waiter.on_position is None:
+            return
+        try:
+            waiter.on_position(position)
+        except Exception:
+            logger.exception("Position callback of session %s failed", waiter.session_id)
@@ -0,0 +1,313 @@
+from abc import ABC, abstractmethod
+from time import perf_counter
+from typing import AsyncIterator, Literal
+import asyncio
+import logging
+import re
+
+import numpy as np
+from openai import AsyncOpenAI
+from openai.helpers import LocalAudioPlayer
+
+from backend.metrics import observe, span
+from .audio_cache import AudioCache, cache_key
+
+
+logger = logging.getLogger(__name__)
+
+TTS_MODEL: str = "gpt-4o-mini-tts"
+TTS_VOICE: str = "onyx"
+TTS_INSTRUCTIONS: str = "Speak in a calming professional tone."
+TTS_FORMAT: Literal["pcm"] = "pcm"
+# The PCM format is 16-bit signed little-endian mono at this rate
+TTS_SAMPLE_RATE: int = 24000
+# The size of the chunks read from a synthesis response, in bytes
+TTS_CHUNK_SIZE: int = 4800
+
+# A sentence ends at terminal punctuation followed by whitespace, or at a line break.
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def split_sentences(text: str, min_chars: int = 20) -> tuple[list[str], str]:
+    """
+    Split the complete sentences off the front of a text buffer.
+
+    Sentences shorter than `min_chars` are merged with the next one, so that
+    very short fragments are not synthesized as separate requests.
+
+    Args:
+        text (str): The buffered text, possibly ending in a partial sentence.
+        min_chars (int): The minimum length of a chunk to be synthesized.
+
+    Returns:
+        tuple[list[str], str]: The complete sentence chunks, and the remaining
+            text that does not yet form a complete chunk.
+    """
+    chunks: list[str] = []
+    start: int = 0
+    for boundary in SENTENCE_BOUNDARY.finditer(text):
+        chunk = text[start : boundary.start()].strip()
+        if len(chunk) >= min_chars:
+            chunks.append(chunk)
+            start = boundary.end()
+    return chunks, text[start:]
+
+
+async def synthesize_chunks(
+    client: AsyncOpenAI, text: str, cache: AudioCache | None = None
+) -> AsyncIterator[bytes]:
+    """
+    Synthesize speech for a piece of text, yielding the audio as it arrives.
+
+    Audio served from the cache is yielded as a single chunk. Synthesized
+    audio is stored in the cache once the whole of it has arrived.
+
+    Args:
+        client (AsyncOpenAI): The OpenAI client used for synthesis.
+        text (str): The text to synthesize.
+        cache (AudioCache | None): The cache to serve and store the audio.
+
+    Yields:
+        bytes: Chunks of 16-bit PCM audio, not necessarily whole samples.
+    """
+    key = cache_key(text, TTS_MODEL, TTS_VOICE, TTS_INSTRUCTIONS, TTS_FORMAT)
+    if cache is not None and (audio := cache.get(key)) is not None:
+        yield audio.tobytes()
+        return
+
+    parts: list[bytes] = []
+    with span("tts.synthesize"):
+        async with client.audio.speech.with_streaming_response.create(
+            model=TTS_MODEL,
+            voice=TTS_VOICE,
+            input=text,
+            instructions=TTS_INSTRUCTIONS,
+            response_format=TTS_FORMAT,
+        ) as response:
+            async for chunk in response.iter_bytes(TTS_CHUNK_SIZE):
+                parts.append(chunk)
+                yield chunk
+
+    if cache is not None:
+        cache.put(key, np.frombuffer(b"".join(parts), dtype=np.int16))
+
+
+async def synthesize(
+    client: AsyncOpenAI, text: str, cache: AudioCache | None = None
+) -> np.ndarray:
+    """
+    Synthesize speech for a piece of text.
+
+    Args:
+        client (AsyncOpenAI): The OpenAI client used for synthesis.
+        text (str): The text to synthesize.
+        cache (AudioCache | None): The cache to serve and store the audio.
+
+    Returns:
+        np.ndarray: The synthesized audio as 16-bit PCM samples.
+    """
+    pcm = b"".join([chunk async for chunk in synthesize_chunks(client, text, cache)])
+    return np.frombuffer(pcm, dtype=np.int16)
+
+
+async def prewarm(
+    client: AsyncOpenAI,
+    cache: AudioCache,
+    phrases: list[str],
+    max_concurrency: int = 4,
+) -> None:
+    """
+    Synthesize phrases ahead of time so they are served from the cache.
+
+    Phrases are split into sentences as `SpeechPipeline` splits them, so
+    that the cached audio is that of the chunks the pipeline asks for.
+
+    Args:
+        client (AsyncOpenAI): The OpenAI client used for synthesis.
+        cache (AudioCache): The cache to fill.
+        phrases (list[str]): The phrases to synthesize.
+        max_concurrency (int): The maximum number of concurrent requests.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    chunks: set[str] = set()
+    for phrase in phrases:
+        sentences, remainder = split_sentences(phrase)
+        chunks.update(sentences)
+        if remainder.strip():
+            chunks.add(remainder.strip())
+
+    async def warm(chunk: str) -> None:
+        async with semaphore:
+            await synthesize(client, chunk, cache)
+
+    await asyncio.gather(*(warm(chunk) for chunk in chunks))
+
+
+class AudioSink(ABC):
+    """
+    Where a speech pipeline sends its audio, one sentence at a time.
+
+    Attributes:
+        speech: The pipeline currently speaking into the sink, if any.
+    """
+
+    speech: "SpeechPipeline | None" = None
+
+    @abstractmethod
+    async def play(self, chunks: AsyncIterator[bytes]) -> None:
+        """
+        Play the audio of a sentence, returning once the sink is ready for
+        the next one.
+
+        Args:
+            chunks (AsyncIterator[bytes]): The 16-bit PCM audio, as it is synthesized.
+        """
+
+    def clear(self) -> None:
+        """
+        Drop any audio accepted but not played yet.
+        """
+
+
+class LocalSink(AudioSink):
+    """
+    Plays audio on the speakers of the machine running the server.
+    """
+
+    async def play(self, chunks: AsyncIterator[bytes]) -> None:
+        pcm = b"".join([chunk async for chunk in chunks])
+        await LocalAudioPlayer().play(np.frombuffer(pcm, dtype=np.int16))
+
+
+def log_failure(task: asyncio.Task) -> None:
+    """
+    Log the exception a background speech task ended with, if any.
+
+    Args:
+        task (asyncio.Task): The finished task.
+    """
+    if not task.cancelled() and (error := task.exception()) is not None:
+        logger.error("Speech task %s failed", task.get_name(), exc_info=error)
+
+
+class SpeechPipeline:
+    """
+    Speaks text in the background, sentence by sentence, as it is produced.
+
+    Text is split into sentences as it arrives. One task synthesizes the
+    sentences in order while another plays them, so that chunk N+1 is being
+    synthesized while chunk N plays. The audio of a sentence is passed to the
+    sink as it streams in, so a sink that forwards it can start playback
+    before the sentence is fully synthesized. Nothing in the pipeline blocks
+    the caller.
+    """
+
+    client: AsyncOpenAI
+    cache: AudioCache | None
+    sink: AudioSink
+    started_at: float
+    first_audio_latency: float | None
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        cache: AudioCache | None = None,
+        max_buffered: int = 1,
+        sink: AudioSink | None = None,
+    ):
+        """
+        Args:
+            client (AsyncOpenAI): The OpenAI client used for synthesis.
+            cache (AudioCache | None): The cache to serve and store the audio.
+            max_buffered (int): The number of synthesized chunks that may wait
+                for playback before synthesis pauses.
+            sink (AudioSink | None): Where to play the audio, by default the
+                speakers of the server.
+        """
+        self.client = client
+        self.cache = cache
+        self.sink = sink if sink is not None else LocalSink()
+        self.started_at = perf_counter()
+        self.first_audio_latency = None
+        self._buffer: str = ""
+        self._sentences: asyncio.Queue[str | None] = asyncio.Queue()
+        # One channel of audio chunks per sentence, ended by None
+        self._audio: asyncio.Queue[asyncio.Queue[bytes | None] | None] = asyncio.Queue(
+            maxsize=max_buffered
+        )
+        self._tasks: list[asyncio.Task] = [
+            asyncio.create_task(self._synthesize_loop(), name="speech.synthesize"),
+            asyncio.create_task(self._playback_loop(), name="speech.playback"),
+        ]
+        for task in self._tasks:
+            task.add_done_callback(log_failure)
+
+    def feed(self, text: str) -> None:
+        """
+        Add text to the pipeline, queuing any sentences it completes.
+
+        Args:
+            text (str): The text fragment to add.
+        """
+        sentences, self._buffer = split_sentences(self._buffer + text)
+        for sentence in sentences:
+            self._sentences.put_nowait(sentence)
+
+    def finish(self) -> None:
+        """
+        Mark the end of the text, queuing any remaining partial sentence.
+        """
+        remainder = self._buffer.strip()
+        self._buffer = ""
+        if remainder:
+            self._sentences.put_nowait(remainder)
+        self._sentences.put_nowait(None)
+
+    def cancel(self) -> None:
+        """
+        Stop synthesis and playback immediately.
+        """
+        for task in self._tasks:
+            task.cancel()
+        self.sink.clear()
+
+    @property
+    def done(self) -> bool:
+        """
+        Whether the pipeline has finished speaking or was cancelled.
+        """
+        return all(task.done() for task in self._tasks)
+
+    async def wait(self) -> None:
+        """
+        Wait until all queued text has been spoken.
+
+        Failures of synthesis or playback are logged as they happen, not raised.
+        """
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _synthesize_loop(self) -> None:
+        try:
+            while (sentence := await self._sentences.get()) is not None:
+                chunks: asyncio.Queue[bytes | None] = asyncio.Queue()
+                await self._audio.put(chunks)
+                try:
+                    async for chunk in synthesize_chunks(self.client, sentence, self.cache):
+                        chunks.put_nowait(chunk)
+                finally:
+                    chunks.put_nowait(None)
+        except Exception:
+            await self._audio.put(None)  # Let playback drain and stop
+            raise
+        await self._audio.put(None)
+
+    async def _playback_loop(self) -> None:
+        while (chunks := await self._audio.get()) is not None:
+            with span("tts.playback"):
+                await self.sink.play(self._receive(chunks))
+
+    async def _receive(self, chunks: asyncio.Queue[bytes | None]) -> AsyncIterator[bytes]:
+        while (chunk := await chunks.get()) is not None:
+            if self.first_audio_latency is None:
+                self.first_audio_latency = observe("tts.first_audio", self.started_at)
+            yield chunk
@@ -0,0 +1,218 @@
+from collections import OrderedDict
+from os import getenv
+from time import monotonic
+from typing import Awaitable, Callable
+import asyncio
+import json
+
+from backend.tools.catalog import get_catalog, normalize_title
+from .audio_cache import normalize_text
+
+
+# How long the result of each read-only tool stays fresh, in seconds
+TOOL_CACHE_TTLS: dict[str, float] = {
+    "locate_book": 60.0,
+    "search_documents": 300.0,
+}
+
+# The cached tools whose results a tool can change, for the same book
+TOOL_INVALIDATES: dict[str, tuple[str, ...]] = {
+    "place_on_hold": ("locate_book",),
+    "renew_book": ("locate_book",),
+}
+
+TOOL_CACHE_SIZE: int = int(getenv("TOOL_CACHE_SIZE", "1024"))
+
+
+def normalize_arguments(arguments: dict) -> str:
+    """
+    Normalize the arguments of a tool call before they are used as a cache key.
+
+    Args:
+        arguments (dict): The arguments of the call.
+
+    Returns:
+        str: The arguments as JSON with sorted keys, titles normalized, other
+            strings in lowercase with whitespace collapsed, and coordinates
+            rounded to about a hundred meters.
+    """
+    normalized: dict = {}
+    for name, value in arguments.items():
+        if name == "book_title" and isinstance(value, str):
+            value = normalize_title(value)
+        elif isinstance(value, str):
+            value = normalize_text(value).lower()
+        elif isinstance(value, float):
+            value = round(value, 3)
+        normalized[name] = value
+    return json.dumps(normalized, sort_keys=True)
+
+
+def book_of(arguments: dict) -> str | None:
+    """
+    Return the book a tool call is about, if any.
+
+    The title is resolved against the catalog the way `locate_book` does, so
+    differently spelled titles of the same book are the same book.
+
+    Args:
+        arguments (dict): The arguments of the call.
+
+    Returns:
+        str | None: The catalog id of the `book_title` argument, or the
+            normalized title if it isn't in the catalog.
+    """
+    title = arguments.get("book_title")
+    if not isinstance(title, str):
+        return None
+    title_id = get_catalog().index.lookup(title)
+    return f"#{title_id}" if title_id is not None else normalize_title(title)
+
+
+class ToolCache:
+    """
+    Cache of the results of read-only tools, shared by every session.
+
+    Results are kept for a per-tool TTL in a bounded LRU. Identical calls made
+    while one is in progress wait for it instead of running again. Tools that
+    change the state of a book invalidate the cached results about that book.
+    """
+
+    ttls: dict[str, float]
+    invalidates: dict[str, tuple[str, ...]]
+    max_entries: int
+    hits: int
+    misses: int
+    coalesced: int
+    evictions: int
+    invalidations: int
+
+    def __init__(
+        self,
+        ttls: dict[str, float] = TOOL_CACHE_TTLS,
+        invalidates: dict[str, tuple[str, ...]] = TOOL_INVALIDATES,
+        max_entries: int = TOOL_CACHE_SIZE,
+    ):
+        """
+        Args:
+            ttls (dict[str, float]): The TTL of each cached tool. Tools not
+                listed are never cached.
+            invalidates (dict[str, tuple[str, ...]]): The cached tools each
+                tool invalidates for the book it is called on.
+            max_entries (int): The maximum number of cached results.
+        """
+        self.ttls = ttls
+        self.invalidates = invalidates
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[tuple[str, str], tuple[float, str, str | None]] = (
+            OrderedDict()
+        )
+        self._in_flight: dict[tuple[str, str], asyncio.Task[str]] = {}
+
+    async def call(
+        self, name: str, arguments: dict, run: Callable[[], Awaitable[str]]
+    ) -> str:
+        """
+        Return the result of a tool call, from the cache if possible.
+
+        Args:
+            name (str): The name of the tool.
+            arguments (dict): The arguments of the call.
+            run (Callable[[], Awaitable[str]]): Executes the call.
+
+        Returns:
+            str: The result of the call.
+        """
+        if name not in self.ttls:
+            result = await run()
+            for cached in self.invalidates.get(name, ()):
+                self.invalidate(cached, book_of(arguments))
+            return result
+
+        key = (name, normalize_arguments(arguments))
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(run())
+            self._in_flight[key] = task
+            task.add_done_callback(
+                lambda done: self._store(key, done, book_of(arguments))
+            )
+        # A waiter being cancelled must not cancel the call the others share
+        return await asyncio.shield(task)
+
+    def invalidate(self, name: str, book: str | None = None) -> int:
+        """
+        Drop the cached results of a tool.
+
+        Args:
+            name (str): The name of the tool.
+            book (str | None): The book whose results to drop, as returned by
+                `book_of`, or None to drop every result of the tool.
+
+        Returns:
+            int: The number of results dropped.
+        """
+        stale = [
+            key
+            for key, (_, _, entry_book) in self._entries.items()
+            if key[0] == name and (book is None or entry_book == book)
+        ]
+        for key in stale:
+            del self._entries[key]
+
+        # Calls still running may have read the old state, so don't store them
+        for key in [key for key in self._in_flight if key[0] == name]:
+            if book is None or book_of(json.loads(key[1])) == book:
+                del self._in_flight[key]
+
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def stats(self) -> dict[str, float]:
+        """
+        Return the usage statistics of the cache.
+
+        Returns:
+            dict[str, float]: Hit, miss, coalesced call, eviction and
+                invalidation counts, the overall hit rate, and the number of
+                cached results.
+        """
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def _store(
+        self, key: tuple[str, str], task: asyncio.Task[str], book: str | None
+    ) -> None:
+        if self._in_flight.get(key) is not task:
+            return  # Invalidated while running
+        del self._in_flight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        self._entries[key] = (monotonic() + self.ttls[key[0]], task.result(), book)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
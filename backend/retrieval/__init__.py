@@ -0,0 +1,16 @@
+from .chunking import Chunk, chunk_pdf, chunk_text
+from .embedding import EmbeddingFunction, get_embedding, hash_embedding
+from .index import SearchResult, VectorIndex, get_index
+
+
+__all__ = [
+    "Chunk",
+    "chunk_pdf",
+    "chunk_text",
+    "EmbeddingFunction",
+    "get_embedding",
+    "hash_embedding",
+    "SearchResult",
+    "VectorIndex",
+    "get_index",
+]
@@ -0,0 +1,105 @@
+from dataclasses import dataclass
+from typing import Iterator
+import re
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - only needed to read PDFs
+    PdfReader = None
+
+
+WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class Chunk:
+    """
+    Represents a passage of a document stored in the index.
+
+    Attributes:
+        source: The path of the document.
+        page: The page the passage starts on, starting at 1.
+        text: The text of the passage.
+    """
+
+    source: str
+    page: int
+    text: str
+
+    def to_dict(self) -> dict:
+        return {"source": self.source, "page": self.page, "text": self.text}
+
+
+def read_pdf_pages(path: str) -> list[str]:
+    """
+    Extract the text of every page of a PDF file.
+
+    Args:
+        path (str): The path of the PDF file.
+
+    Returns:
+        list[str]: The text of each page.
+
+    Raises:
+        ImportError: If `pypdf` is not installed.
+    """
+    if PdfReader is None:
+        raise ImportError("Reading PDF files requires pypdf: pip install pypdf")
+    return [page.extract_text() or "" for page in PdfReader(path).pages]
+
+
+def chunk_text(text: str, max_chars: int = 1000, overlap: int = 200) -> list[str]:
+    """
+    Split a text into overlapping passages.
+
+    Passages end on word boundaries, and each one repeats the last `overlap`
+    characters of the previous one, so a sentence cut at a boundary is still
+    whole in one of the passages.
+
+    Args:
+        text (str): The text to split.
+        max_chars (int): The maximum length of a passage.
+        overlap (int): The number of characters shared by consecutive passages.
+
+    Returns:
+        list[str]: The passages, in order.
+    """
+    words = WHITESPACE.sub(" ", text).strip().split(" ")
+    if words == [""]:
+        return []
+
+    chunks: list[str] = []
+    start = 0
+    while start < len(words):
+        end, length = start, 0
+        while end < len(words) and (end == start or length + len(words[end]) < max_chars):
+            length += len(words[end]) + 1
+            end += 1
+        chunks.append(" ".join(words[start:end]))
+        if end == len(words):
+            break
+
+        # Step back over the words that make up the overlap
+        next_start, shared = end, 0
+        while next_start > start + 1 and shared + len(words[next_start - 1]) < overlap:
+            next_start -= 1
+            shared += len(words[next_start]) + 1
+        start = next_start
+    return chunks
+
+
+def chunk_pdf(path: str, max_chars: int = 1000, overlap: int = 200) -> Iterator[Chunk]:
+    """
+    Split a PDF file into passages, page by page.
+
+    Args:
+        path (str): The path of the PDF file.
+        max_chars (int): The maximum length of a passage.
+        overlap (int): The number of characters shared by consecutive passages.
+
+    Yields:
+        Chunk: The passages of the file, in order.
+    """
+    for number, page in enumerate(read_pdf_pages(path), start=1):
+        for text in chunk_text(page, max_chars, overlap):
+            yield Chunk(source=path, page=number, text=text)
@@ -0,0 +1,160 @@
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Callable
+import asyncio
+import re
+import threading
+
+import numpy as np
+
+
+EmbeddingFunction = Callable[[list[str]], np.ndarray]
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+HASH_DIMENSIONS: int = 256
+PAIR_MULTIPLIER: np.uint64 = np.uint64(0x9E3779B97F4A7C15)
+OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1 << 18)
+def token_hash(token: str) -> int:
+    """
+    Return a stable 64-bit hash of a token.
+
+    Args:
+        token (str): The token.
+
+    Returns:
+        int: The hash.
+    """
+    return int.from_bytes(blake2b(token.encode(), digest_size=8).digest(), "little")
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scale each row of a matrix to unit length, so dot products are cosines.
+
+    Args:
+        vectors (np.ndarray): The matrix.
+
+    Returns:
+        np.ndarray: The float32 matrix with unit rows. All-zero rows stay zero.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def hash_embedding(texts: list[str], dimensions: int = HASH_DIMENSIONS) -> np.ndarray:
+    """
+    Embed texts by hashing their words and word pairs into a fixed vector.
+
+    This is a deterministic local stand-in for a learned embedding model: it
+    needs no network or model weights, and texts that share words score
+    higher than texts that don't.
+
+    Args:
+        texts (list[str]): The texts to embed.
+        dimensions (int): The number of components of each embedding.
+
+    Returns:
+        np.ndarray: A float32 matrix with one unit row per text.
+    """
+    rows: list[np.ndarray] = []
+    hashes: list[np.ndarray] = []
+    for row, text in enumerate(texts):
+        words = np.array(
+            [token_hash(token) for token in TOKEN.findall(text.lower())], np.uint64
+        )
+        # Word pairs are hashed by combining the hashes of their words
+        pairs = words[:-1] * PAIR_MULTIPLIER + words[1:]
+        hashes += [words, pairs]
+        rows.append(np.full(len(words) + len(pairs), row, dtype=np.int64))
+
+    if not texts:
+        return np.zeros((0, dimensions), dtype=np.float32)
+    features = np.concatenate(hashes)
+    columns = ((features >> np.uint64(1)) % np.uint64(dimensions)).astype(np.int64)
+    signs = np.where(features & np.uint64(1), 1.0, -1.0)
+    vectors = np.bincount(
+        np.concatenate(rows) * dimensions + columns,
+        weights=signs,
+        minlength=len(texts) * dimensions,
+    )
+    return normalize_rows(vectors.reshape(len(texts), dimensions))
+
+
+def embedding_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the event loop embedding requests are made on.
+
+    Embedding functions are synchronous, and called from threads with no
+    event loop of their own, so requests are sent from one background loop
+    whose pooled client is reused by every call.
+
+    Returns:
+        asyncio.AbstractEventLoop: The loop, running in a daemon thread.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="openai-embedding", daemon=True
+            ).start()
+        return _loop
+
+
+def openai_embedding(texts: list[str], batch_size: int = 256) -> np.ndarray:
+    """
+    Embed texts with the OpenAI embeddings API.
+
+    Args:
+        texts (list[str]): The texts to embed.
+        batch_size (int): The number of texts sent per request.
+
+    Returns:
+        np.ndarray: A float32 matrix with one unit row per text.
+    """
+    from backend.client import get_client
+
+    async def embed() -> list[list[float]]:
+        client = get_client("embedding")
+        vectors: list[list[float]] = []
+        for start in range(0, len(texts), batch_size):
+            response = await client.embeddings.create(
+                model=OPENAI_EMBEDDING_MODEL, input=texts[start : start + batch_size]
+            )
+            vectors.extend(item.embedding for item in response.data)
+        return vectors
+
+    vectors = asyncio.run_coroutine_threadsafe(embed(), embedding_loop()).result()
+    return normalize_rows(np.array(vectors))
+
+
+EMBEDDINGS: dict[str, EmbeddingFunction] = {
+    "hash": hash_embedding,
+    "openai": openai_embedding,
+}
+
+
+def get_embedding(name: str) -> EmbeddingFunction:
+    """
+    Return an embedding function by name.
+
+    Args:
+        name (str): The name of the function, a key of `EMBEDDINGS`.
+
+    Returns:
+        EmbeddingFunction: The embedding function.
+
+    Raises:
+        ValueError: If no embedding function has that name.
+    """
+    if name not in EMBEDDINGS:
+        raise ValueError(f"Unknown embedding {name!r}, expected one of {list(EMBEDDINGS)}")
+    return EMBEDDINGS[name]
@@ -0,0 +1,415 @@
+from array import array
+from dataclasses import dataclass
+from os import getenv
+from typing import Iterable
+import json
+import mmap
+import os
+import threading
+
+import numpy as np
+
+from .chunking import Chunk
+from .embedding import EmbeddingFunction, get_embedding
+
+
+RETRIEVAL_INDEX: str = getenv("RETRIEVAL_INDEX", "retrieval_index")
+
+BLOCK_ROWS: int = 65536
+
+
+@dataclass
+class SearchResult:
+    """
+    Represents a passage matching a query.
+
+    Attributes:
+        chunk: The passage.
+        score: The cosine similarity of the passage to the query.
+    """
+
+    chunk: Chunk
+    score: float
+
+    def to_dict(self) -> dict:
+        return {**self.chunk.to_dict(), "score": round(self.score, 4)}
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the highest scores of each row of a matrix.
+
+    Args:
+        scores (np.ndarray): The scores, one row per query.
+        k (int): The number of scores to keep per row.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The kept scores, in descending order,
+            and their columns. Rows have `min(k, scores.shape[1])` entries.
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return scores[:, :0], np.zeros((len(scores), 0), dtype=np.int64)
+    columns = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    kept = np.take_along_axis(scores, columns, axis=1)
+    order = np.argsort(-kept, axis=1, kind="stable")
+    return (
+        np.take_along_axis(kept, order, axis=1),
+        np.take_along_axis(columns, order, axis=1),
+    )
+
+
+def train_centroids(
+    sample: np.ndarray, lists: int, iterations: int = 10, seed: int = 0
+) -> np.ndarray:
+    """
+    Cluster unit vectors with spherical k-means.
+
+    Args:
+        sample (np.ndarray): The vectors to cluster, one per row.
+        lists (int): The number of clusters.
+        iterations (int): The number of refinement passes.
+        seed (int): The seed of the initial centroid choice.
+
+    Returns:
+        np.ndarray: The unit centroids, one per row.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for cluster in range(lists):
+            members = sample[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+            else:
+                # Restart empty clusters on a random vector
+                centroids[cluster] = sample[rng.integers(len(sample))]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class VectorIndex:
+    """
+    Local index of document passages and their embeddings.
+
+    An index is a directory holding the embeddings as a raw float32 matrix,
+    which is memory-mapped rather than loaded, and the passages as JSON lines
+    read on demand, so opening an index is instant at any size. Queries are
+    embedded and scored in batches with NumPy.
+
+    With an inverted file (`lists` > 0), vectors are clustered and stored
+    grouped by cluster. A query then only scores the clusters whose centroids
+    are closest to it, trading a little recall for a large speedup on big
+    corpora.
+    """
+
+    directory: str
+    dimensions: int
+    count: int
+    embedding: str
+    embed: EmbeddingFunction
+    vectors: np.ndarray
+    centroids: np.ndarray | None
+    list_offsets: np.ndarray | None
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory (str): The directory of an index written by `build`.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dimensions = meta["dimensions"]
+        self.count = meta["count"]
+        self.embedding = meta["embedding"]
+        self.embed = get_embedding(self.embedding)
+
+        self.centroids = None
+        self.list_offsets = None
+        if self.count == 0:
+            self.vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+            self._offsets = np.zeros((0, 2), dtype=np.int64)
+            self._chunks: bytes | mmap.mmap = b""
+            return
+
+        self.vectors = np.memmap(
+            os.path.join(directory, "vectors.f32"),
+            dtype=np.float32,
+            mode="r",
+            shape=(self.count, self.dimensions),
+        )
+        self._offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "chunks.jsonl"), "rb") as f:
+            self._chunks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if meta["lists"]:
+            self.centroids = np.load(os.path.join(directory, "centroids.npy"))
+            self.list_offsets = np.load(os.path.join(directory, "list_offsets.npy"))
+
+    @classmethod
+    def build(
+        cls,
+        directory: str,
+        chunks: Iterable[Chunk],
+        embedding: str = "hash",
+        lists: int = 0,
+        batch_size: int = 256,
+    ) -> "VectorIndex":
+        """
+        Embed passages and write them to a new index.
+
+        Passages are embedded and written in batches, so the corpus never has
+        to fit in memory.
+
+        Args:
+            directory (str): The directory to write the index to.
+            chunks (Iterable[Chunk]): The passages to index.
+            embedding (str): The name of the embedding function.
+            lists (int): The number of clusters of the inverted file, or 0 for
+                an exhaustive index.
+            batch_size (int): The number of passages embedded at once.
+
+        Returns:
+            VectorIndex: The new index.
+        """
+        os.makedirs(directory, exist_ok=True)
+        embed = get_embedding(embedding)
+        vectors_path = os.path.join(directory, "vectors.f32")
+        offsets = array("q")
+        count, dimensions = 0, 0
+
+        with (
+            open(f"{vectors_path}.tmp", "wb") as vectors_file,
+            open(os.path.join(directory, "chunks.jsonl"), "wb") as chunks_file,
+        ):
+
+            def flush(batch: list[Chunk]) -> None:
+                nonlocal count, dimensions
+                vectors = embed([chunk.text for chunk in batch])
+                dimensions = vectors.shape[1]
+                vectors_file.write(np.ascontiguousarray(vectors, np.float32).tobytes())
+                for chunk in batch:
+                    offsets.append(chunks_file.tell())
+                    chunks_file.write(json.dumps(chunk.to_dict()).encode() + b"\n")
+                count += len(batch)
+
+            batch: list[Chunk] = []
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) == batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+            offsets.append(chunks_file.tell())
+
+        if count == 0:
+            dimensions = embed(["empty"]).shape[1]
+        lists = min(lists, count)
+        ends = np.frombuffer(offsets, dtype=np.int64)
+        row_offsets = np.stack([ends[:-1], ends[1:]], axis=1)
+
+        if lists:
+            row_offsets = cls._write_inverted_file(
+                directory, vectors_path, count, dimensions, lists, row_offsets
+            )
+        else:
+            os.replace(f"{vectors_path}.tmp", vectors_path)
+
+        np.save(os.path.join(directory, "offsets.npy"), row_offsets)
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "dimensions": dimensions,
+                    "count": count,
+                    "embedding": embedding,
+                    "lists": lists,
+                },
+                f,
+            )
+        return cls(directory)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The size of the index on disk, in bytes.
+        """
+        return sum(
+            entry.stat().st_size
+            for entry in os.scandir(self.directory)
+            if entry.is_file()
+        )
+
+    def search(
+        self, queries: list[str], k: int = 5, probes: int = 8
+    ) -> list[list[SearchResult]]:
+        """
+        Find the passages most similar to each query.
+
+        Args:
+            queries (list[str]): The queries.
+            k (int): The maximum number of passages per query.
+            probes (int): The number of clusters scored per query, for an
+                inverted file index.
+
+        Returns:
+            list[list[SearchResult]]: The best passages of each query, best first.
+        """
+        scores, rows = self.search_vectors(self.embed(queries), k, probes)
+        return [
+            [
+                SearchResult(self.chunk(int(row)), float(score))
+                for score, row in zip(query_scores, query_rows)
+                if row >= 0
+            ]
+            for query_scores, query_rows in zip(scores, rows)
+        ]
+
+    def search_vectors(
+        self, queries: np.ndarray, k: int = 5, probes: int = 8
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the stored vectors most similar to each query vector.
+
+        Args:
+            queries (np.ndarray): The unit query vectors, one per row.
+            k (int): The maximum number of vectors per query.
+            probes (int): The number of clusters scored per query, for an
+                inverted file index.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The scores and rows of the best
+                vectors of each query, best first. Missing entries have row -1.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.centroids is None or self.list_offsets is None:
+            return self._search_exhaustive(queries, k)
+        return self._search_inverted_file(
+            queries, k, probes, self.centroids, self.list_offsets
+        )
+
+    def chunk(self, row: int) -> Chunk:
+        """
+        Return a passage of the index.
+
+        Args:
+            row (int): The row of the passage.
+
+        Returns:
+            Chunk: The passage.
+        """
+        start, end = self._offsets[row]
+        return Chunk(**json.loads(self._chunks[start:end]))
+
+    def _search_exhaustive(
+        self, queries: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+
+        # Score in blocks to bound the size of the score matrix
+        for start in range(0, self.count, BLOCK_ROWS):
+            block = self.vectors[start : start + BLOCK_ROWS]
+            scores, rows = top_k(queries @ block.T, k)
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            merged_rows = np.concatenate([best_rows, rows + start], axis=1)
+            best_scores, columns = top_k(merged_scores, k)
+            best_rows = np.take_along_axis(merged_rows, columns, axis=1)
+        return best_scores, best_rows
+
+    def _search_inverted_file(
+        self,
+        queries: np.ndarray,
+        k: int,
+        probes: int,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        _, probed = top_k(queries @ centroids.T, probes)
+        candidate_scores: list[list[np.ndarray]] = [[] for _ in queries]
+        candidate_rows: list[list[np.ndarray]] = [[] for _ in queries]
+
+        # Score each probed cluster once, against every query that probes it
+        for cluster in np.unique(probed):
+            start, end = list_offsets[cluster], list_offsets[cluster + 1]
+            if start == end:
+                continue
+            members = np.nonzero((probed == cluster).any(axis=1))[0]
+            scores, rows = top_k(queries[members] @ self.vectors[start:end].T, k)
+            for i, member in enumerate(members):
+                candidate_scores[member].append(scores[i])
+                candidate_rows[member].append(rows[i] + start)
+
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for query in range(len(queries)):
+            if not candidate_scores[query]:
+                continue
+            scores = np.concatenate(candidate_scores[query])[None]
+            rows = np.concatenate(candidate_rows[query])
+            kept, columns = top_k(scores, k)
+            best_scores[query, : kept.shape[1]] = kept[0]
+            best_rows[query, : kept.shape[1]] = rows[columns[0]]
+        return best_scores, best_rows
+
+    @staticmethod
+    def _write_inverted_file(
+        directory: str,
+        vectors_path: str,
+        count: int,
+        dimensions: int,
+        lists: int,
+        row_offsets: np.ndarray,
+    ) -> np.ndarray:
+        unordered = np.memmap(
+            f"{vectors_path}.tmp", dtype=np.float32, mode="r", shape=(count, dimensions)
+        )
+        rng = np.random.default_rng(0)
+        sample_size = min(count, max(lists * 64, 10000))
+        sample = np.asarray(unordered[np.sort(rng.choice(count, sample_size, replace=False))])
+        centroids = train_centroids(sample, lists)
+
+        assignments = np.concatenate(
+            [
+                np.argmax(unordered[start : start + BLOCK_ROWS] @ centroids.T, axis=1)
+                for start in range(0, count, BLOCK_ROWS)
+            ]
+        )
+        order = np.argsort(assignments, kind="stable")
+
+        # Store the vectors grouped by cluster, so each cluster is one slice
+        ordered = np.memmap(
+            vectors_path, dtype=np.float32, mode="w+", shape=(count, dimensions)
+        )
+        for start in range(0, count, BLOCK_ROWS):
+            ordered[start : start + BLOCK_ROWS] = unordered[order[start : start + BLOCK_ROWS]]
+        ordered.flush()
+        del ordered, unordered
+        os.remove(f"{vectors_path}.tmp")
+
+        list_offsets = np.zeros(lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=lists), out=list_offsets[1:])
+        np.save(os.path.join(directory, "centroids.npy"), centroids)
+        np.save(os.path.join(directory, "list_offsets.npy"), list_offsets)
+
+        # Passages stay where they are, their offsets follow the new order
+        return row_offsets[order]
+
+
+_index: VectorIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> VectorIndex:
+    """
+    Return the index stored in `RETRIEVAL_INDEX`, opening it on first use.
+
+    Returns:
+        VectorIndex: The index.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = VectorIndex(RETRIEVAL_INDEX)
+    return _index
@@ -0,0 +1,3 @@
+from .sessions import Session, SessionManager
+
+__all__ = ["Session", "SessionManager"]
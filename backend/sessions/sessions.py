@@ -0,0 +1,211 @@
+from collections import OrderedDict
+from time import monotonic, time
+import asyncio
+
+from backend.orchestrator import ConversationState
+from backend.types import HistoryRecord, Message
+
+
+class Session:
+    """
+    Represents the conversation of one connected client.
+
+    Attributes:
+        session_id: The identifier of the client's session.
+        history: The messages of the conversation.
+        state: The server-side state of the conversation.
+        last_access: The monotonic time the session was last used.
+        nbytes: The approximate memory held by the history.
+    """
+
+    __slots__ = ("session_id", "history", "state", "last_access", "nbytes")
+
+    session_id: str
+    history: list[HistoryRecord]
+    state: ConversationState
+    last_access: float
+    nbytes: int
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.history = []
+        self.state = ConversationState()
+        self.last_access = monotonic()
+        self.nbytes = 0
+
+    def append(self, message: Message | HistoryRecord) -> HistoryRecord:
+        """
+        Add a message to the history of the session, which counts as using it.
+
+        Args:
+            message (Message | HistoryRecord): The message to add.
+
+        Returns:
+            HistoryRecord: The record stored in the history.
+        """
+        record = (
+            message
+            if isinstance(message, HistoryRecord)
+            else HistoryRecord.from_message(message)
+        )
+        self.history.append(record)
+        self.nbytes += record.nbytes
+        self.last_access = monotonic()
+        return record
+
+    def pop(self) -> HistoryRecord:
+        """
+        Remove the last message from the history of the session.
+
+        Returns:
+            HistoryRecord: The removed record.
+        """
+        record = self.history.pop()
+        self.nbytes -= record.nbytes
+        return record
+
+
+class SessionManager:
+    """
+    Holds the sessions of all connected clients.
+
+    Sessions idle for longer than `ttl` are dropped, and the least recently
+    used sessions are evicted while there are more than `max_sessions` or the
+    histories hold more than `max_bytes`.
+    """
+
+    ttl: float
+    max_sessions: int
+    max_bytes: int
+    evictions: int
+
+    def __init__(
+        self,
+        ttl: float = 30 * 60,
+        max_sessions: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        greeting: str | None = None,
+    ):
+        """
+        Args:
+            ttl (float): The idle time, in seconds, after which a session expires.
+            max_sessions (int): The maximum number of live sessions.
+            max_bytes (int): The maximum memory held by all histories.
+            greeting (str | None): The assistant message every session starts with.
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._greeting = greeting
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+        self._bytes: int = 0
+
+    def get(self, session_id: str) -> Session:
+        """
+        Return the session of a client, creating it if needed.
+
+        Args:
+            session_id (str): The identifier of the client's session.
+
+        Returns:
+            Session: The session.
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = Session(session_id)
+            if self._greeting is not None:
+                self.append(
+                    session, HistoryRecord("assistant", self._greeting, time())
+                )
+        else:
+            self._sessions.move_to_end(session_id)
+
+        session.last_access = monotonic()
+        self.evict()
+        return session
+
+    def append(self, session: Session, message: Message | HistoryRecord) -> None:
+        """
+        Add a message to the history of a session, marking it as the most
+        recently used.
+
+        Args:
+            session (Session): The session.
+            message (Message | HistoryRecord): The message to add.
+        """
+        record = session.append(message)
+        if self._sessions.get(session.session_id) is session:
+            self._sessions.move_to_end(session.session_id)
+            self._bytes += record.nbytes
+            self.evict()
+
+    def pop(self, session: Session) -> HistoryRecord:
+        """
+        Remove the last message from the history of a session.
+
+        Args:
+            session (Session): The session.
+
+        Returns:
+            HistoryRecord: The removed record.
+        """
+        record = session.pop()
+        if self._sessions.get(session.session_id) is session:
+            self._bytes -= record.nbytes
+        return record
+
+    def evict(self) -> None:
+        """
+        Drop expired sessions, then the least recently used ones over the caps.
+
+        The most recently used session is only dropped once it expires.
+        """
+        now = monotonic()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            expired = now - oldest.last_access > self.ttl
+            over_cap = (
+                len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+            )
+            if not expired and not (over_cap and len(self._sessions) > 1):
+                break
+            self._remove(oldest)
+
+    async def watch(self, interval: float = 60.0) -> None:
+        """
+        Drop expired sessions periodically, so sessions no client comes back
+        to are reclaimed even while no other client is active.
+
+        Args:
+            interval (float): The time between checks, in seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.evict()
+
+    @property
+    def bytes_held(self) -> int:
+        """
+        The approximate memory held by all histories.
+        """
+        return self._bytes
+
+    def stats(self) -> dict[str, int]:
+        """
+        Return the usage statistics of the manager.
+
+        Returns:
+            dict[str, int]: The number of live sessions, the bytes they hold
+                and the number of sessions evicted so far.
+        """
+        return {
+            "live_sessions": len(self._sessions),
+            "bytes_held": self.bytes_held,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, session: Session) -> None:
+        del self._sessions[session.session_id]
+        self._bytes -= session.nbytes
+        self.evictions += 1
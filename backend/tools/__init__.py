@@ -1,5 +1,18 @@
-from .bookadmin import place_on_hold, renew_book
+from .bookadmin import place_on_hold, renew_book, tool_result_phrases
 from .locatebook import locate_book
+from .registry import TOOL_CONTEXT, Tool, ToolError, ToolRegistry, get_registry
+from .searchdocs import search_documents
 
 
-__all__ = ["place_on_hold", "renew_book", "locate_book"]
+__all__ = [
+    "place_on_hold",
+    "renew_book",
+    "tool_result_phrases",
+    "locate_book",
+    "search_documents",
+    "TOOL_CONTEXT",
+    "Tool",
+    "ToolError",
+    "ToolRegistry",
+    "get_registry",
+]
@@ -0,0 +1,6 @@
+from .registry import TOOLS_FILE, get_registry
+
+
+if __name__ == "__main__":
+    get_registry().write_schemas()
+    print(f"✅ Wrote {len(get_registry().tools)} tools to {TOOLS_FILE}")
@@ -1,23 +1,76 @@
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 
+from backend.tools.holds import LOAN_DAYS, get_holds_engine
 
-def place_on_hold(title: str) -> str:
+
+HOLD_MESSAGE: str = "{title} placed on hold."
+HOLD_QUEUE_MESSAGE: str = "You are number {position} in the queue."
+ALREADY_HELD_MESSAGE: str = (
+    "{title} is already on hold, number {position} in the queue."
+)
+RENEW_MESSAGE: str = "{title} renewed, expires on {date}"
+RENEW_REFUSED_MESSAGE: str = "{title} could not be renewed: {reason}."
+
+# The patron of calls made outside a chat session, such as from scripts
+DEFAULT_PATRON: str = "default"
+# The queue positions whose hold messages are synthesized ahead of time
+PREWARM_POSITIONS: int = 3
+
+
+def place_on_hold(title: str, patron_id: str = DEFAULT_PATRON) -> str:
     """
     Place a book on hold.
 
     Args:
         title (str): The title of the book to place on hold.
+        patron_id (str): The identifier of the patron placing the hold.
     """
-    return f"{title} placed on hold."
+    result = get_holds_engine().place_hold(patron_id, title)
+    if not result.placed:
+        return ALREADY_HELD_MESSAGE.format(title=title, position=result.position)
+    return " ".join(
+        [
+            HOLD_MESSAGE.format(title=title),
+            HOLD_QUEUE_MESSAGE.format(position=result.position),
+        ]
+    )
 
 
-def renew_book(title: str) -> str:
+def renew_book(title: str, patron_id: str = DEFAULT_PATRON) -> str:
     """
     Renew a book.
 
     Args:
         title (str): The title of the book to renew.
+        patron_id (str): The identifier of the patron renewing the book.
+    """
+    result = get_holds_engine().renew(patron_id, title)
+    if not result.renewed or result.due is None:
+        return RENEW_REFUSED_MESSAGE.format(title=title, reason=result.reason)
+    return RENEW_MESSAGE.format(title=title, date=result.due.strftime("%Y-%m-%d"))
+
+
+def tool_result_phrases(title: str) -> list[str]:
+    """
+    Return the messages the tools in this module produce for a title.
+
+    Args:
+        title (str): The title of the book.
+
+    Returns:
+        list[str]: The hold messages for the first queue positions, and
+            the renewal message for a loan renewed today.
     """
-    new_expiration = datetime.now() + timedelta(days=30)
-    formatted_date = new_expiration.strftime("%Y-%m-%d")
-    return f"{title} renewed, expires on {formatted_date}"
+    due = date.today() + timedelta(days=LOAN_DAYS)
+    return [
+        *(
+            " ".join(
+                [
+                    HOLD_MESSAGE.format(title=title),
+                    HOLD_QUEUE_MESSAGE.format(position=position),
+                ]
+            )
+            for position in range(1, PREWARM_POSITIONS + 1)
+        ),
+        RENEW_MESSAGE.format(title=title, date=due.strftime("%Y-%m-%d")),
+    ]
@@ -0,0 +1,343 @@
+from array import array
+from dataclasses import dataclass
+from os import getenv
+import asyncio
+import csv
+import heapq
+import json
+import logging
+import os
+import re
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILE: str = getenv("CATALOG_FILE", "backend/tools/catalog.csv")
+
+LEADING_ARTICLE = re.compile(r"^(the|a|an) ")
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_title(title: str) -> str:
+    """
+    Normalize a book title for lookups.
+
+    Args:
+        title (str): The title to normalize.
+
+    Returns:
+        str: The title in lowercase, with punctuation and a leading article
+            removed and whitespace collapsed.
+    """
+    normalized = NON_ALPHANUMERIC.sub(" ", title.lower()).strip()
+    return LEADING_ARTICLE.sub("", normalized)
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Return the character trigrams of a normalized text, padded at both ends.
+
+    Args:
+        text (str): The normalized text.
+
+    Returns:
+        set[str]: The distinct trigrams of the text.
+    """
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class Holding:
+    """
+    Represents the copies of a title held by a library branch.
+
+    Attributes:
+        branch: The name of the library branch.
+        copies: The number of copies the branch owns.
+        available: The number of copies available for checkout.
+    """
+
+    branch: str
+    copies: int
+    available: int
+
+    def to_dict(self) -> dict[str, str | int]:
+        """
+        Returns a dictionary representation of the holding.
+
+        Returns:
+            dict[str, str | int]: A dictionary containing the branch name and
+                the number of copies owned and available.
+        """
+        return {
+            "branch": self.branch,
+            "copies": self.copies,
+            "available": self.available,
+        }
+
+
+class CatalogIndex:
+    """
+    In-memory index of the titles held across the library branches.
+
+    Exact lookups of a normalized title are a single dictionary access. Other
+    lookups go through an inverted index of title trigrams: candidates are
+    gathered from the rarest trigrams of the query only, then ranked by their
+    Dice similarity to it, which keeps typo-tolerant lookups fast even when
+    common trigrams are shared by most of the catalog.
+    """
+
+    titles: list[str]
+    holdings: list[dict[str, Holding]]
+
+    def __init__(self):
+        self.titles = []
+        self.holdings = []
+        self._ids: dict[str, int] = {}
+        self._normalized: list[str] = []
+        self._sizes = array("H")
+        self._postings: dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def add(self, title: str, branch: str, copies: int, available: int) -> None:
+        """
+        Add or replace the holding of a title at a branch.
+
+        Args:
+            title (str): The title of the book.
+            branch (str): The name of the library branch.
+            copies (int): The number of copies the branch owns.
+            available (int): The number of copies available for checkout.
+        """
+        normalized = normalize_title(title)
+        title_id = self._ids.get(normalized)
+        if title_id is None:
+            title_id = self._ids[normalized] = len(self.titles)
+            self.titles.append(title)
+            self._normalized.append(normalized)
+            self.holdings.append({})
+            grams = trigrams(normalized)
+            self._sizes.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                self._postings.setdefault(gram, array("I")).append(title_id)
+
+        self.holdings[title_id][branch] = Holding(branch, copies, available)
+
+    def lookup(self, title: str, min_score: float = 0.5) -> int | None:
+        """
+        Find the title that best matches a query.
+
+        Args:
+            title (str): The title to look up, possibly misspelled.
+            min_score (float): The minimum similarity of a fuzzy match.
+
+        Returns:
+            int | None: The identifier of the matching title, or None.
+        """
+        title_id = self._ids.get(normalize_title(title))
+        if title_id is not None:
+            return title_id
+
+        matches = self.search(title, limit=1, min_score=min_score)
+        return matches[0][0] if matches else None
+
+    def search(
+        self,
+        title: str,
+        limit: int = 5,
+        min_score: float = 0.5,
+        max_candidates: int = 8,
+    ) -> list[tuple[int, float]]:
+        """
+        Find the titles most similar to a query.
+
+        Args:
+            title (str): The title to search for.
+            limit (int): The maximum number of titles to return.
+            min_score (float): The minimum similarity of a returned title.
+            max_candidates (int): The number of candidates scored in full.
+
+        Returns:
+            list[tuple[int, float]]: The identifier and similarity of each
+                matching title, best first.
+        """
+        query = trigrams(normalize_title(title))
+        postings = sorted(
+            (self._postings[gram] for gram in query if gram in self._postings),
+            key=len,
+        )
+        if not postings:
+            return []
+
+        # An edit changes at most three trigrams, so the rarest half of the
+        # query still reaches titles with a couple of typos.
+        ids = np.concatenate(
+            [
+                np.frombuffer(posting, dtype=np.uint32)
+                for posting in postings[: max(3, len(postings) // 2)]
+            ]
+        )
+        title_ids, counts = np.unique(ids, return_counts=True)
+        if len(title_ids) > max_candidates:
+            best = np.argpartition(counts, -max_candidates)[-max_candidates:]
+            title_ids = title_ids[best]
+
+        scored: list[tuple[int, float]] = []
+        for title_id in title_ids.tolist():
+            common = len(query & trigrams(self._normalized[title_id]))
+            score = 2 * common / (len(query) + self._sizes[title_id])
+            if score >= min_score:
+                scored.append((title_id, score))
+
+        return heapq.nlargest(limit, scored, key=lambda match: match[1])
+
+
+def read_rows(path: str, offset: int = 0) -> tuple[list[dict], int]:
+    """
+    Read the rows of a catalog file.
+
+    CSV files need a header with the columns title, branch, copies and
+    available. JSONL files hold one object with the same keys per line.
+
+    Args:
+        path (str): The path of the catalog file.
+        offset (int): The byte offset to start reading a JSONL file from.
+
+    Returns:
+        tuple[list[dict], int]: The rows read, and the byte offset just past
+            the last complete line.
+    """
+    if path.endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return list(csv.DictReader(f)), os.path.getsize(path)
+
+    rows: list[dict] = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # Partially written line, read it on the next refresh
+            offset += len(line)
+            if line.strip():
+                rows.append(json.loads(line))
+    return rows, offset
+
+
+class Catalog:
+    """
+    Keeps a catalog index in sync with the catalog file it was loaded from.
+
+    When rows are appended to a JSONL catalog, only the new rows are applied.
+    Any other change rebuilds the index in a worker thread and swaps it in,
+    so lookups are served throughout.
+    """
+
+    path: str
+    index: CatalogIndex
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = CatalogIndex()
+        self._offset: int = 0
+        self._stat: tuple[float, int] | None = None
+
+    def load(self) -> None:
+        """
+        Rebuild the index from the whole catalog file.
+        """
+        index = CatalogIndex()
+        self._stat = self._current_stat()
+        rows, self._offset = (
+            read_rows(self.path) if self._stat is not None else ([], 0)
+        )
+        apply_rows(index, rows)
+        self.index = index
+
+    async def refresh(self) -> bool:
+        """
+        Apply the changes made to the catalog file since it was last read.
+
+        Returns:
+            bool: True if the index changed.
+        """
+        stat = self._current_stat()
+        if stat == self._stat:
+            return False
+
+        appended = (
+            self._stat is not None
+            and stat is not None
+            and not self.path.endswith(".csv")
+            and stat[1] > self._stat[1]
+        )
+        if appended:
+            rows, offset = await asyncio.to_thread(read_rows, self.path, self._offset)
+            apply_rows(self.index, rows)
+            self._offset = offset
+            self._stat = stat
+        else:
+            await asyncio.to_thread(self.load)
+        return True
+
+    async def watch(self, interval: float = 5.0) -> None:
+        """
+        Refresh the index whenever the catalog file changes.
+
+        A refresh that fails, on a malformed row or a file caught mid-rewrite,
+        is logged and the current index kept; watching goes on.
+
+        Args:
+            interval (float): The time between checks, in seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh the catalog from %s", self.path)
+
+    def _current_stat(self) -> tuple[float, int] | None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+
+def apply_rows(index: CatalogIndex, rows: list[dict]) -> None:
+    """
+    Add the rows of a catalog file to an index.
+
+    Args:
+        index (CatalogIndex): The index to update.
+        rows (list[dict]): The rows to add.
+    """
+    for row in rows:
+        index.add(
+            title=row["title"],
+            branch=row["branch"],
+            copies=int(row["copies"]),
+            available=int(row["available"]),
+        )
+
+
+_catalog: Catalog | None = None
+
+
+def get_catalog() -> Catalog:
+    """
+    Return the catalog loaded from `CATALOG_FILE`, loading it on first use.
+
+    Returns:
+        Catalog: The catalog.
+    """
+    global _catalog
+    if _catalog is None:
+        _catalog = Catalog(CATALOG_FILE)
+        _catalog.load()
+    return _catalog
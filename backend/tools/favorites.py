@@ -0,0 +1,291 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+import json
+import os
+import sqlite3
+import threading
+
+
+BOOK_FIELDS: tuple[str, ...] = ("title", "author", "publisher", "year", "description")
+
+
+def book_key(book: dict) -> str:
+    """
+    Return the key that identifies a book among a user's favorites.
+
+    Args:
+        book (dict): The details of the book.
+
+    Returns:
+        str: The lowercased title and author of the book.
+
+    Raises:
+        ValueError: If the book has no title or no author.
+    """
+    title, author = book.get("title"), book.get("author")
+    if not isinstance(title, str) or not isinstance(author, str):
+        raise ValueError("A favorite book needs a title and an author.")
+    return f"{title.lower()}\x1f{author.lower()}"
+
+
+class FavoritesStore(ABC):
+    """
+    Storage backend for the books users save as favorites.
+
+    A favorite is identified by its user and the case-insensitive title and
+    author of the book, so the same book is never saved twice for a user.
+    """
+
+    @abstractmethod
+    def add(self, user_id: str, book: dict) -> bool:
+        """
+        Add a book to a user's favorites.
+
+        Args:
+            user_id (str): The identifier for the user.
+            book (dict): The details of the book.
+
+        Returns:
+            bool: True if the book was added, False if it was already saved.
+
+        Raises:
+            ValueError: If the book has no title or no author.
+        """
+
+    @abstractmethod
+    def add_many(self, user_id: str, books: list[dict]) -> int:
+        """
+        Add several books to a user's favorites at once.
+
+        Args:
+            user_id (str): The identifier for the user.
+            books (list[dict]): The details of each book.
+
+        Returns:
+            int: The number of books that were added.
+
+        Raises:
+            ValueError: If a book has no title or no author. No book is added.
+        """
+
+    @abstractmethod
+    def get(self, user_id: str, limit: int | None = None, offset: int = 0) -> list[dict]:
+        """
+        Return a page of a user's favorites, in the order they were added.
+
+        Args:
+            user_id (str): The identifier for the user.
+            limit (int | None): The maximum number of books to return, or None
+                for all of them.
+            offset (int): The number of books to skip.
+
+        Returns:
+            list[dict]: The details of each book.
+        """
+
+
+class JsonFavoritesStore(FavoritesStore):
+    """
+    Keeps all favorites in a single JSON file, rewritten on every change.
+    """
+
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> dict[str, list[dict]]:
+        """
+        Load all favorites from the file.
+
+        Returns:
+            dict[str, list[dict]]: A dictionary mapping user IDs to their
+                favorite books. Empty if the file doesn't exist or is invalid.
+        """
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                try:
+                    return json.load(f)
+                except json.JSONDecodeError:
+                    return {}
+        return {}
+
+    def save(self, favorites: dict[str, list[dict]]) -> None:
+        """
+        Replace all favorites in the file.
+
+        Args:
+            favorites (dict[str, list[dict]]): A dictionary mapping user IDs to
+                their favorite books.
+        """
+        with open(self.path, "w") as f:
+            json.dump(favorites, f, indent=4)
+
+    def add(self, user_id: str, book: dict) -> bool:
+        return self.add_many(user_id, [book]) == 1
+
+    def add_many(self, user_id: str, books: list[dict]) -> int:
+        with self._lock:
+            favorites = self.load()
+            saved = favorites.setdefault(user_id, [])
+            keys = {book_key(book) for book in saved}
+            added = 0
+            for book in books:
+                key = book_key(book)
+                if key not in keys:
+                    keys.add(key)
+                    saved.append(book)
+                    added += 1
+            if added:
+                self.save(favorites)
+            return added
+
+    def get(self, user_id: str, limit: int | None = None, offset: int = 0) -> list[dict]:
+        saved = self.load().get(user_id, [])
+        return saved[offset:] if limit is None else saved[offset : offset + limit]
+
+
+class SqliteFavoritesStore(FavoritesStore):
+    """
+    Keeps favorites in a SQLite database in write-ahead logging mode.
+
+    A unique index on the user and the key of the book, lowercased in Python
+    as by the JSON store, makes each add a single indexed insert. Every
+    thread gets its own connection, so readers never wait for writers.
+    """
+
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS favorites (
+                    id INTEGER PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    publisher TEXT,
+                    year INTEGER,
+                    description TEXT,
+                    added_at TEXT NOT NULL,
+                    book_key TEXT NOT NULL DEFAULT ''
+                );
+                CREATE TABLE IF NOT EXISTS migrations (
+                    source TEXT PRIMARY KEY,
+                    migrated_at TEXT NOT NULL
+                );
+                """
+            )
+            self._add_book_keys(connection)
+            connection.execute(
+                """
+                CREATE UNIQUE INDEX IF NOT EXISTS favorites_book_key
+                    ON favorites (user_id, book_key)
+                """
+            )
+
+    def add(self, user_id: str, book: dict) -> bool:
+        return self.add_many(user_id, [book]) == 1
+
+    def add_many(self, user_id: str, books: list[dict]) -> int:
+        added_at = datetime.now().isoformat()
+        rows = [
+            (user_id, *(book.get(field) for field in BOOK_FIELDS), added_at, book_key(book))
+            for book in books
+        ]
+        with self._connection() as connection:
+            before = connection.total_changes
+            # Only duplicates are skipped, other constraint violations raise
+            connection.executemany(
+                """
+                INSERT INTO favorites
+                    (user_id, title, author, publisher, year, description, added_at, book_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, book_key) DO NOTHING
+                """,
+                rows,
+            )
+            return connection.total_changes - before
+
+    def get(self, user_id: str, limit: int | None = None, offset: int = 0) -> list[dict]:
+        rows = self._connection().execute(
+            """
+            SELECT title, author, publisher, year, description FROM favorites
+            WHERE user_id = ? ORDER BY id LIMIT ? OFFSET ?
+            """,
+            (user_id, -1 if limit is None else limit, offset),
+        )
+        return [dict(zip(BOOK_FIELDS, row)) for row in rows]
+
+    def migrate_from(self, source: JsonFavoritesStore) -> int:
+        """
+        Copy the favorites of a JSON store into this database, once.
+
+        The migration is recorded in the database, so later calls with the
+        same file do nothing.
+
+        Args:
+            source (JsonFavoritesStore): The store to migrate.
+
+        Returns:
+            int: The number of favorites copied.
+        """
+        source_path = os.path.abspath(source.path)
+        connection = self._connection()
+        if connection.execute(
+            "SELECT 1 FROM migrations WHERE source = ?", (source_path,)
+        ).fetchone():
+            return 0
+
+        added = 0
+        for user_id, books in source.load().items():
+            added += self.add_many(user_id, books)
+
+        with connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO migrations VALUES (?, ?)",
+                (source_path, datetime.now().isoformat()),
+            )
+        return added
+
+    @staticmethod
+    def _add_book_keys(connection: sqlite3.Connection) -> None:
+        # Databases made before the key column was added index lower(), which
+        # only folds ASCII letters
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(favorites)")]
+        if "book_key" not in columns:
+            connection.execute(
+                "ALTER TABLE favorites ADD COLUMN book_key TEXT NOT NULL DEFAULT ''"
+            )
+        rows = connection.execute(
+            "SELECT id, user_id, title, author FROM favorites WHERE book_key = '' ORDER BY id"
+        ).fetchall()
+        if not rows:
+            return
+        connection.execute("DROP INDEX IF EXISTS favorites_book")
+        taken = set(
+            connection.execute("SELECT user_id, book_key FROM favorites WHERE book_key != ''")
+        )
+        for row_id, user_id, title, author in rows:
+            key = book_key({"title": title, "author": author})
+            if (user_id, key) in taken:
+                # Told apart by lower() but the same book, keep the first
+                connection.execute("DELETE FROM favorites WHERE id = ?", (row_id,))
+            else:
+                taken.add((user_id, key))
+                connection.execute(
+                    "UPDATE favorites SET book_key = ? WHERE id = ?", (key, row_id)
+                )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
@@ -0,0 +1,531 @@
+from dataclasses import dataclass
+from datetime import date, timedelta
+from itertools import count
+from os import getenv
+import atexit
+import csv
+import heapq
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from backend.tools.catalog import normalize_title
+
+
+logger = logging.getLogger(__name__)
+
+HOLDS_DB: str = getenv("HOLDS_DB", "holds.db")
+# A CSV file of the loans of the library, with the columns patron_id, title,
+# due (YYYY-MM-DD) and optionally renewals. Without it, loans aren't tracked.
+LOANS_FILE: str | None = getenv("LOANS_FILE") or None
+
+# The attempts at committing changes once the engine is closing, after which
+# the changes that still can't be written are given up
+CLOSE_WRITE_ATTEMPTS: int = 5
+
+MAX_RENEWALS: int = 2
+LOAN_DAYS: int = 30
+
+
+@dataclass
+class Loan:
+    """
+    Represents a book checked out by a patron.
+
+    Attributes:
+        patron_id: The identifier of the patron.
+        title: The title of the book.
+        due: The date the book is due back.
+        renewals: The number of times the loan was renewed.
+    """
+
+    patron_id: str
+    title: str
+    due: date
+    renewals: int = 0
+
+
+@dataclass
+class HoldResult:
+    """
+    Represents the outcome of placing a hold.
+
+    Attributes:
+        placed: Whether a new hold was placed.
+        position: The patron's position in the title's queue, starting at 1.
+    """
+
+    placed: bool
+    position: int
+
+
+@dataclass
+class RenewResult:
+    """
+    Represents the outcome of renewing a loan.
+
+    Attributes:
+        renewed: Whether the loan was renewed.
+        due: The date the book is due back, if the patron has it.
+        reason: Why the loan was not renewed, if it wasn't.
+    """
+
+    renewed: bool
+    due: date | None = None
+    reason: str | None = None
+
+
+class HoldsEngine:
+    """
+    Keeps the hold queues and loans of the library.
+
+    Each title has a queue of holds, served by priority and then in the order
+    they were placed. All state lives in memory behind a lock, so every
+    operation takes microseconds and can be called from the event loop or
+    from worker threads. Changes are journaled to SQLite by a background
+    writer thread that commits them in batches, so callers never wait on disk.
+
+    Loans are tracked once they are imported from a loans file. Until then,
+    a patron renewing a book is taken at their word that they have it.
+    """
+
+    path: str
+    tracks_loans: bool
+
+    def __init__(self, path: str = HOLDS_DB, loans_file: str | None = LOANS_FILE):
+        """
+        Args:
+            path (str): The path of the SQLite database holding the state.
+            loans_file (str | None): A CSV file of loans to import, if any.
+        """
+        self.path = path
+        self.tracks_loans = loans_file is not None
+        self._lock = threading.Lock()
+        self._queues: dict[str, list[tuple[int, int, str]]] = {}
+        self._loans: dict[str, dict[str, Loan]] = {}
+        self._sequence = count()
+        self._journal: queue.Queue[tuple | None] = queue.Queue()
+        self._batch: list[tuple] | None = None
+
+        connection = self._connect()
+        connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS holds (
+                title TEXT NOT NULL,
+                patron_id TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                PRIMARY KEY (title, patron_id)
+            );
+            CREATE TABLE IF NOT EXISTS loans (
+                patron_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                display_title TEXT NOT NULL,
+                due TEXT NOT NULL,
+                renewals INTEGER NOT NULL,
+                PRIMARY KEY (patron_id, title)
+            );
+            """
+        )
+        self._load(connection)
+        connection.close()
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        if loans_file is not None:
+            self.import_loans(loans_file)
+
+    def place_hold(self, patron_id: str, title: str, priority: int = 0) -> HoldResult:
+        """
+        Place a hold on a title for a patron.
+
+        Args:
+            patron_id (str): The identifier of the patron.
+            title (str): The title of the book.
+            priority (int): The priority of the hold. Lower values are served first.
+
+        Returns:
+            HoldResult: Whether the hold was placed, and the patron's position
+                in the queue. Placing a hold twice keeps the existing one.
+        """
+        with self._lock:
+            return self._place_hold(patron_id, title, priority)
+
+    def cancel_hold(self, patron_id: str, title: str) -> bool:
+        """
+        Cancel a patron's hold on a title.
+
+        Args:
+            patron_id (str): The identifier of the patron.
+            title (str): The title of the book.
+
+        Returns:
+            bool: True if the patron had a hold on the title.
+        """
+        key = normalize_title(title)
+        with self._lock:
+            holds = self._queues.get(key, [])
+            for i, hold in enumerate(holds):
+                if hold[2] == patron_id:
+                    holds[i] = holds[-1]
+                    holds.pop()
+                    heapq.heapify(holds)
+                    self._record(("unhold", key, patron_id))
+                    return True
+            return False
+
+    def checkout(self, patron_id: str, title: str) -> Loan:
+        """
+        Record a book as checked out by a patron.
+
+        A hold the patron had on the title is fulfilled by the checkout.
+
+        Args:
+            patron_id (str): The identifier of the patron.
+            title (str): The title of the book.
+
+        Returns:
+            Loan: The loan.
+        """
+        key = normalize_title(title)
+        loan = Loan(patron_id, title, date.today() + timedelta(days=LOAN_DAYS))
+        self.cancel_hold(patron_id, title)
+        with self._lock:
+            self._loans.setdefault(patron_id, {})[key] = loan
+            self._journal_loan(key, loan)
+        return loan
+
+    def import_loans(self, path: str) -> int:
+        """
+        Add the loans of a CSV file that aren't known yet.
+
+        Loans already known keep their due date and renewals, so importing
+        the same file on every start doesn't undo renewals.
+
+        Args:
+            path (str): The CSV file, with the columns patron_id, title, due
+                (YYYY-MM-DD) and optionally renewals.
+
+        Returns:
+            int: The number of loans added.
+        """
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+
+        added = 0
+        with self._lock:
+            for row in rows:
+                key = normalize_title(row["title"])
+                loans = self._loans.setdefault(row["patron_id"], {})
+                if key in loans:
+                    continue
+                loan = Loan(
+                    row["patron_id"],
+                    row["title"],
+                    date.fromisoformat(row["due"]),
+                    int(row.get("renewals") or 0),
+                )
+                loans[key] = loan
+                self._journal_loan(key, loan)
+                added += 1
+        return added
+
+    def return_book(self, patron_id: str, title: str) -> str | None:
+        """
+        Record a book as returned, and serve the next hold on it.
+
+        Args:
+            patron_id (str): The identifier of the patron.
+            title (str): The title of the book.
+
+        Returns:
+            str | None: The patron whose hold is now ready, if any.
+        """
+        key = normalize_title(title)
+        with self._lock:
+            if self._loans.get(patron_id, {}).pop(key, None) is not None:
+                self._record(("return", patron_id, key))
+
+            holds = self._queues.get(key)
+            if not holds:
+                return None
+            _, _, next_patron = heapq.heappop(holds)
+            self._record(("unhold", key, next_patron))
+            return next_patron
+
+    def renew(self, patron_id: str, title: str) -> RenewResult:
+        """
+        Renew a patron's loan of a title.
+
+        A loan can be renewed at most `MAX_RENEWALS` times, and not while
+        another patron has a hold on the title. While loans aren't tracked,
+        a loan the patron asks to renew is assumed, due today.
+
+        Args:
+            patron_id (str): The identifier of the patron.
+            title (str): The title of the book.
+
+        Returns:
+            RenewResult: Whether the loan was renewed, and its due date.
+        """
+        with self._lock:
+            return self._renew(patron_id, title)
+
+    def queue_length(self, title: str) -> int:
+        """
+        Return the number of holds queued on a title.
+
+        Args:
+            title (str): The title of the book.
+
+        Returns:
+            int: The number of holds.
+        """
+        return len(self._queues.get(normalize_title(title), []))
+
+    def loans(self, patron_id: str) -> list[Loan]:
+        """
+        Return the loans of a patron.
+
+        Args:
+            patron_id (str): The identifier of the patron.
+
+        Returns:
+            list[Loan]: The loans of the patron.
+        """
+        with self._lock:
+            return list(self._loans.get(patron_id, {}).values())
+
+    def bulk_place_holds(
+        self, holds: list[tuple[str, str, int]]
+    ) -> list[HoldResult]:
+        """
+        Place several holds atomically.
+
+        No other operation can interleave with the batch, and its changes are
+        committed to storage in a single transaction.
+
+        Args:
+            holds (list[tuple[str, str, int]]): The patron, title and priority
+                of each hold.
+
+        Returns:
+            list[HoldResult]: The outcome of each hold.
+        """
+        with self._lock:
+            self._batch = []
+            try:
+                results = [self._place_hold(*hold) for hold in holds]
+            finally:
+                self._journal.put(("batch", self._batch))
+                self._batch = None
+            return results
+
+    def bulk_renew(self, loans: list[tuple[str, str]]) -> list[RenewResult]:
+        """
+        Renew several loans atomically.
+
+        Args:
+            loans (list[tuple[str, str]]): The patron and title of each loan.
+
+        Returns:
+            list[RenewResult]: The outcome of each renewal.
+        """
+        with self._lock:
+            self._batch = []
+            try:
+                results = [self._renew(*loan) for loan in loans]
+            finally:
+                self._journal.put(("batch", self._batch))
+                self._batch = None
+            return results
+
+    def flush(self) -> None:
+        """
+        Wait until every change made so far is committed to storage.
+
+        Changes that fail to commit are retried, so this waits for storage
+        to recover.
+        """
+        self._journal.join()
+
+    def close(self) -> None:
+        """
+        Commit every pending change and stop the writer thread.
+
+        Changes that still fail to commit after `CLOSE_WRITE_ATTEMPTS` are
+        logged and given up.
+        """
+        self._journal.put(None)
+        self._writer.join()
+
+    def _place_hold(self, patron_id: str, title: str, priority: int) -> HoldResult:
+        key = normalize_title(title)
+        holds = self._queues.setdefault(key, [])
+        existing = next((hold for hold in holds if hold[2] == patron_id), None)
+        if existing is not None:
+            return HoldResult(placed=False, position=self._position(holds, existing))
+
+        hold = (priority, next(self._sequence), patron_id)
+        heapq.heappush(holds, hold)
+        self._record(("hold", key, patron_id, priority, hold[1]))
+        return HoldResult(placed=True, position=self._position(holds, hold))
+
+    def _renew(self, patron_id: str, title: str) -> RenewResult:
+        key = normalize_title(title)
+        loan = self._loans.get(patron_id, {}).get(key)
+        if loan is None and not self.tracks_loans:
+            loan = self._loans.setdefault(patron_id, {})[key] = Loan(
+                patron_id, title, date.today()
+            )
+        if loan is None:
+            return RenewResult(renewed=False, reason="not checked out")
+        if loan.renewals >= MAX_RENEWALS:
+            return RenewResult(
+                renewed=False, due=loan.due, reason="renewal limit reached"
+            )
+        if any(hold[2] != patron_id for hold in self._queues.get(key, [])):
+            return RenewResult(
+                renewed=False, due=loan.due, reason="another patron has a hold"
+            )
+
+        loan.due = date.today() + timedelta(days=LOAN_DAYS)
+        loan.renewals += 1
+        self._journal_loan(key, loan)
+        return RenewResult(renewed=True, due=loan.due)
+
+    def _record(self, entry: tuple) -> None:
+        if self._batch is not None:
+            self._batch.append(entry)
+        else:
+            self._journal.put(entry)
+
+    def _journal_loan(self, key: str, loan: Loan) -> None:
+        self._record(
+            (
+                "loan",
+                loan.patron_id,
+                key,
+                loan.title,
+                loan.due.isoformat(),
+                loan.renewals,
+            )
+        )
+
+    @staticmethod
+    def _position(holds: list[tuple[int, int, str]], hold: tuple[int, int, str]) -> int:
+        return 1 + sum(1 for other in holds if other < hold)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _load(self, connection: sqlite3.Connection) -> None:
+        last_seq = -1
+        for title, patron_id, priority, seq in connection.execute(
+            "SELECT title, patron_id, priority, seq FROM holds"
+        ):
+            self._queues.setdefault(title, []).append((priority, seq, patron_id))
+            last_seq = max(last_seq, seq)
+        for holds in self._queues.values():
+            heapq.heapify(holds)
+        self._sequence = count(last_seq + 1)
+
+        for patron_id, title, display_title, due, renewals in connection.execute(
+            "SELECT patron_id, title, display_title, due, renewals FROM loans"
+        ):
+            self._loans.setdefault(patron_id, {})[title] = Loan(
+                patron_id, display_title, date.fromisoformat(due), renewals
+            )
+
+    def _write_loop(self) -> None:
+        connection = self._connect()
+        # Changes stay pending until they are committed, a failed commit is
+        # retried together with the changes made in the meantime
+        pending: list[tuple | None] = []
+        failures = 0
+        while True:
+            # Block for the first change, then take everything already queued
+            if not pending:
+                pending.append(self._journal.get())
+            while True:
+                try:
+                    pending.append(self._journal.get_nowait())
+                except queue.Empty:
+                    break
+
+            closing = None in pending
+            changes = len(pending) - pending.count(None)
+            try:
+                connection.execute("BEGIN")
+                for entry in pending:
+                    if entry is not None:
+                        self._apply(connection, entry)
+                connection.execute("COMMIT")
+            except Exception:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                failures += 1
+                if not closing or failures < CLOSE_WRITE_ATTEMPTS:
+                    logger.exception(
+                        "Failed to journal %d holds changes, retrying", changes
+                    )
+                    time.sleep(min(30.0, 0.1 * 2**failures))
+                    continue
+                logger.exception("Lost %d holds changes on close", changes)
+
+            for _ in pending:
+                self._journal.task_done()
+            pending = []
+            failures = 0
+            if closing:
+                break
+        connection.close()
+
+    @classmethod
+    def _apply(cls, connection: sqlite3.Connection, entry: tuple) -> None:
+        match entry:
+            case ("batch", entries):
+                for batched in entries:
+                    cls._apply(connection, batched)
+            case ("hold", title, patron_id, priority, seq):
+                connection.execute(
+                    "INSERT OR REPLACE INTO holds VALUES (?, ?, ?, ?)",
+                    (title, patron_id, priority, seq),
+                )
+            case ("unhold", title, patron_id):
+                connection.execute(
+                    "DELETE FROM holds WHERE title = ? AND patron_id = ?",
+                    (title, patron_id),
+                )
+            case ("loan", patron_id, title, display_title, due, renewals):
+                connection.execute(
+                    "INSERT OR REPLACE INTO loans VALUES (?, ?, ?, ?, ?)",
+                    (patron_id, title, display_title, due, renewals),
+                )
+            case ("return", patron_id, title):
+                connection.execute(
+                    "DELETE FROM loans WHERE patron_id = ? AND title = ?",
+                    (patron_id, title),
+                )
+
+
+_engine: HoldsEngine | None = None
+
+
+def get_holds_engine() -> HoldsEngine:
+    """
+    Return the holds engine backed by `HOLDS_DB`, creating it on first use.
+
+    Returns:
+        HoldsEngine: The holds engine.
+    """
+    global _engine
+    if _engine is None:
+        _engine = HoldsEngine()
+        atexit.register(_engine.close)
+    return _engine
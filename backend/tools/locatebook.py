@@ -1,63 +1,192 @@
-import random
+from functools import lru_cache
+from typing import Any
+
+import numpy as np
 
 from backend.types import Location
+from backend.tools.catalog import get_catalog
 
 
 LOCATIONS: list[Location] = [
     Location(
         branch="Main Library",
         address="303 N. Laura St., Jacksonville, FL 32202",
+        latitude=30.33,
+        longitude=-81.661,
     ),
     Location(
         branch="Argyle Branch",
         address="7973 Old Middleburg Road S, Jacksonville, FL 32222",
+        latitude=30.2397,
+        longitude=-81.7733,
     ),
     Location(
         branch="Beaches Branch",
         address="600 3rd Street, Neptune Beach, FL 32266",
+        latitude=30.3113,
+        longitude=-81.397,
     ),
     Location(
         branch="Bill Brinton Murray Hill Branch",
         address="918 Edgewood Avenue South, Jacksonville, FL 32205",
+        latitude=30.3094,
+        longitude=-81.7199,
     ),
     Location(
         branch="Bradham and Brooks Branch",
         address="1755 Edgewood Avenue W, Jacksonville, FL 32208",
+        latitude=30.378,
+        longitude=-81.7198,
     ),
     Location(
         branch="Brentwood Branch",
         address="3725 Pearl Street, Jacksonville, FL 32206",
+        latitude=30.3645,
+        longitude=-81.6618,
     ),
     Location(
         branch="Brown Eastside Branch",
         address="1390 Harrison Street, Jacksonville, FL 32206",
+        latitude=30.3514,
+        longitude=-81.6404,
     ),
     Location(
         branch="Charles Webb Wesconnett Regional",
         address="6887 103rd Street, Jacksonville, FL 32210",
+        latitude=30.2472,
+        longitude=-81.7513,
     ),
     Location(
         branch="Dallas Graham Branch",
         address="2304 Myrtle Avenue N, Jacksonville, FL 32209",
+        latitude=30.3586,
+        longitude=-81.6797,
     ),
     Location(
         branch="Highlands Regional",
         address="1826 Dunn Avenue, Jacksonville, FL 32218",
+        latitude=30.4275,
+        longitude=-81.644,
     ),
 ]
 
 
-def locate_book(book_title: str) -> dict[str, str]:
+BRANCHES: dict[str, Location] = {location.branch: location for location in LOCATIONS}
+BRANCH_COORDINATES: np.ndarray = np.radians(
+    [[location.latitude, location.longitude] for location in LOCATIONS]
+)
+
+EARTH_RADIUS_KM: float = 6371.0
+# Users within the same cell of this size, in degrees (about 1 km), share a ranking.
+GRID_CELL_DEGREES: float = 0.01
+
+
+def haversine_km(latitude: float, longitude: float, points: np.ndarray) -> np.ndarray:
+    """
+    Compute the great-circle distance from a point to many points at once.
+
+    Args:
+        latitude (float): The latitude of the origin, in degrees.
+        longitude (float): The longitude of the origin, in degrees.
+        points (np.ndarray): An (n, 2) array of latitudes and longitudes, in radians.
+
+    Returns:
+        np.ndarray: The distance to each point, in kilometres.
+    """
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    half_dlat = (points[:, 0] - lat) / 2
+    half_dlon = (points[:, 1] - lon) / 2
+    a = (
+        np.sin(half_dlat) ** 2
+        + np.cos(lat) * np.cos(points[:, 0]) * np.sin(half_dlon) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+@lru_cache(maxsize=4096)
+def rank_branches(cell: tuple[int, int]) -> dict[str, tuple[int, float]]:
+    """
+    Rank every branch by its distance from the center of a grid cell.
+
+    Args:
+        cell (tuple[int, int]): The latitude and longitude indices of the cell.
+
+    Returns:
+        dict[str, tuple[int, float]]: The rank and distance, in kilometres,
+            of each branch, keyed by branch name.
+    """
+    distances = haversine_km(
+        (cell[0] + 0.5) * GRID_CELL_DEGREES,
+        (cell[1] + 0.5) * GRID_CELL_DEGREES,
+        BRANCH_COORDINATES,
+    )
+    return {
+        LOCATIONS[i].branch: (rank, round(float(distances[i]), 1))
+        for rank, i in enumerate(np.argsort(distances).tolist())
+    }
+
+
+def locate_book(
+    book_title: str, latitude: float | None = None, longitude: float | None = None
+) -> dict:
     """
     Locate a book in the library.
 
+    The title is looked up in the catalog, tolerating typos. If no title
+    matches, the closest titles are suggested instead.
+
     Args:
         book_title (str): The title of the book to locate.
+        latitude (float | None): The latitude of the user, in degrees.
+        longitude (float | None): The longitude of the user, in degrees.
 
     Returns:
-        dict[str, str]: A dictionary containing the branch and address of the
-            library where the book is located.
+        dict: A dictionary containing the matched title and, for each branch
+            holding it, the branch name, address and number of copies owned
+            and available. Branches with available copies are listed first,
+            nearest first if the user's location is given.
     """
-    location = random.choice(LOCATIONS).to_dict()
-    location.update({"book_title": book_title})
-    return location
+    index = get_catalog().index
+    title_id = index.lookup(book_title)
+
+    if title_id is None:
+        return {
+            "book_title": book_title,
+            "found": False,
+            "suggestions": [
+                index.titles[match]
+                for match, _ in index.search(book_title, min_score=0.3)
+            ],
+        }
+
+    ranking: dict[str, tuple[int, float]] = {}
+    if latitude is not None and longitude is not None:
+        ranking = rank_branches(
+            (
+                int(latitude // GRID_CELL_DEGREES),
+                int(longitude // GRID_CELL_DEGREES),
+            )
+        )
+
+    branches = []
+    for holding in index.holdings[title_id].values():
+        branch: dict[str, Any] = holding.to_dict()
+        if holding.branch in BRANCHES:
+            branch.update(BRANCHES[holding.branch].to_dict())
+        if holding.branch in ranking:
+            branch["distance_km"] = ranking[holding.branch][1]
+        branches.append(branch)
+
+    unranked = (len(LOCATIONS), 0.0)
+    branches.sort(
+        key=lambda branch: (
+            branch["available"] == 0,
+            ranking.get(branch["branch"], unranked)[0],
+        )
+    )
+
+    return {
+        "book_title": index.titles[title_id],
+        "found": True,
+        "branches": branches,
+    }
@@ -0,0 +1,377 @@
+"""
+Registry of the tools the agent can call.
+
+Regenerate `backend/orchestrator/tools.json` after changing a tool:
+    python -m backend.tools
+"""
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
+from os import getenv
+from typing import Any, Callable
+import asyncio
+import functools
+import inspect
+import json
+import logging
+
+from .bookadmin import place_on_hold, renew_book
+from .locatebook import locate_book
+from .searchdocs import search_documents
+
+
+logger = logging.getLogger(__name__)
+
+TOOLS_FILE: str = "backend/orchestrator/tools.json"
+TOOL_THREADS: int = int(getenv("TOOL_THREADS", "8"))
+TOOL_PROCESSES: int = int(getenv("TOOL_PROCESSES", "2"))
+
+# Values tools take from the conversation rather than from the model, such as
+# the patron a call is made for
+TOOL_CONTEXT: ContextVar[dict[str, Any]] = ContextVar("tool_context", default={})
+
+JSON_TYPES: dict[str, tuple[type, ...]] = {
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+}
+
+
+class ToolError(Exception):
+    """
+    Raised when a tool call cannot be completed. The message is meant for
+    the model, which can correct its call and try again.
+    """
+
+
+@dataclass
+class Parameter:
+    """
+    Represents a parameter of a tool.
+
+    Attributes:
+        name: The name of the parameter in the schema.
+        type: The JSON schema type of the parameter.
+        description: The description of the parameter given to the model.
+        required: Whether the model must pass the parameter.
+        argument: The name of the function argument it is passed as, if it
+            differs from `name`.
+    """
+
+    name: str
+    type: str
+    description: str
+    required: bool = True
+    argument: str | None = None
+
+
+@dataclass
+class Tool:
+    """
+    Represents a function the agent can call.
+
+    Attributes:
+        name: The name of the tool.
+        description: The description of the tool given to the model.
+        function: The function implementing the tool. Coroutine functions
+            are awaited on the event loop.
+        parameters: The parameters of the tool.
+        blocking: Whether the function may block, so it must run off the
+            event loop.
+        cpu_bound: Whether the function is CPU heavy, so it runs in a worker
+            process rather than a thread.
+        timeout: The time the function may take, in seconds.
+        context: The function arguments filled from `TOOL_CONTEXT` rather
+            than by the model. Results of such tools depend on who calls
+            them, so they must not be cached.
+    """
+
+    name: str
+    description: str
+    function: Callable[..., Any]
+    parameters: list[Parameter] = field(default_factory=list)
+    blocking: bool = True
+    cpu_bound: bool = False
+    timeout: float = 10.0
+    context: tuple[str, ...] = ()
+
+    def schema(self) -> dict:
+        """
+        Return the function tool definition of the tool for the Responses API.
+
+        Returns:
+            dict: The tool definition.
+        """
+        return {
+            "type": "function",
+            "name": self.name,
+            "description": self.description,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    parameter.name: {
+                        "type": parameter.type,
+                        "description": parameter.description,
+                    }
+                    for parameter in self.parameters
+                },
+                "required": [
+                    parameter.name
+                    for parameter in self.parameters
+                    if parameter.required
+                ],
+            },
+        }
+
+    def validate(self, arguments: dict) -> dict:
+        """
+        Check the arguments of a call and map them to function arguments.
+
+        Args:
+            arguments (dict): The arguments given by the model.
+
+        Returns:
+            dict: The keyword arguments of the function.
+
+        Raises:
+            ToolError: If an argument is unknown, missing or of the wrong type.
+        """
+        parameters = {parameter.name: parameter for parameter in self.parameters}
+        unknown = set(arguments) - set(parameters)
+        if unknown:
+            raise ToolError(f"{self.name} has no parameter {sorted(unknown)[0]!r}")
+
+        kwargs: dict = {}
+        for parameter in self.parameters:
+            value = arguments.get(parameter.name)
+            if value is None:
+                if parameter.required:
+                    raise ToolError(f"{self.name} requires {parameter.name!r}")
+                continue
+            expected = JSON_TYPES[parameter.type]
+            # bool is an int subclass, so only booleans accept it
+            if not isinstance(value, expected) or (
+                isinstance(value, bool) and parameter.type != "boolean"
+            ):
+                raise ToolError(
+                    f"{self.name} expects {parameter.name!r} to be a {parameter.type}"
+                )
+            kwargs[parameter.argument or parameter.name] = value
+        return kwargs
+
+
+class ToolRegistry:
+    """
+    The tools the agent can call, and the executors that run them.
+
+    Blocking tools run on a bounded thread pool, and CPU heavy tools on a
+    bounded process pool, so a slow tool never stalls the event loop. Every
+    call is bounded by the timeout of its tool.
+    """
+
+    tools: dict[str, Tool]
+
+    def __init__(self, threads: int = TOOL_THREADS, processes: int = TOOL_PROCESSES):
+        """
+        Args:
+            threads (int): The size of the thread pool.
+            processes (int): The size of the process pool, created on first use.
+        """
+        self.tools = {}
+        self._threads = ThreadPoolExecutor(threads, thread_name_prefix="tool")
+        self._processes: ProcessPoolExecutor | None = None
+        self._process_count = processes
+
+    def register(self, tool: Tool) -> Tool:
+        """
+        Add a tool to the registry.
+
+        Args:
+            tool (Tool): The tool.
+
+        Returns:
+            Tool: The tool.
+        """
+        self.tools[tool.name] = tool
+        return tool
+
+    def schemas(self, exclude: tuple[str, ...] = ()) -> list[dict]:
+        """
+        Return the definitions of the registered tools.
+
+        Args:
+            exclude (tuple[str, ...]): The names of tools to leave out.
+
+        Returns:
+            list[dict]: The function tool definitions, in registration order.
+        """
+        return [
+            tool.schema() for name, tool in self.tools.items() if name not in exclude
+        ]
+
+    async def run(self, name: str, arguments: dict) -> str:
+        """
+        Validate and execute a tool call.
+
+        Args:
+            name (str): The name of the tool.
+            arguments (dict): The arguments given by the model.
+
+        Returns:
+            str: The JSON encoded result of the tool.
+
+        Raises:
+            ToolError: If the tool doesn't exist, the arguments are invalid,
+                the tool times out or the tool fails.
+        """
+        tool = self.tools.get(name)
+        if tool is None:
+            raise ToolError(f"Function {name!r} not found")
+        kwargs = tool.validate(arguments)
+        context = TOOL_CONTEXT.get()
+        kwargs.update({key: context[key] for key in tool.context if key in context})
+
+        try:
+            if inspect.iscoroutinefunction(tool.function):
+                result = await asyncio.wait_for(tool.function(**kwargs), tool.timeout)
+            elif tool.blocking:
+                call = asyncio.get_running_loop().run_in_executor(
+                    self._executor(tool), functools.partial(tool.function, **kwargs)
+                )
+                result = await asyncio.wait_for(call, tool.timeout)
+            else:
+                result = tool.function(**kwargs)
+            return json.dumps(result)
+        except asyncio.TimeoutError:
+            # A worker can't be interrupted, it finishes in the background
+            raise ToolError(f"{name} timed out after {tool.timeout:g}s") from None
+        except ToolError:
+            raise
+        except Exception as e:
+            logger.exception("Tool %s failed", name)
+            raise ToolError(f"{name} failed: {e}") from e
+
+    def write_schemas(self, path: str = TOOLS_FILE) -> None:
+        """
+        Write the definitions of the registered tools to a JSON file.
+
+        Args:
+            path (str): The path of the file.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.schemas(), f, indent=4)
+            f.write("\n")
+
+    def close(self) -> None:
+        """
+        Shut down the worker pools, waiting for running calls.
+        """
+        self._threads.shutdown()
+        if self._processes is not None:
+            self._processes.shutdown()
+
+    def _executor(self, tool: Tool) -> Executor:
+        if not tool.cpu_bound:
+            return self._threads
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(self._process_count)
+        return self._processes
+
+
+BOOK_TITLE = Parameter("book_title", "string", "The title of the book.")
+
+
+def default_registry() -> ToolRegistry:
+    """
+    Return a registry of the library tools.
+
+    Returns:
+        ToolRegistry: The registry.
+    """
+    registry = ToolRegistry()
+    registry.register(
+        Tool(
+            name="place_on_hold",
+            description="Place a book on hold.",
+            function=place_on_hold,
+            parameters=[replace(BOOK_TITLE, argument="title")],
+            timeout=5.0,
+            context=("patron_id",),
+        )
+    )
+    registry.register(
+        Tool(
+            name="renew_book",
+            description="Renew a book.",
+            function=renew_book,
+            parameters=[replace(BOOK_TITLE, argument="title")],
+            timeout=5.0,
+            context=("patron_id",),
+        )
+    )
+    registry.register(
+        Tool(
+            name="locate_book",
+            description=(
+                "Locate the branches that hold a book and how many copies are "
+                "available for checkout. Tolerates misspelled titles."
+            ),
+            function=locate_book,
+            parameters=[
+                BOOK_TITLE,
+                Parameter(
+                    "latitude",
+                    "number",
+                    "The latitude of the user, to rank branches by distance.",
+                    required=False,
+                ),
+                Parameter(
+                    "longitude",
+                    "number",
+                    "The longitude of the user, to rank branches by distance.",
+                    required=False,
+                ),
+            ],
+            timeout=5.0,
+        )
+    )
+    registry.register(
+        Tool(
+            name="search_documents",
+            description=(
+                "Search the library's documents for passages relevant to a query."
+            ),
+            function=search_documents,
+            parameters=[
+                Parameter("query", "string", "The text to search for."),
+                Parameter(
+                    "limit",
+                    "integer",
+                    "The maximum number of passages to return.",
+                    required=False,
+                ),
+            ],
+            # Runs in a thread: NumPy releases the GIL while scoring, and a
+            # worker process would load its own copy of the index
+        )
+    )
+    return registry
+
+
+_registry: ToolRegistry | None = None
+
+
+def get_registry() -> ToolRegistry:
+    """
+    Return the registry of the library tools, creating it on first use.
+
+    Returns:
+        ToolRegistry: The registry.
+    """
+    global _registry
+    if _registry is None:
+        _registry = default_registry()
+    return _registry
+
@@ -1,7 +1,34 @@
 import json
 import os
 
+from backend.tools.favorites import JsonFavoritesStore, SqliteFavoritesStore
+
 FAVORITES_FILE = "user_favorites.json"
+FAVORITES_DB = os.getenv("FAVORITES_DB", "user_favorites.db")
+FAVORITES_BACKEND = os.getenv("FAVORITES_BACKEND", "sqlite")
+
+_store = None
+
+# Get the configured favorites backend.
+def get_store():
+    """
+    Return the favorites backend selected by the `FAVORITES_BACKEND` environment
+    variable ('sqlite' or 'json'), creating it on first use.
+
+    The SQLite backend imports the existing JSON file the first time it is opened.
+
+    Returns:
+        FavoritesStore: The favorites backend.
+    """
+    global _store
+    if _store is None:
+        json_store = JsonFavoritesStore(FAVORITES_FILE)
+        if FAVORITES_BACKEND == "json":
+            _store = json_store
+        else:
+            _store = SqliteFavoritesStore(FAVORITES_DB)
+            _store.migrate_from(json_store)
+    return _store
 
 # Load user favorites from a JSON file.
 def load_user_favorites():
@@ -12,13 +39,7 @@ def load_user_favorites():
         dict: A dictionary mapping user IDs to a list of favorite books.
               If the file doesn't exist or is invalid, returns an empty dictionary.
     """
-    if os.path.exists(FAVORITES_FILE):
-        with open(FAVORITES_FILE, "r") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-    return {}
+    return JsonFavoritesStore(FAVORITES_FILE).load()
 
 # Save the updated favorites to the JSON file.
 def save_user_favorites(favorites):
@@ -28,8 +49,7 @@ def save_user_favorites(favorites):
     Args:
         favorites (dict): A dictionary mapping user IDs to their list of favorite books.
     """
-    with open(FAVORITES_FILE, "w") as f:
-        json.dump(favorites, f, indent=4)
+    JsonFavoritesStore(FAVORITES_FILE).save(favorites)
 
 # Add a book to the user's favorites.
 def add_favorite(user_id, book):
@@ -53,32 +73,42 @@ def add_favorite(user_id, book):
     Returns:
         str: A message indicating whether the book was added or if it already exists.
     """
-    favorites = load_user_favorites()
-    if user_id not in favorites:
-        favorites[user_id] = []
-
-    # Check if the book already exists in the user's favorites.
-    if any(b["title"].lower() == book["title"].lower() and b["author"].lower() == book["author"].lower()
-           for b in favorites[user_id]):
+    # The backend skips books already in the user's favorites.
+    if not get_store().add(user_id, book):
         return "Book already in favorites."
 
-    favorites[user_id].append(book)
-    save_user_favorites(favorites)
     return "Book added to favorites."
 
-def get_user_favorites(user_id):
+# Add several books to the user's favorites.
+def add_favorites(user_id, books):
+    """
+    Add several books to the user's favorites in a single write.
+
+    Args:
+        user_id (str): The identifier for the user.
+        books (list): A list of dictionaries with the details of each book,
+                      as for `add_favorite`.
+
+    Returns:
+        int: The number of books added. Books already in favorites are skipped.
+    """
+    return get_store().add_many(user_id, books)
+
+def get_user_favorites(user_id, limit=None, offset=0):
     """
     Retrieve the list of saved books for a specified user.
 
     Args:
         user_id (str): The identifier for the user.
+        limit (int, optional): The maximum number of books to return.
+                               Returns all books if not given.
+        offset (int): The number of books to skip, for pagination.
 
     Returns:
         list: A list of dictionaries representing the user's favorite books.
               Returns an empty list if no books are saved.
     """
-    favorites = load_user_favorites()
-    return favorites.get(user_id, [])
+    return get_store().get(user_id, limit, offset)
 
 # Example usage:
 if __name__ == "__main__":
@@ -0,0 +1,17 @@
+from backend.retrieval import get_index
+
+
+def search_documents(query: str, limit: int = 5) -> list[dict]:
+    """
+    Search the local document index for passages relevant to a query.
+
+    Args:
+        query (str): The text to search for.
+        limit (int): The maximum number of passages to return.
+
+    Returns:
+        list[dict]: The best passages, best first, each with its source,
+            page, text and similarity score.
+    """
+    [results] = get_index().search([query], k=limit)
+    return [result.to_dict() for result in results]
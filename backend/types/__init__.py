@@ -1,3 +1,21 @@
-from .types import Message, Location
+from .types import (
+    Message,
+    HistoryRecord,
+    ChatMessage,
+    Location,
+    TextDelta,
+    ToolCallEvent,
+    ToolCallResult,
+    StreamEvent,
+)
 
-__all__ = ["Message", "Location"]
+__all__ = [
+    "Message",
+    "HistoryRecord",
+    "ChatMessage",
+    "Location",
+    "TextDelta",
+    "ToolCallEvent",
+    "ToolCallResult",
+    "StreamEvent",
+]
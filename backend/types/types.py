@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from datetime import datetime
+import sys
 
 
 @dataclass
@@ -26,6 +27,70 @@ class Message:
         return self.__str__()
 
 
+class HistoryRecord:
+    """
+    Represents a message held in a session's chat history.
+
+    Unlike Message, records use `__slots__`, intern their role and keep their
+    timestamp as a float, so long histories stay small in memory.
+
+    Attributes:
+        role: The role of the message sender ('user' or 'assistant').
+        content: The content of the message.
+        created: The POSIX timestamp of the message.
+    """
+
+    __slots__ = ("role", "content", "created")
+
+    role: str
+    content: str
+    created: float
+
+    def __init__(self, role: str, content: str, created: float):
+        self.role = sys.intern(role)
+        self.content = content
+        self.created = created
+
+    @classmethod
+    def from_message(cls, message: Message) -> "HistoryRecord":
+        """
+        Create a record from a message.
+
+        Args:
+            message (Message): The message to record.
+
+        Returns:
+            HistoryRecord: The record of the message.
+        """
+        return cls(message.role, message.content, message.timestamp.timestamp())
+
+    @property
+    def timestamp(self) -> datetime:
+        """
+        The timestamp of the message.
+        """
+        return datetime.fromtimestamp(self.created)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The approximate memory held by the record.
+        """
+        return sys.getsizeof(self) + sys.getsizeof(self.content)
+
+    def to_message(self) -> Message:
+        """
+        Returns the message this record represents.
+
+        Returns:
+            Message: The message.
+        """
+        return Message(role=self.role, content=self.content, timestamp=self.timestamp)
+
+
+ChatMessage = Message | HistoryRecord
+
+
 @dataclass
 class Location:
     """
@@ -34,16 +99,77 @@ class Location:
     Attributes:
         branch: The name of the library branch.
         address: The address of the library branch.
+        latitude: The latitude of the library branch, in degrees.
+        longitude: The longitude of the library branch, in degrees.
     """
 
     branch: str
     address: str
+    latitude: float
+    longitude: float
 
-    def to_dict(self) -> dict[str, str]:
+    def to_dict(self) -> dict[str, str | float]:
         """
         Returns a dictionary representation of the location.
 
         Returns:
-            dict[str, str]: A dictionary containing the branch name and address.
+            dict[str, str | float]: A dictionary containing the branch name,
+                address and coordinates.
         """
-        return {"branch": self.branch, "address": self.address}
+        return {
+            "branch": self.branch,
+            "address": self.address,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+        }
+
+
+@dataclass
+class TextDelta:
+    """
+    Represents a chunk of text streamed from the agent.
+
+    Attributes:
+        delta: The text fragment appended to the response.
+    """
+
+    delta: str
+
+
+@dataclass
+class ToolCallEvent:
+    """
+    Represents a tool call requested by the agent during a streamed turn.
+
+    Attributes:
+        name: The name of the tool being called.
+        arguments: The JSON encoded arguments of the call.
+        call_id: The identifier linking the call to its output.
+    """
+
+    name: str
+    arguments: str
+    call_id: str
+
+
+@dataclass
+class ToolCallResult:
+    """
+    Represents the outcome of a tool call executed by the orchestrator.
+
+    Attributes:
+        name: The name of the tool that was called.
+        arguments: The JSON encoded arguments of the call.
+        call_id: The identifier linking the call to its output.
+        output: The serialized output returned to the model.
+        duration: The wall-clock execution time of the call, in seconds.
+    """
+
+    name: str
+    arguments: str
+    call_id: str
+    output: str
+    duration: float
+
+
+StreamEvent = TextDelta | ToolCallEvent | ToolCallResult | Message
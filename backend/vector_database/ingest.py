@@ -0,0 +1,300 @@
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Awaitable, Callable, TypeVar
+import asyncio
+import json
+import os
+import random
+
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    RateLimitError,
+)
+
+from backend.client import RETRY_BUDGET, RetryBudget
+
+
+T = TypeVar("T")
+
+RETRYABLE_ERRORS: tuple[type[Exception], ...] = (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+
+
+@dataclass
+class IngestReport:
+    """
+    Represents the progress of an ingestion run.
+
+    Attributes:
+        total: The number of files to ingest.
+        uploaded: The number of files uploaded in this run.
+        attached: The number of files attached to the vector store in this run.
+        skipped: The number of files already ingested by an earlier run.
+        failed: The paths of the files that could not be ingested.
+        bytes_uploaded: The number of bytes uploaded in this run.
+        started_at: The time the run started.
+    """
+
+    total: int = 0
+    uploaded: int = 0
+    attached: int = 0
+    skipped: int = 0
+    failed: list[str] = field(default_factory=list)
+    bytes_uploaded: int = 0
+    started_at: float = field(default_factory=perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        """
+        The time since the run started, in seconds.
+        """
+        return perf_counter() - self.started_at
+
+    def __str__(self) -> str:
+        elapsed = max(self.elapsed, 1e-9)
+        return (
+            f"{self.uploaded + self.skipped}/{self.total} uploaded, "
+            f"{self.attached} attached, {len(self.failed)} failed | "
+            f"{self.uploaded / elapsed:.1f} files/s, "
+            f"{self.bytes_uploaded / elapsed / 1e6:.2f} MB/s"
+        )
+
+
+class IngestCheckpoint:
+    """
+    Records which files were uploaded and attached, so a run can resume.
+
+    The checkpoint is a JSON file mapping each path to its uploaded file id
+    and whether that file is attached to the vector store yet.
+    """
+
+    path: str
+    files: dict[str, dict]
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.files = json.load(f)
+
+    def uploaded(self, path: str, file_id: str) -> None:
+        """
+        Record a file as uploaded.
+
+        Args:
+            path (str): The path of the file.
+            file_id (str): The id of the uploaded file.
+        """
+        self.files[path] = {"file_id": file_id, "attached": False}
+
+    def attached(self, paths: list[str]) -> None:
+        """
+        Record files as attached to the vector store.
+
+        Args:
+            paths (list[str]): The paths of the files.
+        """
+        for path in paths:
+            self.files[path]["attached"] = True
+
+    def save(self) -> None:
+        """
+        Write the checkpoint to disk atomically.
+        """
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.files, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+async def with_retry(
+    operation: Callable[[], Awaitable[T]],
+    budget: RetryBudget = RETRY_BUDGET,
+    attempts: int = 5,
+    base_delay: float = 0.5,
+    max_delay: float = 30.0,
+) -> T:
+    """
+    Run an API operation, retrying transient failures with backoff.
+
+    The delay before each retry is drawn uniformly up to an exponentially
+    growing cap ("full jitter"), so concurrent uploads don't retry in step.
+    Requests made through `get_client` are already retried by its transport,
+    so these retries come out of the same shared budget: once it is spent,
+    the failure is raised instead of multiplying the attempts.
+
+    Args:
+        operation (Callable[[], Awaitable[T]]): Starts the operation.
+        budget (RetryBudget): The budget every retry is taken from.
+        attempts (int): The maximum number of attempts.
+        base_delay (float): The cap on the first delay, in seconds.
+        max_delay (float): The cap on any delay, in seconds.
+
+    Returns:
+        T: The result of the operation.
+    """
+    budget.deposit()
+    for attempt in range(attempts):
+        try:
+            return await operation()
+        except RETRYABLE_ERRORS:
+            if attempt == attempts - 1 or not budget.withdraw():
+                raise
+            delay = min(max_delay, base_delay * 2**attempt)
+            await asyncio.sleep(random.uniform(0, delay))
+    raise AssertionError("unreachable")
+
+
+def list_pdfs(folder: str) -> list[str]:
+    """
+    List the PDF files in a folder.
+
+    Args:
+        folder (str): The folder to scan.
+
+    Returns:
+        list[str]: The paths of the PDF files, sorted.
+    """
+    return sorted(
+        entry.path
+        for entry in os.scandir(folder)
+        if entry.is_file() and entry.name.lower().endswith(".pdf")
+    )
+
+
+async def ingest_files(
+    client: AsyncOpenAI,
+    vector_store_id: str,
+    paths: list[str],
+    checkpoint: IngestCheckpoint,
+    concurrency: int = 8,
+    batch_size: int = 100,
+    on_progress: Callable[[IngestReport], None] = print,
+) -> IngestReport:
+    """
+    Upload files and attach them to a vector store.
+
+    Up to `concurrency` files are uploaded at once. Uploaded files are
+    attached in file batches of up to `batch_size`, while later uploads are
+    still in progress. Files the checkpoint records as done are skipped, and
+    files uploaded but not yet attached by an interrupted run are attached
+    without uploading them again. Files the vector store fails to process
+    are reported as failed and left unattached, so the next run retries
+    them. The checkpoint is saved with every batch, so an interruption
+    re-uploads at most one batch worth of files.
+
+    Args:
+        client (AsyncOpenAI): The OpenAI client, or a stand-in with the same
+            `files` and `vector_stores.file_batches` interface.
+        vector_store_id (str): The ID of the target vector store.
+        paths (list[str]): The paths of the files to ingest.
+        checkpoint (IngestCheckpoint): The record of files already ingested.
+        concurrency (int): The maximum number of concurrent uploads.
+        batch_size (int): The maximum number of files attached per batch.
+        on_progress (Callable[[IngestReport], None]): Called with the report
+            after every attached batch.
+
+    Returns:
+        IngestReport: The outcome of the run.
+    """
+    report = IngestReport(total=len(paths))
+    semaphore = asyncio.Semaphore(concurrency)
+    ready: list[str] = []
+    attaching: set[asyncio.Task] = set()
+
+    async def attach(batch: list[str]) -> None:
+        paths = {checkpoint.files[path]["file_id"]: path for path in batch}
+        try:
+            file_batch = await with_retry(
+                lambda: client.vector_stores.file_batches.create_and_poll(
+                    vector_store_id=vector_store_id, file_ids=list(paths)
+                )
+            )
+            if file_batch.status == "completed" and not file_batch.file_counts.failed:
+                attached = batch
+            else:
+                # Only the files processed successfully are searchable, the
+                # others stay unattached in the checkpoint and are retried
+                completed = client.vector_stores.file_batches.list_files(
+                    file_batch.id, vector_store_id=vector_store_id, filter="completed"
+                )
+                attached = [
+                    paths[file.id] async for file in completed if file.id in paths
+                ]
+        except Exception as e:
+            print(f"❌ Failed to attach {len(batch)} files: {e}")
+            report.failed.extend(batch)
+            return
+        if len(attached) < len(batch):
+            print(f"❌ {len(batch) - len(attached)} files failed to process")
+            report.failed.extend(sorted(set(batch) - set(attached)))
+        checkpoint.attached(attached)
+        checkpoint.save()
+        report.attached += len(attached)
+        on_progress(report)
+
+    def queue_attach(flush: bool = False) -> None:
+        while len(ready) >= batch_size or (flush and ready):
+            batch = ready[:batch_size]
+            del ready[:batch_size]
+            task = asyncio.create_task(attach(batch))
+            attaching.add(task)
+            task.add_done_callback(attaching.discard)
+
+    async def upload(path: str) -> None:
+        async with semaphore:
+            try:
+                content = await asyncio.to_thread(read_file, path)
+                uploaded = await with_retry(
+                    lambda: client.files.create(
+                        file=(os.path.basename(path), content), purpose="assistants"
+                    )
+                )
+            except Exception as e:
+                print(f"❌ Failed to upload {path}: {e}")
+                report.failed.append(path)
+                return
+        checkpoint.uploaded(path, uploaded.id)
+        report.uploaded += 1
+        report.bytes_uploaded += len(content)
+        ready.append(path)
+        queue_attach()
+
+    uploads: list[str] = []
+    for path in paths:
+        entry = checkpoint.files.get(path)
+        if entry is None:
+            uploads.append(path)
+        elif entry["attached"]:
+            report.skipped += 1
+        else:
+            report.skipped += 1
+            ready.append(path)
+
+    queue_attach()
+    await asyncio.gather(*(upload(path) for path in uploads))
+    queue_attach(flush=True)
+    await asyncio.gather(*attaching)
+    checkpoint.save()
+    return report
+
+
+def read_file(path: str) -> bytes:
+    """
+    Read the contents of a file.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        bytes: The contents of the file.
+    """
+    with open(path, "rb") as f:
+        return f.read()
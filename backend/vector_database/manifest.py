@@ -0,0 +1,367 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from hashlib import sha256
+import asyncio
+import os
+import sqlite3
+
+from openai import AsyncOpenAI, NotFoundError
+from openai.types import FileObject
+
+from backend.vector_database.ingest import (
+    IngestCheckpoint,
+    ingest_files,
+    list_pdfs,
+    with_retry,
+)
+
+
+@dataclass
+class ManifestEntry:
+    """
+    Represents a local file synced to the vector store.
+
+    Attributes:
+        path: The path of the file.
+        size: The size of the file, in bytes.
+        mtime_ns: The modification time of the file, in nanoseconds.
+        content_hash: The SHA-256 digest of the file contents.
+        file_id: The id of the uploaded file.
+    """
+
+    path: str
+    size: int
+    mtime_ns: int
+    content_hash: str
+    file_id: str
+
+
+@dataclass
+class SyncPlan:
+    """
+    Represents the changes needed to bring the vector store in sync.
+
+    Attributes:
+        added: The paths of files not uploaded yet.
+        changed: The paths of files whose contents changed since upload.
+        removed: The paths of uploaded files that no longer exist.
+        unchanged: The number of files already in sync.
+        hashes: The content hash of every added or changed file.
+        stats: The size and modification time of every added or changed
+            file when it was hashed.
+    """
+
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unchanged: int = 0
+    hashes: dict[str, str] = field(default_factory=dict)
+    stats: dict[str, tuple[int, int]] = field(default_factory=dict)
+
+    def __str__(self) -> str:
+        lines = [f"+ {path}" for path in self.added]
+        lines += [f"~ {path}" for path in self.changed]
+        lines += [f"- {path}" for path in self.removed]
+        lines.append(
+            f"{len(self.added)} to add, {len(self.changed)} to replace, "
+            f"{len(self.removed)} to remove, {self.unchanged} unchanged"
+        )
+        return "\n".join(lines)
+
+
+def hash_file(path: str) -> str:
+    """
+    Return the SHA-256 digest of a file's contents.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Local record of the files synced to a vector store, kept in SQLite.
+
+    A file whose size and modification time match its entry is assumed
+    unchanged without being read, so a sync only hashes files that were
+    touched since the last one.
+    """
+
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS manifest (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    synced_at TEXT NOT NULL
+                )
+                """
+            )
+
+    def entries(self) -> dict[str, ManifestEntry]:
+        """
+        Return every entry of the manifest.
+
+        Returns:
+            dict[str, ManifestEntry]: The entries, keyed by path.
+        """
+        rows = self._connection.execute(
+            "SELECT path, size, mtime_ns, content_hash, file_id FROM manifest"
+        )
+        return {row[0]: ManifestEntry(*row) for row in rows}
+
+    def record(self, entry: ManifestEntry) -> None:
+        """
+        Add or replace the entry of a file.
+
+        Args:
+            entry (ManifestEntry): The entry.
+        """
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    entry.path,
+                    entry.size,
+                    entry.mtime_ns,
+                    entry.content_hash,
+                    entry.file_id,
+                    datetime.now().isoformat(),
+                ),
+            )
+
+    def forget(self, paths: list[str]) -> None:
+        """
+        Remove the entries of files.
+
+        Args:
+            paths (list[str]): The paths of the files.
+        """
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM manifest WHERE path = ?", [(path,) for path in paths]
+            )
+
+    def plan(self, paths: list[str]) -> SyncPlan:
+        """
+        Compare local files with the manifest.
+
+        Args:
+            paths (list[str]): The paths of the local files.
+
+        Returns:
+            SyncPlan: The files to add, replace and remove.
+        """
+        entries = self.entries()
+        plan = SyncPlan(removed=sorted(set(entries) - set(paths)))
+
+        for path in paths:
+            stat = os.stat(path)
+            entry = entries.get(path)
+            if (
+                entry is not None
+                and entry.size == stat.st_size
+                and entry.mtime_ns == stat.st_mtime_ns
+            ):
+                plan.unchanged += 1
+                continue
+
+            content_hash = hash_file(path)
+            if entry is None:
+                plan.added.append(path)
+            elif entry.content_hash != content_hash:
+                plan.changed.append(path)
+            else:
+                # Touched but identical, only the modification time is stale
+                entry.size, entry.mtime_ns = stat.st_size, stat.st_mtime_ns
+                self.record(entry)
+                plan.unchanged += 1
+                continue
+            plan.hashes[path] = content_hash
+            plan.stats[path] = (stat.st_size, stat.st_mtime_ns)
+
+        return plan
+
+    async def reconcile(
+        self, client: AsyncOpenAI, vector_store_id: str, paths: list[str]
+    ) -> tuple[int, int]:
+        """
+        Check the manifest against the files in the vector store.
+
+        Entries whose file is no longer in the vector store are dropped, and
+        local files without an entry adopt the file of the same name already
+        in the vector store, so they aren't uploaded again. An adopted file
+        whose size differs from its local copy is replaced by the next sync.
+
+        This lists every page of the vector store and of file storage, so it
+        is only needed when the manifest is new or the store may have been
+        changed outside of syncs.
+
+        Args:
+            client (AsyncOpenAI): The OpenAI client.
+            vector_store_id (str): The ID of the vector store.
+            paths (list[str]): The paths of the local files.
+
+        Returns:
+            tuple[int, int]: The number of entries dropped, whose files are
+                uploaded again by the next sync, and the number of files adopted.
+        """
+        remote_ids: set[str] = set()
+        async for item in client.vector_stores.files.list(
+            vector_store_id=vector_store_id, limit=100
+        ):
+            remote_ids.add(item.id)
+
+        entries = self.entries()
+        stale = [
+            path for path, entry in entries.items() if entry.file_id not in remote_ids
+        ]
+        self.forget(stale)
+
+        # Vector store files don't carry their name, the files they were made from do
+        unclaimed = remote_ids - {entry.file_id for entry in entries.values()}
+        remote_files: dict[str, FileObject] = {}
+        if unclaimed:
+            async for file in client.files.list(purpose="assistants", limit=10000):
+                if file.id in unclaimed:
+                    remote_files.setdefault(file.filename, file)
+
+        adopted = 0
+        for path in paths:
+            remote = remote_files.get(os.path.basename(path))
+            if path in entries or remote is None:
+                continue
+            stat = os.stat(path)
+            content_hash = await asyncio.to_thread(hash_file, path)
+            if remote.bytes != stat.st_size:
+                # Left for the next sync to replace with the local copy
+                content_hash = ""
+            self.record(
+                ManifestEntry(
+                    path, remote.bytes, stat.st_mtime_ns, content_hash, remote.id
+                )
+            )
+            adopted += 1
+        return len(stale), adopted
+
+async def delete_remote_file(
+    client: AsyncOpenAI, vector_store_id: str, file_id: str
+) -> None:
+    """
+    Remove a file from a vector store and from file storage.
+
+    A file already gone from either, as after an interrupted sync, counts as
+    removed from it.
+
+    Args:
+        client (AsyncOpenAI): The OpenAI client.
+        vector_store_id (str): The ID of the vector store.
+        file_id (str): The id of the file.
+    """
+    try:
+        await with_retry(
+            lambda: client.vector_stores.files.delete(
+                vector_store_id=vector_store_id, file_id=file_id
+            )
+        )
+    except NotFoundError:
+        pass
+    try:
+        await with_retry(lambda: client.files.delete(file_id=file_id))
+    except NotFoundError:
+        pass
+
+
+async def sync_folder(
+    client: AsyncOpenAI,
+    vector_store_id: str,
+    folder: str,
+    manifest: Manifest,
+    dry_run: bool = False,
+    reconcile: bool = False,
+    concurrency: int = 8,
+) -> SyncPlan:
+    """
+    Bring a vector store in sync with the PDF files in a folder.
+
+    New files are uploaded, changed files are uploaded again and their old
+    copies deleted, and the copies of deleted files are removed. The cost of
+    a sync grows with the number of changed files, not the size of the store.
+
+    Args:
+        client (AsyncOpenAI): The OpenAI client.
+        vector_store_id (str): The ID of the vector store.
+        folder (str): The folder containing the PDF files.
+        manifest (Manifest): The record of files already synced.
+        dry_run (bool): If True, only compute and print the changes.
+        reconcile (bool): If True, first check the manifest against a full
+            listing of the vector store. This is always done while the
+            manifest is empty, so a first sync adopts the files already in
+            the vector store instead of uploading them again.
+        concurrency (int): The maximum number of concurrent uploads.
+
+    Returns:
+        SyncPlan: The changes that were, or would be, made.
+    """
+    paths = list_pdfs(folder)
+    if reconcile or not manifest.entries():
+        dropped, adopted = await manifest.reconcile(client, vector_store_id, paths)
+        print(
+            f"🔎 {dropped} manifest entries no longer in the vector store, "
+            f"{adopted} files already in it."
+        )
+
+    plan = await asyncio.to_thread(manifest.plan, paths)
+    print(plan)
+    if dry_run:
+        return plan
+
+    entries = manifest.entries()
+    uploads = plan.added + plan.changed
+    checkpoint = IngestCheckpoint(f"{manifest.path}.checkpoint.json")
+    report = await ingest_files(
+        client,
+        vector_store_id,
+        uploads,
+        checkpoint,
+        concurrency=concurrency,
+        on_progress=lambda report: print(f"⬆️ {report}"),
+    )
+
+    for path in uploads:
+        uploaded = checkpoint.files.get(path)
+        if uploaded is None or not uploaded["attached"]:
+            continue
+        if path in entries and entries[path].file_id != uploaded["file_id"]:
+            await delete_remote_file(client, vector_store_id, entries[path].file_id)
+        # The hash is of the file as it was planned, so is the recorded stat:
+        # a file modified since then is hashed again by the next sync
+        size, mtime_ns = plan.stats[path]
+        manifest.record(
+            ManifestEntry(path, size, mtime_ns, plan.hashes[path], uploaded["file_id"])
+        )
+        del checkpoint.files[path]
+    checkpoint.save()
+
+    for path in plan.removed:
+        await delete_remote_file(client, vector_store_id, entries[path].file_id)
+    manifest.forget(plan.removed)
+
+    print(f"✅ {report}")
+    return plan
@@ -2,14 +2,18 @@ import asyncio
 import os
 import dotenv
 
-from openai import AsyncOpenAI
 from openai.helpers import LocalAudioPlayer
 
+from backend.client import get_client
+from backend.orchestrator.audio_cache import AudioCache
+from backend.orchestrator.speech import synthesize
+
 dotenv.load_dotenv()
 
 api_key = os.getenv("OPENAI_API_KEY")
 
-openai = AsyncOpenAI()
+openai = get_client("chat")
+audio_cache = AudioCache()
 
 async def main() -> None:
     # Get user prompt
@@ -28,14 +32,8 @@ async def main() -> None:
     print(f"Assistant: {ai_response}")
 
     # Speak the AI response
-    async with openai.audio.speech.with_streaming_response.create(
-        model="gpt-4o-mini-tts",
-        voice="onyx",
-        input=ai_response,
-        instructions="Speak in a calming professional tone.",
-        response_format="pcm",
-    ) as response:
-        await LocalAudioPlayer().play(response)
+    audio = await synthesize(get_client("tts"), ai_response, audio_cache)
+    await LocalAudioPlayer().play(audio)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,128 @@
+"""
+Benchmark of the shared OpenAI client against a fault-injecting mock server.
+
+Sends model requests through `get_client` while the mock fails and stalls a
+share of them, with and without hedging, and reports the share of requests
+that succeeded, latency percentiles, and the retries and hedges spent.
+
+Usage:
+    python -m benchmarks.bench_client --requests 500 --error-rate 0.1 --stall-rate 0.05
+"""
+
+from argparse import ArgumentParser
+from time import perf_counter
+import asyncio
+import json
+import os
+
+from benchmarks.bench_turns import summarize
+from benchmarks.mock_openai import MockConfig, MockServer
+
+
+async def run_requests(requests: int, concurrency: int, hedge_percentile: float) -> dict:
+    """
+    Send model requests through the shared client.
+
+    Args:
+        requests (int): The number of requests.
+        concurrency (int): The maximum number of requests in flight.
+        hedge_percentile (float): The latency percentile after which a request
+            is hedged, or 0 to never hedge.
+
+    Returns:
+        dict: The outcome of the requests.
+    """
+    from backend.client import RETRY_BUDGET, LatencyWindow, get_client, hedged
+    from backend.client.resilience import HEDGES, HEDGE_WINS
+
+    client = get_client("chat")
+    latencies = LatencyWindow()
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: list[float] = []
+    errors: dict[str, int] = {}
+    before = RETRY_BUDGET.stats()
+    hedges_before, wins_before = HEDGES.value(), HEDGE_WINS.value()
+
+    def create():
+        return client.responses.create(model="mock", input="Where can I find Dune?")
+
+    async def send() -> None:
+        async with semaphore:
+            start = perf_counter()
+            try:
+                if hedge_percentile:
+                    await hedged(create, latencies, hedge_percentile, RETRY_BUDGET)
+                else:
+                    await create()
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                return
+            samples.append(perf_counter() - start)
+
+    await asyncio.gather(*(send() for _ in range(requests)))
+    after = RETRY_BUDGET.stats()
+    return {
+        "success_rate": len(samples) / requests,
+        "errors": errors,
+        **(summarize(samples) if samples else {}),
+        "retries": after["retries"] - before["retries"],
+        "retries_denied": after["denied"] - before["denied"],
+        "hedges": HEDGES.value() - hedges_before,
+        "hedge_wins": HEDGE_WINS.value() - wins_before,
+    }
+
+
+async def main(args) -> dict:
+    """
+    Run the benchmark.
+
+    Args:
+        args (Namespace): The parsed arguments.
+
+    Returns:
+        dict: The measurements.
+    """
+    config = MockConfig(
+        first_token_latency=args.first_token_latency,
+        error_rate=args.error_rate,
+        stall_rate=args.stall_rate,
+        stall_latency=args.stall_latency,
+        seed=0,
+    )
+    report: dict = {
+        "requests": args.requests,
+        "error_rate": args.error_rate,
+        "stall_rate": args.stall_rate,
+        "scenarios": {},
+    }
+    with MockServer(config) as server:
+        os.environ["OPENAI_BASE_URL"] = server.url
+        report["scenarios"]["no_hedging"] = await run_requests(
+            args.requests, args.concurrency, 0
+        )
+        report["scenarios"][f"hedged_p{args.hedge_percentile:g}"] = await run_requests(
+            args.requests, args.concurrency, args.hedge_percentile
+        )
+    return report
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--first-token-latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--stall-rate", type=float, default=0.05)
+    parser.add_argument("--stall-latency", type=float, default=2.0)
+    parser.add_argument("--hedge-percentile", type=float, default=95)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    # Never reach the real API
+    os.environ["OPENAI_API_KEY"] = "mock"
+
+    report = asyncio.run(main(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,139 @@
+"""
+Microbenchmark of the holds engine under concurrent async chat sessions.
+
+Every session places holds and renews loans in a loop, directly on the event
+loop, while a ticker measures how late the loop wakes it up.
+
+Usage:
+    python -m benchmarks.bench_holds --sessions 200 --operations 50
+"""
+
+from argparse import ArgumentParser
+from time import perf_counter
+import asyncio
+import json
+import os
+import random
+import tempfile
+
+from backend.tools.holds import HoldsEngine
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """
+    Return a percentile of a list of samples.
+
+    Args:
+        samples (list[float]): The samples.
+        q (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The sample at the percentile.
+    """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+async def measure_loop_lag(lags: list[float], stop: asyncio.Event) -> None:
+    """
+    Record how late the event loop runs a task scheduled every millisecond.
+
+    Args:
+        lags (list[float]): The list to record each delay into, in seconds.
+        stop (asyncio.Event): Set to end the measurement.
+    """
+    while not stop.is_set():
+        start = perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(perf_counter() - start - 0.001)
+
+
+async def run_session(
+    engine: HoldsEngine, patron_id: str, titles: list[str], operations: int
+) -> list[float]:
+    """
+    Run the operations of one chat session.
+
+    Args:
+        engine (HoldsEngine): The engine under test.
+        patron_id (str): The patron of the session.
+        titles (list[str]): The titles to operate on.
+        operations (int): The number of operations to run.
+
+    Returns:
+        list[float]: The latency of each operation, in seconds.
+    """
+    latencies: list[float] = []
+    for _ in range(operations):
+        title = random.choice(titles)
+        start = perf_counter()
+        if random.random() < 0.5:
+            engine.place_hold(patron_id, title)
+        else:
+            engine.renew(patron_id, title)
+        latencies.append(perf_counter() - start)
+        await asyncio.sleep(0)  # Yield like a chat turn would between calls
+    return latencies
+
+
+async def main(sessions: int, operations: int, titles: int) -> dict[str, float]:
+    """
+    Run the benchmark.
+
+    Args:
+        sessions (int): The number of concurrent sessions.
+        operations (int): The number of operations per session.
+        titles (int): The number of distinct titles.
+
+    Returns:
+        dict[str, float]: The throughput, operation latencies, event loop lag
+            and time to commit every change to storage.
+    """
+    catalog = [f"Title {i}" for i in range(titles)]
+    with tempfile.TemporaryDirectory() as directory:
+        engine = HoldsEngine(os.path.join(directory, "holds.db"))
+        for i in range(sessions):
+            for title in random.sample(catalog, min(3, titles)):
+                engine.checkout(f"patron-{i}", title)
+        engine.flush()
+
+        lags: list[float] = []
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(measure_loop_lag(lags, stop))
+
+        start = perf_counter()
+        results = await asyncio.gather(
+            *(
+                run_session(engine, f"patron-{i}", catalog, operations)
+                for i in range(sessions)
+            )
+        )
+        elapsed = perf_counter() - start
+
+        flush_start = perf_counter()
+        await asyncio.to_thread(engine.flush)
+        flush_time = perf_counter() - flush_start
+
+        stop.set()
+        await ticker
+        engine.close()
+
+    latencies = [latency for result in results for latency in result]
+    return {
+        "operations": len(latencies),
+        "ops_per_second": len(latencies) / elapsed,
+        "latency_p50_us": percentile(latencies, 50) * 1e6,
+        "latency_p99_us": percentile(latencies, 99) * 1e6,
+        "loop_lag_p99_ms": percentile(lags, 99) * 1e3 if lags else 0.0,
+        "flush_ms": flush_time * 1e3,
+    }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--operations", type=int, default=50)
+    parser.add_argument("--titles", type=int, default=500)
+    args = parser.parse_args()
+    report = asyncio.run(main(args.sessions, args.operations, args.titles))
+    print(json.dumps(report, indent=2))
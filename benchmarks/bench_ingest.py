@@ -0,0 +1,157 @@
+"""
+Benchmark of the vector store ingestion pipeline against a local stand-in.
+
+The stand-in mimics the `files.create` and `vector_stores.file_batches`
+endpoints with configurable latency and a rate of transient failures, so
+throughput, retries and resume after an interruption can be measured
+without uploading anything.
+
+Usage:
+    python -m benchmarks.bench_ingest --files 2000 --concurrency 16
+"""
+
+from argparse import ArgumentParser
+from itertools import count
+from types import SimpleNamespace
+import asyncio
+import json
+import os
+import random
+import tempfile
+
+import httpx
+from openai import APIConnectionError
+
+from backend.vector_database.ingest import IngestCheckpoint, ingest_files, list_pdfs
+
+
+class LocalFilesAPI:
+    """
+    In-process stand-in for the files and vector store batch endpoints.
+    """
+
+    def __init__(self, latency: float, failure_rate: float):
+        """
+        Args:
+            latency (float): The mean latency of each request, in seconds.
+            failure_rate (float): The probability of a request failing.
+        """
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.uploads = 0
+        self.failures = 0
+        self.attached: set[str] = set()
+        self._ids = count()
+        self.files = SimpleNamespace(create=self.create_file)
+        self.vector_stores = SimpleNamespace(
+            file_batches=SimpleNamespace(create_and_poll=self.create_batch)
+        )
+
+    async def _request(self) -> None:
+        await asyncio.sleep(random.expovariate(1 / self.latency))
+        if random.random() < self.failure_rate:
+            self.failures += 1
+            raise APIConnectionError(
+                request=httpx.Request("POST", "http://localhost/v1/files")
+            )
+
+    async def create_file(
+        self, file: tuple[str, bytes], purpose: str
+    ) -> SimpleNamespace:
+        await self._request()
+        self.uploads += 1
+        return SimpleNamespace(id=f"file-{next(self._ids)}", filename=file[0])
+
+    async def create_batch(
+        self, vector_store_id: str, file_ids: list[str]
+    ) -> SimpleNamespace:
+        await self._request()
+        self.attached.update(file_ids)
+        return SimpleNamespace(
+            id=f"vsfb-{next(self._ids)}",
+            status="completed",
+            file_counts=SimpleNamespace(completed=len(file_ids), failed=0),
+        )
+
+
+async def main(
+    files: int, concurrency: int, latency: float, failure_rate: float, interrupt: float
+) -> dict:
+    """
+    Run the benchmark.
+
+    Args:
+        files (int): The number of PDF files to ingest.
+        concurrency (int): The maximum number of concurrent uploads.
+        latency (float): The mean latency of each request, in seconds.
+        failure_rate (float): The probability of a request failing.
+        interrupt (float): The fraction of the run after which it is
+            cancelled and resumed, or 0 to run uninterrupted.
+
+    Returns:
+        dict: The throughput and request counts of the run.
+    """
+    api = LocalFilesAPI(latency, failure_rate)
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(files):
+            with open(os.path.join(directory, f"doc-{i}.pdf"), "wb") as f:
+                f.write(os.urandom(16 * 1024))
+        paths = list_pdfs(directory)
+        checkpoint_path = os.path.join(directory, "checkpoint.json")
+
+        if interrupt:
+            run = asyncio.create_task(
+                ingest_files(
+                    api,
+                    "vs_local",
+                    paths,
+                    IngestCheckpoint(checkpoint_path),
+                    concurrency=concurrency,
+                    on_progress=lambda report: None,
+                )
+            )
+            await asyncio.sleep(files * latency / concurrency * interrupt)
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+        uploads_before_resume = api.uploads
+
+        report = await ingest_files(
+            api,
+            "vs_local",
+            paths,
+            IngestCheckpoint(checkpoint_path),
+            concurrency=concurrency,
+            on_progress=print,
+        )
+
+    return {
+        "files": files,
+        "elapsed_s": report.elapsed,
+        "files_per_second": report.uploaded / report.elapsed,
+        "uploads_before_resume": uploads_before_resume,
+        "uploads_total": api.uploads,
+        "reuploaded": api.uploads - files,
+        "transient_failures": api.failures,
+        "attached": len(api.attached),
+        "failed": len(report.failed),
+    }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    parser.add_argument("--interrupt", type=float, default=0.5)
+    args = parser.parse_args()
+    result = asyncio.run(
+        main(
+            args.files,
+            args.concurrency,
+            args.latency,
+            args.failure_rate,
+            args.interrupt,
+        )
+    )
+    print(json.dumps(result, indent=2))
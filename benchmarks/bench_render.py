@@ -0,0 +1,131 @@
+"""
+Benchmark of building the chat page against the length of the history.
+
+Builds the chat window of histories of increasing length, as the page did by
+mounting every message, and with the paged history view, and reports the
+build time and the size of the elements sent to the browser.
+
+Usage:
+    python -m benchmarks.bench_render --sizes 10 100 1000 5000
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from time import perf_counter
+import json
+
+from benchmarks.bench_holds import percentile
+
+
+SAMPLE_REPLY: str = (
+    "The **Main Library** has two copies of *Dune* available.\n\n"
+    "| Branch | Copies |\n|---|---|\n| Main Library | 2 |\n| Beaches Branch | 0 |\n\n"
+    "Let me know if you would like me to place it on hold."
+)
+
+
+def build_history(size: int) -> list:
+    """
+    Build a conversation alternating questions and markdown answers.
+
+    Args:
+        size (int): The number of messages.
+
+    Returns:
+        list[HistoryRecord]: The messages.
+    """
+    from backend.types import HistoryRecord
+
+    start = datetime.now() - timedelta(hours=1)
+    return [
+        HistoryRecord(
+            "user" if i % 2 == 0 else "assistant",
+            f"Where can I find book number {i}?" if i % 2 == 0 else f"{SAMPLE_REPLY} ({i})",
+            (start + timedelta(seconds=i)).timestamp(),
+        )
+        for i in range(size)
+    ]
+
+
+def build_page(history: list, windowed: bool) -> tuple[float, int]:
+    """
+    Build the chat window of a history in a detached client.
+
+    Args:
+        history (list[HistoryRecord]): The messages.
+        windowed (bool): Whether to use the paged history view, or to mount
+            every message with `ui.markdown` as the page used to.
+
+    Returns:
+        tuple[float, int]: The build time in seconds, and the size in bytes
+            of the elements sent to the browser.
+    """
+    from nicegui import Client, ui
+    from nicegui.page import page
+
+    from frontend.history import HistoryView
+
+    client = Client(page(""), request=None)
+    with client:
+        start = perf_counter()
+        chat_window = ui.scroll_area()
+        if windowed:
+            HistoryView(chat_window, history, "JaySO").mount()
+        else:
+            for message in history:
+                with chat_window, ui.card():
+                    ui.label(f"{message.role} | {message.timestamp.strftime('%I:%M:%S %p')}")
+                    ui.separator()
+                    ui.markdown(message.content)
+        elapsed = perf_counter() - start
+        payload = len(
+            json.dumps(
+                {id: element._to_dict() for id, element in client.elements.items()},
+                default=str,
+            )
+        )
+    client.delete()
+    return elapsed, payload
+
+
+def main(sizes: list[int], repeats: int) -> dict:
+    """
+    Run the benchmark.
+
+    Args:
+        sizes (list[int]): The history lengths to measure.
+        repeats (int): The number of page builds per length and layout.
+
+    Returns:
+        dict: The median build time and payload of each length and layout.
+    """
+    from frontend.history import HISTORY_PAGE_SIZE
+
+    report: dict = {"page_size": HISTORY_PAGE_SIZE, "sizes": {}}
+    for size in sizes:
+        history = build_history(size)
+        report["sizes"][str(size)] = {}
+        for name, windowed in (("mount_all", False), ("windowed", True)):
+            times, payload = [], 0
+            for _ in range(repeats):
+                elapsed, payload = build_page(history, windowed)
+                times.append(elapsed)
+            report["sizes"][str(size)][name] = {
+                "build_ms": percentile(times, 50) * 1e3,
+                "payload_kb": payload / 1e3,
+            }
+    return report
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = main(args.sizes, args.repeats)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
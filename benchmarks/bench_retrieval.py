@@ -0,0 +1,139 @@
+"""
+Benchmark of the local retrieval index on a synthetic corpus.
+
+Builds an exhaustive and an inverted file index over the same passages, then
+reports build time, index size, single and batched query latency, and the
+recall of the inverted file against exhaustive search.
+
+Usage:
+    python -m benchmarks.bench_retrieval --passages 100000 --lists 256
+"""
+
+from argparse import ArgumentParser
+from itertools import accumulate
+from time import perf_counter
+import json
+import os
+import random
+import tempfile
+
+import numpy as np
+
+from backend.retrieval import Chunk, VectorIndex
+from benchmarks.bench_holds import percentile
+
+
+def synthetic_passages(count: int, seed: int = 0) -> list[Chunk]:
+    """
+    Generate passages of words drawn from a Zipf-like vocabulary.
+
+    Args:
+        count (int): The number of passages.
+        seed (int): The random seed.
+
+    Returns:
+        list[Chunk]: The passages.
+    """
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(20000)]
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    return [
+        Chunk(
+            source=f"doc{i // 20}.pdf",
+            page=i % 20 + 1,
+            text=" ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=120)),
+        )
+        for i in range(count)
+    ]
+
+
+def measure_queries(
+    index: VectorIndex, queries: np.ndarray, k: int, probes: int
+) -> tuple[list[float], float]:
+    """
+    Measure one query at a time, then all queries in one batch.
+
+    Args:
+        index (VectorIndex): The index under test.
+        queries (np.ndarray): The query vectors.
+        k (int): The number of results per query.
+        probes (int): The number of clusters scored per query.
+
+    Returns:
+        tuple[list[float], float]: The latency of each single query, and the
+            time per query of the batch, in seconds.
+    """
+    latencies: list[float] = []
+    for query in queries:
+        start = perf_counter()
+        index.search_vectors(query[None], k, probes)
+        latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    index.search_vectors(queries, k, probes)
+    return latencies, (perf_counter() - start) / len(queries)
+
+
+def main(passages: int, lists: int, probes: int, queries: int, k: int) -> dict:
+    """
+    Run the benchmark.
+
+    Args:
+        passages (int): The number of passages in the corpus.
+        lists (int): The number of clusters of the inverted file index.
+        probes (int): The number of clusters scored per query.
+        queries (int): The number of queries.
+        k (int): The number of results per query.
+
+    Returns:
+        dict: The measurements of each index.
+    """
+    corpus = synthetic_passages(passages)
+    # Queries are fragments of passages, like a question quoting a document
+    query_texts = [
+        " ".join(chunk.text.split()[:12]) for chunk in random.sample(corpus, queries)
+    ]
+
+    report: dict = {"passages": passages}
+    with tempfile.TemporaryDirectory() as directory:
+        results: dict[str, list[set[tuple[str, int]]]] = {}
+        for name, index_lists in (("exhaustive", 0), ("inverted_file", lists)):
+            start = perf_counter()
+            index = VectorIndex.build(
+                os.path.join(directory, name), corpus, lists=index_lists
+            )
+            build_time = perf_counter() - start
+
+            query_vectors = index.embed(query_texts)
+            latencies, batched = measure_queries(index, query_vectors, k, probes)
+            # Rows differ between the indexes, so compare the passages themselves
+            results[name] = [
+                {(result.chunk.source, result.chunk.page) for result in found}
+                for found in index.search(query_texts, k, probes)
+            ]
+            report[name] = {
+                "build_s": build_time,
+                "index_mb": index.nbytes / 1e6,
+                "query_p50_ms": percentile(latencies, 50) * 1e3,
+                "query_p99_ms": percentile(latencies, 99) * 1e3,
+                "batched_ms_per_query": batched * 1e3,
+            }
+
+    found = [
+        len(exact & approximate) / max(len(exact), 1)
+        for exact, approximate in zip(results["exhaustive"], results["inverted_file"])
+    ]
+    report["inverted_file"]["recall"] = sum(found) / len(found)
+    return report
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--passages", type=int, default=100000)
+    parser.add_argument("--lists", type=int, default=256)
+    parser.add_argument("--probes", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+    report = main(args.passages, args.lists, args.probes, args.queries, args.k)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,375 @@
+"""
+Benchmark of the agent's chat turn loop against a local mock of the OpenAI API.
+
+Runs conversations through `Agent.chat`, with and without a tool call per
+turn, and reports per-turn latency percentiles, model round trips per turn,
+the cost of serializing large histories and text-to-speech time to first byte.
+Speech is delivered both as the server played it, once each sentence was
+fully synthesized, and as it is streamed to the browser, chunk by chunk.
+Renewal requests are run with and without the local intent fast path, and
+book lookups slowed down as if the catalog were remote, with and without
+speculative prefetching.
+
+Usage:
+    python -m benchmarks.bench_turns --turns 50 --output turns.json
+"""
+
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter, sleep
+from typing import Iterator
+import asyncio
+import json
+import os
+import tempfile
+
+from benchmarks.bench_holds import percentile
+from benchmarks.mock_openai import MockConfig, MockServer, ToolCallScript
+
+
+SCENARIOS: dict[str, list[ToolCallScript]] = {
+    "plain": [],
+    "tool_call": [ToolCallScript("locate_book", {"book_title": "Dune"})],
+}
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """
+    Return the percentiles of a list of durations.
+
+    Args:
+        samples (list[float]): The durations, in seconds.
+
+    Returns:
+        dict[str, float]: The p50, p95 and p99, in milliseconds.
+    """
+    return {
+        f"p{q}_ms": percentile(samples, q) * 1e3 for q in (50, 95, 99)
+    }
+
+
+def silent_agent():
+    """
+    Return an agent that doesn't speak its answers.
+
+    The agent is imported on first use, so that the environment can point it
+    at the mock server first.
+
+    Returns:
+        Agent: The agent.
+    """
+    from backend.orchestrator import Agent
+
+    class SilentAgent(Agent):
+        # Speech is measured separately, don't play it
+        def handle_speach(self, text: str, sink=None) -> None:
+            return None
+
+    return SilentAgent()
+
+
+async def run_conversation(
+    server: MockServer,
+    turns: int,
+    content: str = "Where can I find Dune? ({turn})",
+    intent_threshold: float | None = None,
+    prefetch: bool = False,
+    tool_cache: bool = True,
+) -> dict:
+    """
+    Run one chained conversation through the agent.
+
+    Args:
+        server (MockServer): The mock server the agent talks to.
+        turns (int): The number of user turns.
+        content (str): The user message of every turn, formatted with `turn`.
+        intent_threshold (float | None): The confidence from which requests
+            are answered without the model, or None for the default.
+        prefetch (bool): Whether to look up the titles of messages ahead of the model.
+        tool_cache (bool): Whether to cache tool results across turns.
+
+    Returns:
+        dict: The turn latency percentiles, the model round trips per turn,
+            the share of turns answered without the model and the share of
+            prefetched lookups the model asked for.
+    """
+    from backend.orchestrator import ConversationState
+    from backend.types import Message
+
+    agent = silent_agent()
+    if intent_threshold is not None:
+        agent.intents.threshold = intent_threshold
+    agent.prefetcher.enabled = prefetch
+    if not tool_cache:
+        agent.tool_cache.ttls = {}
+    state = ConversationState()
+    messages: list[Message] = []
+    latencies: list[float] = []
+    before = sum(server.mock.requests.values())
+
+    for turn in range(turns):
+        messages.append(
+            Message(
+                content=content.format(turn=turn),
+                role="user",
+                timestamp=datetime.now(),
+            )
+        )
+        start = perf_counter()
+        reply = await agent.chat(messages, state)
+        latencies.append(perf_counter() - start)
+        messages.append(reply)
+
+    return {
+        **summarize(latencies),
+        "round_trips_per_turn": (sum(server.mock.requests.values()) - before) / turns,
+        "bytes_sent_per_turn": state.totals.bytes_sent / turns,
+        "local_answer_rate": agent.intents.stats()["hit_rate"],
+        "prefetch_precision": agent.prefetcher.stats()["precision"],
+    }
+
+
+@contextmanager
+def slowed_tool(name: str, latency: float) -> Iterator[None]:
+    """
+    Make a tool take longer, as if it called a remote service.
+
+    Args:
+        name (str): The name of the tool.
+        latency (float): The time added to every call, in seconds.
+    """
+    from dataclasses import replace
+
+    from backend.tools import get_registry
+
+    registry = get_registry()
+    tool = registry.tools[name]
+
+    def slow(**kwargs):
+        sleep(latency)
+        return tool.function(**kwargs)
+
+    registry.tools[name] = replace(tool, function=slow)
+    try:
+        yield
+    finally:
+        registry.tools[name] = tool
+
+
+def measure_serialization(sizes: list[int], repeats: int = 20) -> dict[str, dict]:
+    """
+    Measure `serialize_messages` and the JSON encoding of its output.
+
+    Args:
+        sizes (list[int]): The history sizes to measure, in messages.
+        repeats (int): The number of measurements per size.
+
+    Returns:
+        dict[str, dict]: The median cost and payload size of each history size.
+    """
+    from backend.orchestrator.orchestrator import serialize_messages
+    from backend.types import HistoryRecord, Message
+
+    report: dict[str, dict] = {}
+    for size in sizes:
+        history = [
+            HistoryRecord.from_message(
+                Message(
+                    content=f"Message {i} about a book in the library catalog.",
+                    role="user" if i % 2 == 0 else "assistant",
+                    timestamp=datetime.now(),
+                )
+            )
+            for i in range(size)
+        ]
+        serialize_times: list[float] = []
+        encode_times: list[float] = []
+        for _ in range(repeats):
+            start = perf_counter()
+            items = serialize_messages(history)
+            serialize_times.append(perf_counter() - start)
+            start = perf_counter()
+            payload = json.dumps(items)
+            encode_times.append(perf_counter() - start)
+        report[str(size)] = {
+            "serialize_ms": percentile(serialize_times, 50) * 1e3,
+            "json_encode_ms": percentile(encode_times, 50) * 1e3,
+            "payload_kb": len(payload) / 1e3,
+        }
+    return report
+
+
+async def measure_tts(samples: int) -> dict[str, float]:
+    """
+    Measure the time to the first byte and the last byte of speech synthesis.
+
+    Args:
+        samples (int): The number of requests.
+
+    Returns:
+        dict[str, float]: The percentiles of each duration.
+    """
+    from openai import AsyncOpenAI
+
+    from backend.orchestrator.speech import (
+        TTS_FORMAT,
+        TTS_INSTRUCTIONS,
+        TTS_MODEL,
+        TTS_VOICE,
+    )
+
+    client = AsyncOpenAI()
+    first_bytes: list[float] = []
+    totals: list[float] = []
+    for _ in range(samples):
+        start = perf_counter()
+        async with client.audio.speech.with_streaming_response.create(
+            model=TTS_MODEL,
+            voice=TTS_VOICE,
+            input="The Main Library has two copies available.",
+            instructions=TTS_INSTRUCTIONS,
+            response_format=TTS_FORMAT,
+        ) as response:
+            first = None
+            async for _ in response.iter_bytes():
+                if first is None:
+                    first = perf_counter() - start
+        first_bytes.append(first or 0.0)
+        totals.append(perf_counter() - start)
+    await client.close()
+    return {
+        **{f"ttfb_{key}": value for key, value in summarize(first_bytes).items()},
+        **{f"total_{key}": value for key, value in summarize(totals).items()},
+    }
+
+
+async def measure_speech_delivery(samples: int) -> dict[str, dict[str, float]]:
+    """
+    Measure the time from the text of an answer to its first audio, when
+    each sentence is buffered whole before playback, as on the server's
+    speakers, and when its chunks are forwarded as they arrive.
+
+    Args:
+        samples (int): The number of answers per delivery.
+
+    Returns:
+        dict[str, dict[str, float]]: The percentiles of each delivery.
+    """
+    from backend.client import get_client
+    from backend.orchestrator.audio_stream import AudioStream
+    from backend.orchestrator.speech import AudioSink, SpeechPipeline
+
+    class BufferedSink(AudioSink):
+        # Waits for the whole sentence, as the local player does, but is silent
+        def __init__(self):
+            self.first_audio: float | None = None
+
+        async def play(self, chunks) -> None:
+            b"".join([chunk async for chunk in chunks])
+            if self.first_audio is None:
+                self.first_audio = perf_counter()
+
+    answer = "The Main Library has two copies of Dune available. Would you like me to hold one?"
+    report: dict[str, dict[str, float]] = {}
+    for name in ("buffered", "streamed"):
+        latencies: list[float] = []
+        for i in range(samples):
+            sink = BufferedSink() if name == "buffered" else AudioStream()
+            start = perf_counter()
+            # Uncached text, so every sample is synthesized
+            speech = SpeechPipeline(get_client("tts"), sink=sink)
+            speech.feed(f"{answer} ({i})")
+            speech.finish()
+            if isinstance(sink, AudioStream):
+                reader = sink.read()
+                await anext(reader)
+                latencies.append(perf_counter() - start)
+                await speech.wait()
+                sink.close()
+                async for _ in reader:
+                    pass
+            else:
+                await speech.wait()
+                latencies.append((sink.first_audio or perf_counter()) - start)
+        report[name] = summarize(latencies)
+    return report
+
+
+async def main(
+    turns: int, first_token_latency: float, tts_samples: int, tool_latency: float
+) -> dict:
+    """
+    Run the benchmark.
+
+    Args:
+        turns (int): The number of turns per scenario.
+        first_token_latency (float): The simulated model latency, in seconds.
+        tts_samples (int): The number of speech requests to measure.
+        tool_latency (float): The simulated latency of a remote book lookup,
+            in seconds.
+
+    Returns:
+        dict: The measurements.
+    """
+    report: dict = {
+        "turns": turns,
+        "first_token_latency_ms": first_token_latency * 1e3,
+        "scenarios": {},
+    }
+    for name, tool_calls in SCENARIOS.items():
+        config = MockConfig(first_token_latency=first_token_latency, tool_calls=tool_calls)
+        with MockServer(config) as server:
+            os.environ["OPENAI_BASE_URL"] = server.url
+            report["scenarios"][name] = await run_conversation(server, turns)
+            if name == "plain":
+                report["tts"] = await measure_tts(tts_samples)
+                report["speech_delivery"] = await measure_speech_delivery(tts_samples)
+
+    # The model asks for the renewal, unless the fast path answers it first
+    config = MockConfig(
+        first_token_latency=first_token_latency,
+        tool_calls=[ToolCallScript("renew_book", {"book_title": "Dune"})],
+    )
+    with MockServer(config) as server:
+        os.environ["OPENAI_BASE_URL"] = server.url
+        for name, threshold in (("renew_model", 2.0), ("renew_fast_path", None)):
+            report["scenarios"][name] = await run_conversation(
+                server, turns, "Please renew Dune", threshold
+            )
+
+    # Every turn looks the book up anew, along with the model or after it
+    config = MockConfig(
+        first_token_latency=first_token_latency, tool_calls=SCENARIOS["tool_call"]
+    )
+    with MockServer(config) as server, slowed_tool("locate_book", tool_latency):
+        os.environ["OPENAI_BASE_URL"] = server.url
+        for name, prefetch in (("remote_lookup", False), ("remote_lookup_prefetch", True)):
+            report["scenarios"][name] = await run_conversation(
+                server, turns, prefetch=prefetch, tool_cache=False
+            )
+
+    report["serialization"] = measure_serialization([10, 100, 1000, 10000])
+    return report
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--first-token-latency", type=float, default=0.05)
+    parser.add_argument("--tts-samples", type=int, default=20)
+    parser.add_argument("--tool-latency", type=float, default=0.05)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    # Never reach the real API, nor touch the local holds database
+    os.environ["OPENAI_API_KEY"] = "mock"
+    os.environ.setdefault("HOLDS_DB", os.path.join(tempfile.mkdtemp(), "holds.db"))
+
+    report = asyncio.run(
+        main(args.turns, args.first_token_latency, args.tts_samples, args.tool_latency)
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
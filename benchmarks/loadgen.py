@@ -0,0 +1,357 @@
+"""
+Load generator that replays conversations against the agent or the web page.
+
+Virtual users arrive at a fixed rate, or keep a fixed number of sessions
+busy, and each plays a conversation: recorded turns read from turn logs, or
+a synthetic script. The agent talks to a local mock of the OpenAI API.
+Reports throughput, turn latency percentiles, event loop lag and memory
+growth per session, to find where a single process stops scaling. With
+`--schedule`, turns go through the agent's admission control, and the turns
+it shed and the time turns waited are reported too.
+
+Usage:
+    python -m benchmarks.loadgen --sessions 200 --concurrency 50 --turns 5
+    python -m benchmarks.loadgen --replay logs/requests.jsonl --rate 20
+    python -m benchmarks.loadgen --schedule --max-concurrent 8 --rate 50
+    python -m benchmarks.loadgen --target page --url http://127.0.0.1:8080/
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime
+from itertools import cycle
+from time import perf_counter
+import asyncio
+import json
+import os
+import random
+import tempfile
+import tracemalloc
+
+from benchmarks.bench_holds import measure_loop_lag, percentile
+from benchmarks.bench_turns import silent_agent, summarize
+from benchmarks.mock_openai import MockConfig, MockServer, ToolCallScript
+
+
+SYNTHETIC_TURNS: list[str] = [
+    "Where can I find Dune?",
+    "Is The Hobbit available at the Main Library?",
+    "Can you place it on hold for me?",
+    "Please renew my copy of Beloved.",
+    "What are the opening hours of the Beaches Branch?",
+    "Thanks, that is all.",
+]
+
+
+def load_scripts(paths: list[str], turns: int) -> list[list[str]]:
+    """
+    Build conversation scripts from recorded turn logs.
+
+    Consecutive recorded inputs are grouped into conversations of `turns`
+    inputs each.
+
+    Args:
+        paths (list[str]): The paths of the turn logs.
+        turns (int): The number of turns per conversation.
+
+    Returns:
+        list[list[str]]: The inputs of each conversation.
+    """
+    from backend.metrics import read_turn_log
+
+    inputs = [
+        record["input"]
+        for path in paths
+        for record in read_turn_log(path)
+        if record.get("input")
+    ]
+    return [inputs[i : i + turns] for i in range(0, len(inputs), turns)]
+
+
+def synthetic_scripts(count: int, turns: int, seed: int = 0) -> list[list[str]]:
+    """
+    Build synthetic conversation scripts.
+
+    Args:
+        count (int): The number of conversations.
+        turns (int): The number of turns per conversation.
+        seed (int): The random seed.
+
+    Returns:
+        list[list[str]]: The inputs of each conversation.
+    """
+    rng = random.Random(seed)
+    return [rng.choices(SYNTHETIC_TURNS, k=turns) for _ in range(count)]
+
+
+class LoadReport:
+    """
+    Collects the outcome of every turn of a load test.
+    """
+
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors: int = 0
+        self.shed: int = 0
+        self.sessions: int = 0
+
+    def to_dict(self, elapsed: float, lags: list[float]) -> dict:
+        return {
+            "sessions": self.sessions,
+            "turns": len(self.latencies),
+            "errors": self.errors,
+            "shed": self.shed,
+            "elapsed_s": elapsed,
+            "turns_per_second": len(self.latencies) / elapsed if elapsed else 0.0,
+            **(summarize(self.latencies) if self.latencies else {}),
+            "loop_lag_p50_ms": percentile(lags, 50) * 1e3 if lags else 0.0,
+            "loop_lag_p99_ms": percentile(lags, 99) * 1e3 if lags else 0.0,
+            "loop_lag_max_ms": max(lags) * 1e3 if lags else 0.0,
+        }
+
+
+async def agent_session(
+    agent,
+    sessions,
+    session_id: str,
+    script: list[str],
+    think_time: float,
+    schedule: bool,
+    report: LoadReport,
+) -> None:
+    """
+    Play one conversation through the agent, as the chat page does.
+
+    Args:
+        agent (Agent): The agent shared by every session.
+        sessions (SessionManager): The sessions of the process.
+        session_id (str): The id of the session.
+        script (list[str]): The user inputs of the conversation.
+        think_time (float): The mean pause between turns, in seconds.
+        schedule (bool): Whether turns wait for the agent's scheduler.
+        report (LoadReport): The report to record the turns into.
+    """
+    from backend.orchestrator import Overloaded
+    from backend.types import Message
+
+    session = sessions.get(session_id)
+    for text in script:
+        sessions.append(
+            session, Message(content=text, role="user", timestamp=datetime.now())
+        )
+        start = perf_counter()
+        try:
+            reply = await agent.chat(
+                session.history, session.state, session_id if schedule else None
+            )
+        except Overloaded:
+            # The user would send it again later, move on to the next session
+            report.shed += 1
+            sessions.pop(session)
+            return
+        except Exception:
+            report.errors += 1
+            return
+        report.latencies.append(perf_counter() - start)
+        sessions.append(session, reply)
+        if think_time:
+            await asyncio.sleep(random.expovariate(1 / think_time))
+
+
+async def page_session(client, url: str, script: list[str], report: LoadReport) -> None:
+    """
+    Load the chat page once per scripted turn.
+
+    Args:
+        client (httpx.AsyncClient): The HTTP client.
+        url (str): The URL of the page.
+        script (list[str]): The user inputs of the conversation.
+        report (LoadReport): The report to record the page loads into.
+    """
+    for _ in script:
+        start = perf_counter()
+        try:
+            response = await client.get(url)
+            response.raise_for_status()
+        except Exception:
+            report.errors += 1
+            return
+        report.latencies.append(perf_counter() - start)
+
+
+async def run_load(
+    scripts: list[list[str]],
+    target: str,
+    url: str,
+    concurrency: int,
+    rate: float | None,
+    think_time: float,
+    trace_memory: bool = True,
+    max_concurrent: int | None = None,
+) -> dict:
+    """
+    Run every scripted conversation and measure the process under load.
+
+    Args:
+        scripts (list[list[str]]): The conversations to play.
+        target (str): 'agent' to call `Agent.chat` in process, or 'page' to
+            load the chat page over HTTP.
+        url (str): The URL of the page, for the 'page' target.
+        concurrency (int): The maximum number of sessions running at once.
+        rate (float | None): The number of sessions started per second, or
+            None to start a new session as soon as one finishes.
+        think_time (float): The mean pause between turns, in seconds.
+        trace_memory (bool): Whether to measure memory with `tracemalloc`,
+            which slows every allocation and so inflates latency and lag.
+        max_concurrent (int | None): The turns the agent's scheduler admits
+            at once, or None to call the model without admission control.
+
+    Returns:
+        dict: The measurements.
+    """
+    report = LoadReport()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    if target == "agent":
+        from backend.sessions import SessionManager
+
+        agent = silent_agent()
+        if max_concurrent is not None:
+            agent.scheduler.max_concurrent = max_concurrent
+        sessions = SessionManager(max_sessions=len(scripts) + 1)
+        play = lambda i, script: agent_session(
+            agent, sessions, f"load-{i}", script, think_time, max_concurrent is not None, report
+        )
+    else:
+        import httpx
+
+        client = httpx.AsyncClient(timeout=30.0)
+        play = lambda i, script: page_session(client, url, script, report)
+
+    async def run(i: int, script: list[str]) -> None:
+        async with semaphore:
+            report.sessions += 1
+            await play(i, script)
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_loop_lag(lags, stop))
+
+    if trace_memory:
+        tracemalloc.start()
+    memory_before, _ = tracemalloc.get_traced_memory()
+    start = perf_counter()
+
+    tasks: list[asyncio.Task] = []
+    for i, script in enumerate(scripts):
+        tasks.append(asyncio.create_task(run(i, script)))
+        if rate:
+            # Open loop: sessions arrive as a Poisson process
+            await asyncio.sleep(random.expovariate(rate))
+    await asyncio.gather(*tasks)
+
+    elapsed = perf_counter() - start
+    memory_after, memory_peak = tracemalloc.get_traced_memory()
+    if trace_memory:
+        tracemalloc.stop()
+    stop.set()
+    await ticker
+    if target == "page":
+        await client.aclose()
+
+    result = report.to_dict(elapsed, lags)
+    if target == "agent" and max_concurrent is not None:
+        from backend.orchestrator.scheduler import QUEUE_WAIT_SECONDS
+
+        result["queue_waits"] = QUEUE_WAIT_SECONDS.count()
+        result["queue_wait_mean_ms"] = (
+            QUEUE_WAIT_SECONDS.total() / result["queue_waits"] * 1e3
+            if result["queue_waits"]
+            else 0.0
+        )
+    if not trace_memory:
+        return result
+    return {
+        **result,
+        "memory_growth_mb": (memory_after - memory_before) / 1e6,
+        "memory_per_session_kb": (memory_after - memory_before) / max(report.sessions, 1) / 1e3,
+        "memory_peak_mb": memory_peak / 1e6,
+    }
+
+
+async def main(args) -> dict:
+    """
+    Run the load test described by the command line arguments.
+
+    Args:
+        args (Namespace): The parsed arguments.
+
+    Returns:
+        dict: The measurements, with the settings they were taken with.
+    """
+    if args.replay:
+        scripts = load_scripts(args.replay, args.turns)
+        scripts = [script for _, script in zip(range(args.sessions), cycle(scripts))]
+    else:
+        scripts = synthetic_scripts(args.sessions, args.turns)
+
+    settings = {
+        "target": args.target,
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "first_token_latency_ms": args.first_token_latency * 1e3,
+    }
+    if args.target == "page":
+        return {**settings, **await run_load(
+            scripts, "page", args.url, args.concurrency, args.rate, 0.0, not args.no_memory
+        )}
+
+    config = MockConfig(
+        first_token_latency=args.first_token_latency,
+        tool_calls=[ToolCallScript("locate_book", {"book_title": "Dune"})]
+        if args.tool_calls
+        else [],
+    )
+    with MockServer(config) as server:
+        os.environ["OPENAI_BASE_URL"] = server.url
+        result = await run_load(
+            scripts,
+            "agent",
+            "",
+            args.concurrency,
+            args.rate,
+            args.think_time,
+            not args.no_memory,
+            args.max_concurrent if args.schedule else None,
+        )
+        result["model_requests"] = sum(server.mock.requests.values())
+    return {**settings, **result}
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", choices=("agent", "page"), default="agent")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/")
+    parser.add_argument("--replay", nargs="*", help="turn logs to replay instead of synthetic turns")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rate", type=float, help="sessions started per second")
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.2)
+    parser.add_argument("--tool-calls", action="store_true", help="request a tool call every turn")
+    parser.add_argument("--schedule", action="store_true", help="admit turns through the agent's scheduler")
+    parser.add_argument("--max-concurrent", type=int, default=32, help="turns the scheduler admits at once")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc measurements")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    # Never reach the real API, nor touch the local databases and logs
+    os.environ["OPENAI_API_KEY"] = "mock"
+    os.environ.setdefault("HOLDS_DB", os.path.join(tempfile.mkdtemp(), "holds.db"))
+    os.environ.setdefault("TURN_LOG", "")
+
+    report = asyncio.run(main(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,429 @@
+"""
+Local mock of the OpenAI Responses and audio speech endpoints.
+
+Answers like the real API, with configurable latency, so the agent can be
+benchmarked offline. Faults can be injected: a share of requests fail with an
+error status, and another share stall before answering. Point a client at it
+with `OPENAI_BASE_URL`.
+
+Usage:
+    python -m benchmarks.mock_openai --port 8100 --first-token-latency 0.3
+    python -m benchmarks.mock_openai --error-rate 0.1 --stall-rate 0.05
+"""
+
+from argparse import ArgumentParser
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from itertools import count
+from time import time
+from typing import AsyncIterator
+import asyncio
+import json
+import random
+import socket
+import threading
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+
+DEFAULT_REPLY: str = (
+    "The Main Library has two copies available. "
+    "You can pick one up at the front desk during opening hours. "
+    "Let me know if you would like me to place it on hold."
+)
+
+
+@dataclass
+class ToolCallScript:
+    """
+    Represents a function call the mock requests at the start of every turn.
+
+    Attributes:
+        name: The name of the function.
+        arguments: The arguments of the call.
+    """
+
+    name: str
+    arguments: dict
+
+
+@dataclass
+class MockConfig:
+    """
+    Represents the behavior of the mock server.
+
+    Attributes:
+        first_token_latency: The delay before the first byte of a response, in seconds.
+        token_interval: The delay between streamed text deltas, in seconds.
+        reply: The text of every final answer.
+        tool_calls: The function calls requested by the first response of a turn.
+        tts_first_byte_latency: The delay before the first audio byte, in seconds.
+        tts_chunk_interval: The delay between audio chunks, in seconds.
+        tts_chunk_bytes: The size of each audio chunk.
+        tts_bytes_per_char: The bytes of audio generated per input character.
+        error_rate: The share of requests answered with `error_status`.
+        error_status: The status of injected errors.
+        stall_rate: The share of requests delayed by `stall_latency` first.
+        stall_latency: The extra delay of stalled requests, in seconds.
+        seed: The seed of the random fault injection.
+    """
+
+    first_token_latency: float = 0.3
+    token_interval: float = 0.01
+    reply: str = DEFAULT_REPLY
+    tool_calls: list[ToolCallScript] = field(default_factory=list)
+    tts_first_byte_latency: float = 0.15
+    tts_chunk_interval: float = 0.01
+    tts_chunk_bytes: int = 4800
+    tts_bytes_per_char: int = 3000
+    error_rate: float = 0.0
+    error_status: int = 503
+    stall_rate: float = 0.0
+    stall_latency: float = 5.0
+    seed: int | None = None
+
+
+class MockOpenAI:
+    """
+    The state of a mock server: its configuration, the responses it issued
+    and the number of requests made to each endpoint.
+    """
+
+    config: MockConfig
+    requests: Counter
+
+    def __init__(self, config: MockConfig | None = None):
+        """
+        Args:
+            config (MockConfig | None): The behavior of the server.
+        """
+        self.config = config or MockConfig()
+        self.requests = Counter()
+        self._ids = count(1)
+        self._responses: OrderedDict[str, None] = OrderedDict()
+        self._random = random.Random(self.config.seed)
+
+    def create_app(self) -> FastAPI:
+        """
+        Return the FastAPI application serving the mock endpoints.
+
+        Returns:
+            FastAPI: The application.
+        """
+        app = FastAPI()
+
+        @app.post("/v1/responses")
+        async def responses(request: Request):
+            body = await request.json()
+            if (fault := await self.inject_fault()) is not None:
+                return fault
+            previous = body.get("previous_response_id")
+            if previous is not None and previous not in self._responses:
+                self.requests["responses_rejected"] += 1
+                return JSONResponse(
+                    status_code=400,
+                    content={
+                        "error": {
+                            "message": f"Previous response '{previous}' not found.",
+                            "type": "invalid_request_error",
+                            "code": "previous_response_not_found",
+                        }
+                    },
+                )
+
+            if body.get("stream"):
+                self.requests["responses_streamed"] += 1
+                return StreamingResponse(
+                    self.stream_response(body), media_type="text/event-stream"
+                )
+            self.requests["responses"] += 1
+            await asyncio.sleep(self.config.first_token_latency)
+            return self.build_response(body)
+
+        @app.post("/v1/audio/speech")
+        async def speech(request: Request):
+            body = await request.json()
+            if (fault := await self.inject_fault()) is not None:
+                return fault
+            self.requests["speech"] += 1
+            return StreamingResponse(
+                self.stream_audio(len(body.get("input", ""))),
+                media_type="application/octet-stream",
+            )
+
+        return app
+
+    async def inject_fault(self) -> JSONResponse | None:
+        """
+        Fail or stall a request, as configured.
+
+        Returns:
+            JSONResponse | None: The error to answer with, or None to answer
+                normally, possibly after a stall.
+        """
+        draw = self._random.random()
+        if draw < self.config.error_rate:
+            self.requests["faults_error"] += 1
+            return JSONResponse(
+                status_code=self.config.error_status,
+                content={
+                    "error": {
+                        "message": "Injected fault.",
+                        "type": "server_error",
+                        "code": None,
+                    }
+                },
+            )
+        if draw < self.config.error_rate + self.config.stall_rate:
+            self.requests["faults_stall"] += 1
+            await asyncio.sleep(self.config.stall_latency)
+        return None
+
+    def build_response(self, body: dict) -> dict:
+        """
+        Return the completed response to a request.
+
+        The first request of a turn requests the scripted function calls, if
+        any. Requests carrying function outputs, and every request when no
+        calls are scripted, get the configured reply.
+
+        Args:
+            body (dict): The body of the request.
+
+        Returns:
+            dict: The response object.
+        """
+        items = body.get("input", [])
+        answered = isinstance(items, list) and any(
+            isinstance(item, dict) and item.get("type") == "function_call_output"
+            for item in items
+        )
+
+        response_id = f"resp_{next(self._ids)}"
+        if self.config.tool_calls and not answered:
+            output = [
+                {
+                    "type": "function_call",
+                    "id": f"fc_{response_id}_{i}",
+                    "call_id": f"call_{response_id}_{i}",
+                    "name": call.name,
+                    "arguments": json.dumps(call.arguments),
+                    "status": "completed",
+                }
+                for i, call in enumerate(self.config.tool_calls)
+            ]
+        else:
+            output = [
+                {
+                    "type": "message",
+                    "id": f"msg_{response_id}",
+                    "status": "completed",
+                    "role": "assistant",
+                    "content": [
+                        {"type": "output_text", "text": self.config.reply, "annotations": []}
+                    ],
+                }
+            ]
+
+        if body.get("store", True):
+            self._responses[response_id] = None
+            while len(self._responses) > 100000:
+                self._responses.popitem(last=False)
+
+        input_tokens = len(json.dumps(items)) // 4 + len(body.get("instructions") or "") // 4
+        output_tokens = len(json.dumps(output)) // 4
+        return {
+            "id": response_id,
+            "object": "response",
+            "created_at": time(),
+            "model": body.get("model", "mock"),
+            "status": "completed",
+            "output": output,
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": body.get("tools", []),
+            "error": None,
+            "incomplete_details": None,
+            "instructions": body.get("instructions"),
+            "metadata": {},
+            "temperature": 1.0,
+            "top_p": 1.0,
+            "previous_response_id": body.get("previous_response_id"),
+            "usage": {
+                "input_tokens": input_tokens,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": output_tokens,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": input_tokens + output_tokens,
+            },
+        }
+
+    async def stream_response(self, body: dict) -> AsyncIterator[str]:
+        """
+        Stream a response as server-sent events.
+
+        Args:
+            body (dict): The body of the request.
+
+        Yields:
+            str: The encoded events.
+        """
+        response = self.build_response(body)
+        sequence = count()
+
+        def event(data: dict) -> str:
+            data["sequence_number"] = next(sequence)
+            return f"event: {data['type']}\ndata: {json.dumps(data)}\n\n"
+
+        yield event(
+            {
+                "type": "response.created",
+                "response": {**response, "status": "in_progress", "output": []},
+            }
+        )
+        await asyncio.sleep(self.config.first_token_latency)
+
+        for index, item in enumerate(response["output"]):
+            if item["type"] == "message":
+                yield event(
+                    {
+                        "type": "response.output_item.added",
+                        "output_index": index,
+                        "item": {**item, "status": "in_progress", "content": []},
+                    }
+                )
+                for i, word in enumerate(self.config.reply.split(" ")):
+                    if i:
+                        await asyncio.sleep(self.config.token_interval)
+                    yield event(
+                        {
+                            "type": "response.output_text.delta",
+                            "item_id": item["id"],
+                            "output_index": index,
+                            "content_index": 0,
+                            "delta": word if i == 0 else f" {word}",
+                            "logprobs": [],
+                        }
+                    )
+            yield event({"type": "response.output_item.done", "output_index": index, "item": item})
+
+        yield event({"type": "response.completed", "response": response})
+
+    async def stream_audio(self, characters: int) -> AsyncIterator[bytes]:
+        """
+        Stream silent 16-bit PCM audio for a text.
+
+        Args:
+            characters (int): The length of the synthesized text.
+
+        Yields:
+            bytes: The audio chunks.
+        """
+        remaining = characters * self.config.tts_bytes_per_char
+        await asyncio.sleep(self.config.tts_first_byte_latency)
+        while remaining > 0:
+            size = min(self.config.tts_chunk_bytes, remaining)
+            yield bytes(size)
+            remaining -= size
+            if remaining:
+                await asyncio.sleep(self.config.tts_chunk_interval)
+
+
+def free_port() -> int:
+    """
+    Return a TCP port that is free on the loopback interface.
+
+    Returns:
+        int: The port.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class MockServer:
+    """
+    Runs a mock server on a background thread, as a context manager.
+
+    Example:
+        with MockServer(MockConfig(first_token_latency=0.1)) as server:
+            os.environ["OPENAI_BASE_URL"] = server.url
+    """
+
+    mock: MockOpenAI
+    port: int
+
+    def __init__(self, config: MockConfig | None = None, port: int | None = None):
+        """
+        Args:
+            config (MockConfig | None): The behavior of the server.
+            port (int | None): The port to listen on, or None for any free port.
+        """
+        self.mock = MockOpenAI(config)
+        self.port = port or free_port()
+        self._server = uvicorn.Server(
+            uvicorn.Config(
+                self.mock.create_app(),
+                host="127.0.0.1",
+                port=self.port,
+                log_level="warning",
+            )
+        )
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """
+        The base URL of the API, as expected by the OpenAI client.
+        """
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def __enter__(self) -> "MockServer":
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("Mock server failed to start.")
+            threading.Event().wait(0.01)
+        return self
+
+    def __exit__(self, *_) -> None:
+        self._server.should_exit = True
+        self._thread.join()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--tts-first-byte-latency", type=float, default=0.15)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall-latency", type=float, default=5.0)
+    parser.add_argument(
+        "--tool-call",
+        action="append",
+        default=[],
+        metavar="NAME:JSON",
+        help='a function call to request every turn, e.g. locate_book:{"book_title": "Dune"}',
+    )
+    args = parser.parse_args()
+
+    config = MockConfig(
+        first_token_latency=args.first_token_latency,
+        token_interval=args.token_interval,
+        tts_first_byte_latency=args.tts_first_byte_latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        stall_rate=args.stall_rate,
+        stall_latency=args.stall_latency,
+        tool_calls=[
+            ToolCallScript(name, json.loads(arguments))
+            for name, arguments in (call.split(":", 1) for call in args.tool_call)
+        ],
+    )
+    print(f"Mock OpenAI API on http://127.0.0.1:{args.port}/v1")
+    uvicorn.run(MockOpenAI(config).create_app(), host="127.0.0.1", port=args.port)
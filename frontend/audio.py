@@ -0,0 +1,160 @@
+from os import getenv
+import secrets
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from nicegui import app, ui
+
+from backend.orchestrator import AudioStream
+from backend.orchestrator.speech import TTS_SAMPLE_RATE
+
+
+# Where answers are spoken: 'browser' streams them to the page, 'server'
+# plays them on the speakers of the machine running the app
+AUDIO_OUTPUT: str = getenv("AUDIO_OUTPUT", "browser")
+# Whether to gzip the audio streamed to browsers that accept it
+AUDIO_GZIP: bool = getenv("AUDIO_GZIP", "0") == "1"
+
+# Plays the 16-bit PCM audio of an endless chunked response as it arrives,
+# scheduling each chunk right after the previous one
+PLAYER_JS: str = """
+class SpeechPlayer {
+  constructor(url, sampleRate) {
+    this.url = url;
+    this.sampleRate = sampleRate;
+    this.context = null;
+    this.sources = new Set();
+    this.playAt = 0;
+    this.carry = null;
+    // Browsers only let a page play audio after a user gesture
+    const unlock = () => this.unlock();
+    document.addEventListener("click", unlock);
+    document.addEventListener("keydown", unlock);
+  }
+
+  unlock() {
+    if (!this.context) this.context = new AudioContext({ sampleRate: this.sampleRate });
+    if (this.context.state === "suspended") this.context.resume();
+  }
+
+  async run() {
+    for (;;) {
+      try {
+        const response = await fetch(this.url, { cache: "no-store" });
+        if (response.status === 404) return;
+        const reader = response.body.getReader();
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          this.play(value);
+        }
+      } catch (error) {
+        console.warn("Speech stream interrupted", error);
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  }
+
+  play(bytes) {
+    // A chunk may end in the middle of a sample
+    if (this.carry) {
+      const joined = new Uint8Array(this.carry.length + bytes.length);
+      joined.set(this.carry);
+      joined.set(bytes, this.carry.length);
+      bytes = joined;
+      this.carry = null;
+    }
+    const count = bytes.length >> 1;
+    if (bytes.length & 1) this.carry = bytes.slice(-1);
+    if (!count || !this.context) return;
+
+    const buffer = this.context.createBuffer(1, count, this.sampleRate);
+    const channel = buffer.getChannelData(0);
+    const view = new DataView(bytes.buffer, bytes.byteOffset, count * 2);
+    for (let i = 0; i < count; i++) channel[i] = view.getInt16(2 * i, true) / 32768;
+
+    const source = this.context.createBufferSource();
+    source.buffer = buffer;
+    source.connect(this.context.destination);
+    source.onended = () => this.sources.delete(source);
+    this.playAt = Math.max(this.playAt, this.context.currentTime + 0.05);
+    source.start(this.playAt);
+    this.playAt += buffer.duration;
+    this.sources.add(source);
+  }
+
+  stop() {
+    for (const source of this.sources) source.stop();
+    this.sources.clear();
+    this.playAt = 0;
+    this.carry = null;
+  }
+}
+"""
+
+streams: dict[str, AudioStream] = {}
+
+
+def open_stream() -> AudioStream | None:
+    """
+    Open the audio stream of the page being built and add its player.
+
+    The stream is closed when the page's client is deleted.
+
+    Returns:
+        AudioStream | None: The stream to speak the page's answers into, or
+            None if answers are played on the server.
+    """
+    if AUDIO_OUTPUT != "browser":
+        return None
+    token = secrets.token_urlsafe(16)
+    stream = streams[token] = AudioStream()
+    ui.context.client.on_delete(lambda: close_stream(token))
+    ui.add_body_html(
+        f"<script>{PLAYER_JS}\n"
+        f"window.speechPlayer = new SpeechPlayer('/audio/{token}', {TTS_SAMPLE_RATE});\n"
+        "window.speechPlayer.run();</script>"
+    )
+    return stream
+
+
+def close_stream(token: str) -> None:
+    """
+    Close an audio stream, stopping anything still spoken into it.
+
+    Args:
+        token (str): The token of the stream.
+    """
+    stream = streams.pop(token, None)
+    if stream is not None:
+        stream.close()
+
+
+def stop_playback() -> None:
+    """
+    Stop the audio the current page is playing, when a new turn starts.
+    """
+    if AUDIO_OUTPUT == "browser":
+        ui.run_javascript("window.speechPlayer?.stop()")
+
+
+@app.get("/audio/{token}")
+def audio(token: str, request: Request) -> StreamingResponse:
+    """
+    Stream the speech of a page as it is synthesized, as raw 16-bit PCM at
+    `TTS_SAMPLE_RATE`, for as long as the page is open.
+    """
+    stream = streams.get(token)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Unknown audio stream.")
+    compress = AUDIO_GZIP and "gzip" in request.headers.get("accept-encoding", "")
+    headers = {
+        "Cache-Control": "no-store",
+        # Keep reverse proxies from buffering the stream
+        "X-Accel-Buffering": "no",
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        stream.read(compress), media_type="application/octet-stream", headers=headers
+    )
@@ -0,0 +1,250 @@
+from functools import lru_cache
+from os import getenv
+from time import perf_counter
+from typing import Sequence
+
+from fastapi.responses import PlainTextResponse
+from nicegui import app, ui
+from nicegui.elements.markdown import prepare_content
+from nicegui.events import ScrollEventArguments
+from pygments.formatters import HtmlFormatter
+
+from backend.metrics import REGISTRY
+from backend.types import ChatMessage
+
+
+# The number of messages mounted on page load, and per lazy load
+HISTORY_PAGE_SIZE: int = int(getenv("HISTORY_PAGE_SIZE", "30"))
+MARKDOWN_CACHE_SIZE: int = int(getenv("MARKDOWN_CACHE_SIZE", "4096"))
+MARKDOWN_EXTRAS: str = " ".join(ui.markdown.default_extras)
+# Older messages are loaded when the view is scrolled above this share, and
+# unmounted again once it is scrolled back below its complement
+LOAD_OLDER_THRESHOLD: float = 0.05
+CODEHILITE_PATH: str = "/codehilite.css"
+
+PAGE_LOAD_SECONDS = REGISTRY.histogram(
+    "chat_page_load_seconds",
+    "Time to build the chat page, by length of the session's history.",
+    ("history",),
+)
+HISTORY_LOADS = REGISTRY.counter(
+    "chat_history_loads_total", "Pages of older messages loaded on scroll."
+)
+
+
+@lru_cache(maxsize=MARKDOWN_CACHE_SIZE)
+def render_markdown(content: str) -> str:
+    """
+    Render the markdown of a message to HTML, as `ui.markdown` does.
+
+    Args:
+        content (str): The markdown content of the message.
+
+    Returns:
+        str: The HTML.
+    """
+    return prepare_content(content, MARKDOWN_EXTRAS)
+
+
+@lru_cache(maxsize=1)
+def codehilite_css() -> str:
+    """
+    Return the code highlighting styles `ui.markdown` adds to its pages.
+
+    Returns:
+        str: The CSS, for the light and dark modes.
+    """
+    light = HtmlFormatter(nobackground=True)
+    dark = HtmlFormatter(nobackground=True, style="github-dark")
+    return light.get_style_defs(".codehilite") + dark.get_style_defs(
+        ".body--dark .codehilite"
+    )
+
+
+@app.get(CODEHILITE_PATH)
+def codehilite() -> PlainTextResponse:
+    """
+    Serve the code highlighting styles of rendered messages.
+    """
+    return PlainTextResponse(
+        codehilite_css(),
+        media_type="text/css",
+        headers={"Cache-Control": "public, max-age=86400"},
+    )
+
+
+def history_bucket(length: int) -> str:
+    """
+    Return the label of a history length, by order of magnitude.
+
+    Args:
+        length (int): The number of messages.
+
+    Returns:
+        str: '0', '1-9', '10-99', '100-999' or '1000+'.
+    """
+    if length == 0:
+        return "0"
+    if length >= 1000:
+        return "1000+"
+    low = 10 ** (len(str(length)) - 1)
+    return f"{low}-{low * 10 - 1}"
+
+
+def render_message(message: ChatMessage, assistant_name: str) -> ui.card:
+    """
+    Build the card of a message in the current container.
+
+    The content is shown as HTML rendered from its markdown once, then
+    served from the cache whenever the message is shown again.
+
+    Args:
+        message (ChatMessage): The message to show.
+        assistant_name (str): The name shown for the assistant's messages.
+
+    Returns:
+        ui.card: The card of the message.
+    """
+    with ui.card().classes("w-full flex-col flex-nowrap items-start").classes(
+        "bg-accent" if message.role == "assistant" else "bg-primary"
+    ) as card:
+        ui.label(
+            f"{message.role.capitalize() if message.role == 'user' else assistant_name} | {message.timestamp.strftime('%I:%M:%S %p')}"
+        )
+        ui.separator().classes("-my-4")
+        ui.html(render_markdown(message.content)).classes("nicegui-markdown text-left")
+    return card
+
+
+class HistoryView:
+    """
+    Shows the history of a conversation a page at a time.
+
+    Only the most recent `page_size` messages are mounted when the page
+    loads; older pages are mounted above them as the user scrolls to the top
+    of the chat window, and unmounted again once the user scrolls back to
+    the bottom. Page loads and the websocket payload stay the same size
+    however long the conversation grows.
+    """
+
+    chat_window: ui.scroll_area
+    history: Sequence[ChatMessage]
+    assistant_name: str
+    page_size: int
+    first: int
+
+    def __init__(
+        self,
+        chat_window: ui.scroll_area,
+        history: Sequence[ChatMessage],
+        assistant_name: str,
+        page_size: int = HISTORY_PAGE_SIZE,
+    ):
+        """
+        Args:
+            chat_window (ui.scroll_area): The chat window to show the messages in.
+            history (Sequence[ChatMessage]): The messages of the conversation.
+                Messages added later are shown by the caller.
+            assistant_name (str): The name shown for the assistant's messages.
+            page_size (int): The number of messages mounted at a time.
+        """
+        self.chat_window = chat_window
+        self.history = history
+        self.assistant_name = assistant_name
+        self.page_size = page_size
+        self.first = len(history)
+        self._cards: list[ui.card] = []
+        self._loading = False
+        # Rendered HTML skips `ui.markdown`, which would add these styles
+        ui.add_head_html(f'<link rel="stylesheet" href="{CODEHILITE_PATH}">')
+        chat_window.on_scroll(self.handle_scroll)
+
+    @property
+    def has_older(self) -> bool:
+        """
+        Whether older messages are not mounted yet.
+        """
+        return self.first > 0
+
+    def mount(self) -> int:
+        """
+        Mount the most recent page of messages.
+
+        Returns:
+            int: The number of messages mounted.
+        """
+        return self.load_older()
+
+    def load_older(self) -> int:
+        """
+        Mount the page of messages preceding the mounted ones, above them.
+
+        Returns:
+            int: The number of messages mounted.
+        """
+        start = max(0, self.first - self.page_size)
+        messages = self.history[start : self.first]
+        with self.chat_window:
+            cards = [
+                render_message(message, self.assistant_name) for message in messages
+            ]
+        for index, card in enumerate(cards):
+            card.move(target_index=index)
+        self._cards[:0] = cards
+        self.first = start
+        return len(messages)
+
+    def unmount_older(self) -> int:
+        """
+        Unmount the messages mounted above the most recent page.
+
+        Returns:
+            int: The number of messages unmounted.
+        """
+        count = max(0, len(self._cards) - self.page_size)
+        for card in self._cards[:count]:
+            card.delete()
+        del self._cards[:count]
+        self.first += count
+        return count
+
+    def handle_scroll(self, event: ScrollEventArguments) -> None:
+        """
+        Mount older messages once the chat window is scrolled near its top,
+        and unmount them once it is scrolled back near its bottom.
+
+        Args:
+            event (ScrollEventArguments): The scroll position.
+        """
+        if self._loading:
+            return
+        if event.vertical_percentage >= 1 - LOAD_OLDER_THRESHOLD:
+            self.unmount_older()
+            return
+        if not self.has_older or event.vertical_percentage > LOAD_OLDER_THRESHOLD:
+            return
+        self._loading = True
+        try:
+            mounted = len(self.history) - self.first
+            added = self.load_older()
+            HISTORY_LOADS.inc()
+            # Keep the messages the user was reading in view
+            self.chat_window.scroll_to(percent=added / (mounted + added))
+        finally:
+            self._loading = False
+
+
+def observe_page_load(start: float, history_length: int) -> float:
+    """
+    Record the time taken to build the chat page.
+
+    Args:
+        start (float): The `perf_counter` time the page started building.
+        history_length (int): The number of messages in the session's history.
+
+    Returns:
+        float: The duration, in seconds.
+    """
+    duration = perf_counter() - start
+    PAGE_LOAD_SECONDS.observe(duration, history=history_bucket(history_length))
+    return duration
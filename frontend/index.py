@@ -1,24 +1,59 @@
 from datetime import datetime
+from time import perf_counter
+from typing import AsyncIterator, Callable
+import logging
 
-from nicegui import ui
+from fastapi.responses import PlainTextResponse
+from nicegui import app, ui
 
-from backend.types import Message
-from backend.orchestrator import Agent
+from backend.types import (
+    ChatMessage,
+    Message,
+    StreamEvent,
+    TextDelta,
+    ToolCallEvent,
+    ToolCallResult,
+)
+from backend.metrics import REGISTRY, observe, span
+from backend.orchestrator import Agent, AudioSink, Overloaded
+from backend.tools.catalog import get_catalog
+from backend.sessions import Session, SessionManager
+from frontend.audio import open_stream, stop_playback
+from frontend.history import HistoryView, observe_page_load, render_message
+
+
+logger = logging.getLogger(__name__)
 
 ASSISTANT_NAME: str = "JaySO"
+GREETING: str = f"{ASSISTANT_NAME} is ready for service."
 
 agent: Agent = Agent()
-convo_thread: list[Message] = [
-    Message(
-        content=f"{ASSISTANT_NAME} is ready for service.",
-        role="assistant",
-        timestamp=datetime.now(),
-    )
-]
+app.on_startup(lambda: agent.prewarm_speech([GREETING]))
+app.on_startup(lambda: get_catalog().watch())
+sessions: SessionManager = SessionManager(greeting=GREETING)
+app.on_startup(lambda: sessions.watch())
+
+REGISTRY.add_collector("chat_tool_cache", agent.tool_cache.stats)
+REGISTRY.add_collector("chat_audio_cache", lambda: agent.audio_cache.stats())
+REGISTRY.add_collector("chat_sessions", sessions.stats)
+REGISTRY.add_collector("chat_intents", agent.intents.stats)
+REGISTRY.add_collector("chat_prefetch", agent.prefetcher.stats)
+REGISTRY.add_collector("chat_scheduler", agent.scheduler.stats)
+
+
+@app.get("/metrics")
+def metrics() -> PlainTextResponse:
+    """
+    Serve the metrics of the chat service in the Prometheus text format.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 
 async def trigger_chat_turn(
-    input_element: ui.input, chat_window: ui.scroll_area
+    input_element: ui.input,
+    chat_window: ui.scroll_area,
+    session: Session,
+    sink: AudioSink | None = None,
 ) -> None:
     """
     Trigger a chat turn by creating a user message, getting the response, and
@@ -27,7 +62,16 @@ async def trigger_chat_turn(
     Args:
         input_element (ui.input): The input element to get the user message from.
         chat_window (ui.scroll_area): The chat window to display the messages in.
+        session (Session): The session of the client.
+        sink (AudioSink | None): Where to speak the response, by default the
+            speakers of the server.
     """
+    # A new message interrupts the answer the page is still playing; the
+    # audio queued for it on the server is dropped first, so none arrives
+    # after the page stops
+    agent.cancel_speech(sink)
+    stop_playback()
+
     # Create user message
     user_message: Message = Message(
         content=input_element.value, role="user", timestamp=datetime.now()
@@ -36,19 +80,47 @@ async def trigger_chat_turn(
     input_element.disable()  # Lock the input until the response is received
 
     # Add user message to thread
-    convo_thread.append(user_message)
+    sessions.append(session, user_message)
 
     # Display user message
-    await display_message(user_message, chat_window)
+    user_card = await display_message(user_message, chat_window)
 
-    # Get agent response
-    response: Message = await receive_response()
+    # Tell the user where they stand while the turn waits to be admitted
+    queue_notice: ui.notification | None = None
 
-    # Add agent response to thread
-    convo_thread.append(response)
+    def show_position(position: int) -> None:
+        nonlocal queue_notice
+        if position == 0:
+            if queue_notice is not None:
+                queue_notice.dismiss()
+            return
+        if queue_notice is None:
+            # Called from whichever turn freed a slot, so enter this page first
+            with chat_window:
+                queue_notice = ui.notification(timeout=None, spinner=True)
+        queue_notice.message = f"{ASSISTANT_NAME} is busy, you are number {position} in line."
 
-    # Display agent response
-    await display_message(response, chat_window)
+    # Stream agent response into the chat window
+    try:
+        response: Message = await display_message_stream(
+            receive_response_stream(session, show_position, sink), chat_window
+        )
+    except Exception as e:
+        # Give the message back so it can be sent again
+        show_position(0)
+        sessions.pop(session)
+        user_card.delete()
+        input_element.value = user_message.content
+        input_element.enable()
+        if isinstance(e, Overloaded):
+            ui.notify(f"{ASSISTANT_NAME} is too busy right now, please try again.", type="warning")
+        else:
+            logger.exception("Chat turn of session %s failed", session.session_id)
+            ui.notify(f"{ASSISTANT_NAME} couldn't answer that, please try again.", type="negative")
+        return
+
+    # Add agent response to thread
+    sessions.append(session, response)
 
     # Enable input
     input_element.enable()
@@ -57,33 +129,115 @@ async def trigger_chat_turn(
     chat_window.scroll_to(percent=1, duration=0.5)
 
 
-async def receive_response() -> Message:
+async def receive_response(session: Session, sink: AudioSink | None = None) -> Message:
     """
     Receive a response from the agent.
 
+    Args:
+        session (Session): The session of the client.
+        sink (AudioSink | None): Where to speak the response.
+
     Returns:
         Message: The agent response.
     """
-    return await agent.chat(convo_thread)
+    return await agent.chat(
+        session.history, session.state, session.session_id, sink=sink
+    )
+
+
+def receive_response_stream(
+    session: Session,
+    on_position: Callable[[int], None] | None = None,
+    sink: AudioSink | None = None,
+) -> AsyncIterator[StreamEvent]:
+    """
+    Receive a streamed response from the agent.
 
+    Args:
+        session (Session): The session of the client.
+        on_position (Callable[[int], None] | None): Called with the position
+            of the turn in the queue while it waits to be admitted.
+        sink (AudioSink | None): Where to speak the response.
 
-async def display_message(message: Message, chat_window: ui.scroll_area) -> None:
+    Returns:
+        AsyncIterator[StreamEvent]: The events of the agent response.
+    """
+    return agent.chat_stream(
+        session.history, session.state, session.session_id, on_position, sink
+    )
+
+
+async def display_message(
+    message: ChatMessage, chat_window: ui.scroll_area
+) -> ui.card:
     """
     Display a message in the chat window.
 
     Args:
-        message (Message): The message to display.
+        message (ChatMessage): The message to display.
         chat_window (ui.scroll_area): The chat window to display the message in.
+
+    Returns:
+        ui.card: The card of the message.
     """
+    with span("ui.render"), chat_window:
+        return render_message(message, ASSISTANT_NAME)
+
+
+async def display_message_stream(
+    events: AsyncIterator[StreamEvent], chat_window: ui.scroll_area
+) -> Message:
+    """
+    Display a streamed message in the chat window, appending text as it arrives.
+
+    Args:
+        events (AsyncIterator[StreamEvent]): The events of the streamed response.
+        chat_window (ui.scroll_area): The chat window to display the message in.
+
+    Returns:
+        Message: The final message once the stream is complete.
+    """
+    content: str = ""
     with chat_window:
-        with ui.card().classes("w-full flex-col flex-nowrap items-start").classes(
-            "bg-accent" if message.role == "assistant" else "bg-primary"
-        ):
-            ui.label(
-                f"{message.role.capitalize() if message.role == 'user' else ASSISTANT_NAME} | {message.timestamp.strftime('%I:%M:%S %p')}"
+        with ui.card().classes("w-full flex-col flex-nowrap items-start bg-accent") as card:
+            header = ui.label(
+                f"{ASSISTANT_NAME} | {datetime.now().strftime('%I:%M:%S %p')}"
             )
             ui.separator().classes("-my-4")
-            ui.markdown(message.content).classes("text-left")
+            body = ui.markdown("").classes("text-left")
+            spinner = ui.spinner("dots")
+
+    try:
+        async for event in events:
+            # Only the time spent updating the page counts, not waiting for events
+            render_start = perf_counter()
+            match event:
+                case TextDelta():
+                    content += event.delta
+                    body.set_content(content)
+                    chat_window.scroll_to(percent=1)
+                case ToolCallEvent():
+                    content = ""  # Text preceding a tool call is superseded
+                    body.set_content(f"_Running `{event.name}`..._")
+                case ToolCallResult():
+                    body.set_content(
+                        f"_Finished `{event.name}` in {event.duration:.2f}s_"
+                    )
+                case Message():
+                    body.set_content(event.content)
+                    header.set_text(
+                        f"{ASSISTANT_NAME} | {event.timestamp.strftime('%I:%M:%S %p')}"
+                    )
+                    spinner.delete()
+                    observe("ui.render", render_start)
+                    return event
+            observe("ui.render", render_start)
+
+        raise RuntimeError("Response stream ended without a final message.")
+    except Exception:
+        # Don't leave a partial reply behind
+        card.delete()
+        raise
 
 
 @ui.page("/")
@@ -91,7 +245,11 @@ async def index() -> None:
     """
     The main page of the application.
     """
+    page_start = perf_counter()
     ui.colors(secondary="#ffffff", primary="#F1F4F6", accent="#3c8cc3")
+    session: Session = sessions.get(app.storage.browser["id"])
+    # Answers are spoken by the browser, as their audio streams in
+    sink = open_stream()
 
     with ui.header().classes("bg-accent"):
         with ui.row().classes("w-full justify-between items-center"):
@@ -104,8 +262,9 @@ async def index() -> None:
     chat_window = ui.scroll_area().classes(
         "w-full h-[calc(100vh-13rem)] overflow-hidden flex-col justify-between items-center"
     )
-    for message in convo_thread:
-        await display_message(message, chat_window)
+    # Only the latest messages are mounted, older ones load on scroll
+    HistoryView(chat_window, session.history, ASSISTANT_NAME).mount()
+    chat_window.scroll_to(percent=1)
 
     with ui.footer().classes(
         "w-full h-1/8 flex-row flex-nowrap justify-between items-center bg-accent"
@@ -121,9 +280,14 @@ async def index() -> None:
                 .props("borderless")
                 .on(
                     "keydown.enter",
-                    lambda: trigger_chat_turn(input_element, chat_window),
+                    lambda: trigger_chat_turn(input_element, chat_window, session, sink),
                 )
             )
             ui.button(
-                "Send", on_click=lambda: trigger_chat_turn(input_element, chat_window)
+                "Send",
+                on_click=lambda: trigger_chat_turn(
+                    input_element, chat_window, session, sink
+                ),
             ).classes("basis-1/6 bg-accent")
+
+    observe_page_load(page_start, len(session.history))
@@ -1,8 +1,15 @@
+from os import getenv
+import secrets
+
+from dotenv import load_dotenv
 from nicegui import ui
 from frontend.index import index
 
 if __name__ in {"__main__", "__mp_main__"}:
+    load_dotenv()
     ui.run(
         title="Jaxon",
         reload=True,
+        # Sessions only live in memory, so a secret per process loses nothing
+        storage_secret=getenv("STORAGE_SECRET") or secrets.token_urlsafe(32),
     )